@@ -0,0 +1,220 @@
+"""Module containing the functions used to read audio files stored inside zip and tar archives.
+
+A file inside an archive is referred to by the path of the archive and the
+name of the member, separated by SEPARATOR, e.g. genspeech.zip!/ref/001.wav.
+Such paths can be used wherever LoadSignalNode, the AudioCache, the
+AudioStore or scripts/materialize_audio.py take the path of an audio file,
+so a dataset doesn't have to be extracted.
+
+The member index of an archive is read once, when the first of its members
+is read, and kept for the rest of the process. Members of zip files and of
+uncompressed tar files are then read at their offset with os.pread, which
+doesn't move a shared file position, so they can be read from several
+threads at once. Members compressed with something other than deflate,
+and members of compressed tar files (.tar.gz etc.), are read through
+zipfile/tarfile under a lock instead, which for compressed tar files means
+decompressing the archive up to the member, so those should be recompressed
+as zip or plain tar files.
+"""
+
+import logging
+import os
+import tarfile
+import threading
+import zipfile
+import zlib
+
+from constants import LOGGER_NAME
+from typing import Tuple
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+SEPARATOR = '!/'
+
+_ARCHIVES = {}
+_ARCHIVES_LOCK = threading.Lock()
+
+# Size of the fixed part of a zip local file header, and the offset of its
+# file name length.
+_ZIP_LOCAL_HEADER_SIZE = 30
+_ZIP_NAME_LENGTH_OFFSET = 26
+
+
+def split_path(path: str) -> Tuple[str, str]:
+    """Split a path into the path of its archive and the member name, or return (path, None) if it isn't inside an archive.
+
+    A path is only treated as an archive member if the part before the
+    separator is an existing file.
+    """
+    path = os.fspath(path)
+    archive, separator, member = path.replace('!\\', SEPARATOR).partition(SEPARATOR)
+    if not separator or not os.path.isfile(archive):
+        return path, None
+    return archive, member.replace('\\', '/')
+
+
+def is_member_path(path: str) -> bool:
+    """Check if a path refers to a member of an archive."""
+    return split_path(path)[1] is not None
+
+
+def resolve(path: str) -> str:
+    """Get the canonical form of a path, resolving the path of its archive if it's an archive member."""
+    archive, member = split_path(path)
+    if member is None:
+        return os.path.realpath(path)
+    return os.path.realpath(archive) + SEPARATOR + member
+
+
+def exists(path: str) -> bool:
+    """Check if a file, or a member of an archive, exists."""
+    archive, member = split_path(path)
+    if member is None:
+        return os.path.isfile(archive)
+    return member in open_archive(archive).members
+
+
+def mtime_ns(path: str) -> int:
+    """Get the modification time of a file, or of the archive of an archive member, in nanoseconds.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the file, or the member of the archive, doesn't exist.
+    """
+    archive, member = split_path(path)
+    mtime = os.stat(archive).st_mtime_ns
+    if member is not None and member not in open_archive(archive).members:
+        raise FileNotFoundError(f"{archive} has no member {member}")
+    return mtime
+
+
+def read_member(path: str) -> bytes:
+    """Read the contents of an archive member.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the archive, or the member, doesn't exist.
+    """
+    archive, member = split_path(path)
+    if member is None:
+        raise FileNotFoundError(f"{path} isn't a member of an archive")
+    return open_archive(archive).read(member)
+
+
+def open_archive(path: str):
+    """Get the ZipArchive or TarArchive of a file, reading its member index if it isn't open in this process yet.
+
+    An archive which was modified since it was opened is opened again.
+    """
+    key = os.path.realpath(path)
+    mtime = os.stat(key).st_mtime_ns
+    with _ARCHIVES_LOCK:
+        archive = _ARCHIVES.get(key)
+        # Processes forked after an archive was opened open their own copy,
+        # the zipfile/tarfile fallbacks rely on the position of the file.
+        if archive is not None and archive.mtime_ns == mtime and archive.pid == os.getpid():
+            return archive
+        if zipfile.is_zipfile(key):
+            archive = ZipArchive(key, mtime)
+        elif tarfile.is_tarfile(key):
+            archive = TarArchive(key, mtime)
+        else:
+            raise ValueError(f"{path} isn't a zip or tar archive")
+        LOGGER.debug("Indexed %d members of %s", len(archive.members), key)
+        _ARCHIVES[key] = archive
+        return archive
+
+
+class _Archive:
+    """Base class of the archives, holding the open file the members are read from."""
+
+    def __init__(self, path: str, mtime_ns: int):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.pid = os.getpid()
+        self.members = {}
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+
+
+    def read(self, member: str) -> bytes:
+        raise NotImplementedError
+
+
+    def _read_at(self, offset: int, size: int) -> bytes:
+        """Read size bytes at an offset of the archive."""
+        if hasattr(os, 'pread'):
+            return os.pread(self._file.fileno(), size, offset)
+        # Not available on Windows.
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+
+    def _missing(self, member: str) -> FileNotFoundError:
+        return FileNotFoundError(f"{self.path} has no member {member}")
+
+
+class ZipArchive(_Archive):
+    """Zip archive whose stored and deflated members are read at their offset."""
+
+    def __init__(self, path: str, mtime_ns: int):
+        super().__init__(path, mtime_ns)
+        self._zip = zipfile.ZipFile(self._file)
+        self.members = {info.filename: info for info in self._zip.infolist() if not info.is_dir()}
+        self._data_offsets = {}
+
+
+    def read(self, member: str) -> bytes:
+        info = self.members.get(member)
+        if info is None:
+            raise self._missing(member)
+        if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED) or info.flag_bits & 0x1:
+            with self._lock:
+                return self._zip.read(info)
+        data = self._read_at(self._data_offset(info), info.compress_size)
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -zlib.MAX_WBITS)
+        return data
+
+
+    def _data_offset(self, info: zipfile.ZipInfo) -> int:
+        """Get the offset of a member's data, after its local header, whose extra field can differ from the central directory's."""
+        offset = self._data_offsets.get(info.filename)
+        if offset is None:
+            header = self._read_at(info.header_offset, _ZIP_LOCAL_HEADER_SIZE)
+            name_length = int.from_bytes(header[_ZIP_NAME_LENGTH_OFFSET:_ZIP_NAME_LENGTH_OFFSET + 2], 'little')
+            extra_length = int.from_bytes(header[_ZIP_NAME_LENGTH_OFFSET + 2:_ZIP_NAME_LENGTH_OFFSET + 4], 'little')
+            offset = info.header_offset + _ZIP_LOCAL_HEADER_SIZE + name_length + extra_length
+            self._data_offsets[info.filename] = offset
+        return offset
+
+
+class TarArchive(_Archive):
+    """Tar archive whose members are read at their offset, unless the archive is compressed."""
+
+    def __init__(self, path: str, mtime_ns: int):
+        super().__init__(path, mtime_ns)
+        try:
+            self._tar = tarfile.open(fileobj=self._file, mode='r:')
+            self.compressed = False
+        except tarfile.ReadError:
+            self._file.seek(0)
+            self._tar = tarfile.open(fileobj=self._file, mode='r:*')
+            self.compressed = True
+            LOGGER.warning("%s is compressed, each member read decompresses the archive up to the member", path)
+        # Archives created with e.g. `tar -cf data.tar .` prefix every name with './'.
+        self.members = {info.name[2:] if info.name.startswith('./') else info.name: info
+                        for info in self._tar.getmembers() if info.isfile()}
+
+
+    def read(self, member: str) -> bytes:
+        info = self.members.get(member)
+        if info is None:
+            raise self._missing(member)
+        if self.compressed:
+            with self._lock:
+                return self._tar.extractfile(info).read()
+        return self._read_at(info.offset_data, info.size)
@@ -0,0 +1,141 @@
+"""Module containing the AudioCache, a size bounded LRU cache of decoded audio signals.
+
+Datasets such as Genspeech and TCDVoIP pair each reference file with many
+degraded files, so without the cache LoadSignalNode decodes and resamples the
+same reference file once per row. The cache is process-wide, every
+LoadSignalNode shares the one returned by get_cache(). LoopNode worker
+processes each have their own.
+
+Cached signals are read-only, so a node can't modify a signal in place and
+corrupt the cached copy (e.g. `result['signal'] *= 2` raises a ValueError).
+Nodes should assign a new array instead.
+"""
+
+import logging
+import threading
+import numpy as np
+import audioarchive
+
+from collections import OrderedDict
+from constants import LOGGER_NAME
+from typing import Callable
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+class AudioCache:
+    """LRU cache of decoded signals keyed on (path, mtime, target sample rate, mono, resampler)."""
+
+    def __init__(self, max_bytes: int=DEFAULT_MAX_BYTES):
+        """Initialize an AudioCache.
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            Maximum size of the cached signals in bytes. The least recently
+            used signals are evicted once it's exceeded. Signals larger than
+            this aren't cached, so 0 disables the cache. The default is
+            DEFAULT_MAX_BYTES (512 MiB).
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, path: str, target_sample_rate: int, mono: bool, load: Callable[[], np.ndarray],
+            resampler: str='high_quality') -> np.ndarray:
+        """Get the decoded signal of a file, calling load to decode it if it isn't cached.
+
+        Parameters
+        ----------
+        path : str
+            Path of the audio file.
+        target_sample_rate : int
+            Sample rate the signal is resampled to.
+        mono : bool
+            Whether the signal is mixed down to mono.
+        load : Callable[[], np.ndarray]
+            Function decoding the signal, called on a miss.
+        resampler : str, optional
+            Resampler used to resample the signal. The default is 'high_quality'.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the file, or the archive member, doesn't exist.
+
+        Returns
+        -------
+        audio : np.ndarray
+            The read-only signal.
+        """
+        resolved = audioarchive.resolve(path)
+        # The modification time is part of the key so a file which is
+        # rewritten during a run is decoded again.
+        key = (resolved, audioarchive.mtime_ns(resolved), target_sample_rate, mono, resampler)
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return audio
+            self.misses += 1
+
+        audio = load()
+        audio.flags.writeable = False
+        with self._lock:
+            if key not in self._entries and audio.nbytes <= self.max_bytes:
+                self._entries[key] = audio
+                self.nbytes += audio.nbytes
+                self._evict()
+        return audio
+
+
+    def resize(self, max_bytes: int):
+        """Change the maximum size of the cache, evicting signals if needed."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+
+    def clear(self):
+        """Remove every cached signal, keeping the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+    def stats(self) -> dict:
+        """Get the hit/miss statistics and current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes:
+            _, audio = self._entries.popitem(last=False)
+            self.nbytes -= audio.nbytes
+            self.evictions += 1
+
+
+_CACHE = AudioCache()
+
+
+def get_cache() -> AudioCache:
+    """Get the process-wide AudioCache."""
+    return _CACHE
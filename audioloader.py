@@ -0,0 +1,157 @@
+"""Module containing the functions used by LoadSignalNode to decode and resample audio files.
+
+Files are decoded by one of two backends:
+
+- soundfile: opens the file with soundfile, reading its header (channels,
+  sample rate and frames) before decoding it exactly once. Files soundfile
+  can't open are decoded by the librosa backend instead.
+- librosa: decodes the file with librosa.load at its native sample rate,
+  which also supports the formats handled by audioread.
+
+Files inside zip and tar archives, e.g. genspeech.zip!/ref/001.wav, are
+read into memory with audioarchive.read_member and decoded from there, by
+soundfile in both cases.
+
+The decoded signal is then resampled to the target sample rate by one of the
+RESAMPLERS, unless it's already at that rate:
+
+- high_quality: librosa.resample with librosa's default filter, the same
+  result as librosa.load with a target sample rate.
+- soxr: the SoX resampler, requires the soxr package.
+- polyphase: scipy's polyphase filter, the fastest.
+
+The time spent decoding and resampling is accumulated per process, see
+timings().
+"""
+
+import logging
+import math
+import threading
+import time
+import io
+import librosa
+import numpy as np
+import soundfile as sf
+import audioarchive
+
+from scipy.signal import resample_poly
+from constants import LOGGER_NAME
+from typing import Tuple
+
+try:
+    import soxr
+except ImportError:
+    # Only needed by the soxr resampler.
+    soxr = None
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+BACKENDS = ('soundfile', 'librosa')
+RESAMPLERS = ('high_quality', 'soxr', 'polyphase')
+
+_TIMINGS = {'files': 0, 'decode': 0.0, 'resample': 0.0}
+_TIMINGS_LOCK = threading.Lock()
+
+
+def check_options(backend: str, resampler: str):
+    """Check a backend and resampler are supported, raising a ValueError if they aren't."""
+    if backend not in BACKENDS:
+        raise ValueError(f'backend must be one of {BACKENDS}')
+    if resampler not in RESAMPLERS:
+        raise ValueError(f'resampler must be one of {RESAMPLERS}')
+    if resampler == 'soxr' and soxr is None:
+        raise ValueError("The soxr resampler requires the soxr package, pip install soxr")
+
+
+def load_audio(path: str, target_sample_rate: int, mono: bool, backend: str='soundfile',
+               resampler: str='high_quality') -> Tuple[np.ndarray, float, float]:
+    """Decode an audio file and resample it to the target sample rate.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file to load.
+    target_sample_rate : int
+        Sample rate to resample the signal to.
+    mono : bool
+        Whether to mix the signal down to mono. Multichannel signals are
+        returned with shape (channels, frames), mono files always as a 1D
+        array.
+    backend : str, optional
+        One of BACKENDS. The default is 'soundfile'.
+    resampler : str, optional
+        One of RESAMPLERS. The default is 'high_quality'.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the file, or the archive member, doesn't exist.
+
+    Returns
+    -------
+    audio : np.ndarray
+        The float32 signal.
+    decode_time : float
+        Seconds spent decoding the file.
+    resample_time : float
+        Seconds spent resampling the signal.
+    """
+    # Checked up front, soundfile would report a missing file as a RuntimeError.
+    if not audioarchive.exists(path):
+        raise FileNotFoundError(f"{path} doesn't exist")
+    start = time.perf_counter()
+    audio, native_sample_rate = _decode(path, mono, backend)
+    decoded = time.perf_counter()
+    if native_sample_rate != target_sample_rate:
+        audio = resample(audio, native_sample_rate, target_sample_rate, resampler)
+    resampled = time.perf_counter()
+    with _TIMINGS_LOCK:
+        _TIMINGS['files'] += 1
+        _TIMINGS['decode'] += decoded - start
+        _TIMINGS['resample'] += resampled - decoded
+    return audio, decoded - start, resampled - decoded
+
+
+def resample(audio: np.ndarray, orig_sample_rate: int, target_sample_rate: int, resampler: str) -> np.ndarray:
+    """Resample a signal along its last axis with one of the RESAMPLERS."""
+    if resampler == 'polyphase':
+        gcd = math.gcd(int(orig_sample_rate), int(target_sample_rate))
+        audio = resample_poly(audio, target_sample_rate // gcd, orig_sample_rate // gcd, axis=-1)
+    elif resampler == 'soxr':
+        # soxr expects the channels along the last axis.
+        audio = soxr.resample(audio.T, orig_sample_rate, target_sample_rate, quality='HQ').T
+    else:
+        audio = librosa.resample(audio, orig_sr=orig_sample_rate, target_sr=target_sample_rate)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def timings() -> dict:
+    """Get the number of files loaded by this process and the total seconds spent decoding and resampling them."""
+    with _TIMINGS_LOCK:
+        return dict(_TIMINGS)
+
+
+def _decode(path: str, mono: bool, backend: str) -> Tuple[np.ndarray, int]:
+    if audioarchive.is_member_path(path):
+        # Only soundfile decodes from memory.
+        backend = 'soundfile'
+        source = io.BytesIO(audioarchive.read_member(path))
+    else:
+        source = str(path)
+    if backend == 'soundfile':
+        try:
+            # Opening the file only reads its header, the number of channels
+            # then decides how the signal is read.
+            with sf.SoundFile(source) as f:
+                channels, sample_rate = f.channels, f.samplerate
+                audio = f.read(frames=f.frames, dtype='float32', always_2d=False).T
+            if mono and channels > 1:
+                audio = librosa.to_mono(audio)
+            return np.ascontiguousarray(audio), sample_rate
+        except RuntimeError as err:
+            if not isinstance(source, str):
+                raise
+            LOGGER.debug("soundfile can't decode %s, falling back to librosa: %s", path, err)
+    # A mono file is returned as a 1D array even when mono is False, so it
+    # doesn't need to be loaded a second time.
+    return librosa.load(path, sr=None, mono=mono)
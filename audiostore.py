@@ -0,0 +1,107 @@
+"""Module containing the AudioStore, a directory of decoded and resampled signals which are memory-mapped when loaded.
+
+Decoding and resampling is often the largest fixed cost of a row, and it is
+repeated every time the same dataset is run through a different graph. The
+scripts/materialize_audio.py script decodes every file of a dataset once per
+target sample rate and saves it to the store as a float32 .npy file. A
+LoadSignalNode with an "audio_store" then opens these files with
+np.load(mmap_mode='r'), so loading a signal only pages in the data it uses.
+
+Signals are stored at <root>/<target sample rate>[_mono][_<resampler>]/<xx>/
+<sha1 of the resolved source path, see audioarchive.resolve>.npy, the resampler only being part of the
+path when it isn't the default high_quality resampler. A signal whose source
+file was modified after it was stored is ignored.
+"""
+
+import hashlib
+import logging
+import os
+import numpy as np
+import audioarchive
+
+from pathlib import Path
+from constants import LOGGER_NAME
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+class AudioStore:
+    """Directory of materialized signals, one .npy file per source file, sample rate and channel mode."""
+
+    def __init__(self, root: str):
+        """Initialize an AudioStore.
+
+        Parameters
+        ----------
+        root : str
+            Directory the signals are stored in.
+        """
+        self.root = Path(root)
+
+
+    def blob_path(self, path: str, target_sample_rate: int, mono: bool, resampler: str='high_quality') -> Path:
+        """Get the path of the .npy file storing the signal of a source file."""
+        digest = hashlib.sha1(audioarchive.resolve(path).encode()).hexdigest()
+        variant = f"{target_sample_rate}{'_mono' if mono else ''}"
+        if resampler != 'high_quality':
+            variant += f'_{resampler}'
+        return self.root / variant / digest[:2] / f'{digest}.npy'
+
+
+    def is_current(self, path: str, target_sample_rate: int, mono: bool, resampler: str='high_quality') -> bool:
+        """Check if the signal of a source file is stored and the source hasn't been modified since."""
+        blob = self.blob_path(path, target_sample_rate, mono, resampler)
+        try:
+            return blob.stat().st_mtime_ns >= audioarchive.mtime_ns(path)
+        except FileNotFoundError:
+            return False
+
+
+    def load(self, path: str, target_sample_rate: int, mono: bool, resampler: str='high_quality') -> np.ndarray:
+        """Memory-map the stored signal of a source file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the source audio file.
+        target_sample_rate : int
+            Sample rate the signal was resampled to.
+        mono : bool
+            Whether the signal was mixed down to mono.
+        resampler : str, optional
+            Resampler used to resample the signal. The default is 'high_quality'.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the source file doesn't exist.
+
+        Returns
+        -------
+        audio : np.ndarray
+            The read-only memory-mapped signal, or None if it isn't stored or
+            the source file was modified after it was stored.
+        """
+        blob = self.blob_path(path, target_sample_rate, mono, resampler)
+        source_mtime = audioarchive.mtime_ns(path)
+        try:
+            blob_mtime = blob.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if blob_mtime < source_mtime:
+            LOGGER.warning("%s was modified after it was materialized in %s, decoding it instead", path, self.root)
+            return None
+        return np.load(blob, mmap_mode='r')
+
+
+    def save(self, path: str, target_sample_rate: int, mono: bool, audio: np.ndarray,
+             resampler: str='high_quality') -> Path:
+        """Store the decoded signal of a source file as float32, returning the path it's stored at."""
+        blob = self.blob_path(path, target_sample_rate, mono, resampler)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so a reader never maps a partially
+        # written signal.
+        tmp = blob.with_name(f'{blob.stem}.{os.getpid()}.tmp.npy')
+        np.save(tmp, np.ascontiguousarray(audio, dtype=np.float32))
+        os.replace(tmp, blob)
+        return blob
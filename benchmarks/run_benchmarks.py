@@ -0,0 +1,343 @@
+"""
+    Script which times the DSP and metric kernels of the pipeline in isolation, using synthetic signals so that
+    no dataset is needed.
+
+    Each kernel is run on a speech-like reference signal and a degraded copy of it (delayed, low pass filtered
+    and with added noise) for every combination of the sample rates and durations passed to the script. The
+    timings of every kernel are written as JSON to --output.
+
+    If a --baseline file written by a previous run is passed, the median time of each kernel is compared against
+    the baseline's. Any kernel which got slower than the regression threshold allows, as set in the --thresholds
+    file, is reported and the script exits with a non-zero status.
+
+    Kernels whose dependencies aren't installed are recorded as skipped, and kernels which don't support a
+    sample rate (e.g. PESQ at 48 kHz) aren't run for it.
+"""
+
+# /usr/bin/env python3.8
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Intensity range of the spectrograms passed to nsim_map, the same as the ViSQOL speech mode.
+NSIM_L = 160
+NUM_BANDS = 32
+WARPS = [1]
+
+
+def speech_like_signal(sample_rate: int, duration: float, seed: int=0) -> np.ndarray:
+    """Create a deterministic signal with speech-like structure: a gliding harmonic source with syllable-rate
+    amplitude modulation, short pauses and a low noise floor.
+
+    Parameters
+    ----------
+    sample_rate : int
+        Sample rate of the signal.
+    duration : float
+        Duration of the signal in seconds.
+    seed : int, optional
+        Seed of the random number generator. The default is 0.
+
+    Returns
+    -------
+    signal : np.ndarray
+        The signal, with a peak amplitude of 0.5.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    harmonics = sum(np.sin(k * phase) / k for k in range(1, 16) if k * 150 < sample_rate / 2)
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * (np.sin(2 * np.pi * 0.25 * t) > -0.8)
+    signal = harmonics * envelope + 0.01 * rng.standard_normal(len(t))
+    return 0.5 * signal / np.max(np.abs(signal))
+
+
+def degrade(signal: np.ndarray, sample_rate: int, seed: int=1) -> np.ndarray:
+    """Degrade a signal by delaying it by 20 ms, low pass filtering it and adding noise at roughly 20 dB SNR."""
+    rng = np.random.default_rng(seed)
+    delay = int(0.02 * sample_rate)
+    delayed = np.concatenate([np.zeros(delay), signal[:-delay]])
+    smoothed = np.convolve(delayed, np.ones(4) / 4, mode='same')
+    return smoothed + 0.1 * np.std(signal) * rng.standard_normal(len(signal))
+
+
+def band_spectrogram(signal: np.ndarray, sample_rate: int, num_bands: int=NUM_BANDS) -> np.ndarray:
+    """Create a dB spectrogram with num_bands log-spaced bands and the frame rate of ViSQOL's analysis window."""
+    # The window size of calculate_window_size, 256 samples at 8 kHz rounded down to an even size
+    size = round(sample_rate / 8000 * 256) // 2 * 2
+    hop = size // 2
+    num_frames = 1 + (len(signal) - size) // hop
+    frames = np.stack([signal[i * hop:i * hop + size] for i in range(num_frames)], axis=1)
+    power = np.abs(np.fft.rfft(frames * np.hamming(size)[:, None], axis=0)) ** 2
+    edges = np.unique(np.geomspace(2, power.shape[0], num_bands + 1).astype(int))
+    bands = np.stack([power[lo:hi].sum(axis=0) for lo, hi in zip(edges[:-1], edges[1:])])
+    return 10 * np.log10(np.maximum(bands, np.finfo(float).eps))
+
+
+def setup_nsim_map(ref, deg, sr):
+    from qualitymetrics.visqol.nsim import nsim_map
+    ref_img, deg_img = band_spectrogram(ref, sr), band_spectrogram(deg, sr)
+    return lambda: nsim_map(deg_img, ref_img, NSIM_L)
+
+
+def setup_create_reference_patches(ref, deg, sr):
+    from qualitymetrics.visqol.dsp import create_reference_patches
+    ref_img = band_spectrogram(ref, sr)
+    return lambda: create_reference_patches(np.copy(ref_img), WARPS, True, False)
+
+
+def setup_align_degraded_patches_nsim(ref, deg, sr):
+    from qualitymetrics.visqol.dsp import create_reference_patches, align_degraded_patches_nsim
+    from qualitymetrics.visqol.visqolarguments import VisqolArguments
+    ref_img, deg_img = band_spectrogram(ref, sr), band_spectrogram(deg, sr)
+    patches, indexes = create_reference_patches(ref_img, WARPS, True, False)
+    arguments = VisqolArguments(speech=True)
+    return lambda: align_degraded_patches_nsim(deg_img, patches, WARPS, deg_img.shape[0], indexes, NSIM_L,
+                                               arguments.speech, **arguments.patch_search_options)
+
+
+def setup_calc_ref_deg_similarity(ref, deg, sr):
+    from qualitymetrics.visqol.dsp import create_reference_patches, calc_ref_deg_similarity
+    ref_img, deg_img = band_spectrogram(ref, sr), band_spectrogram(deg, sr)
+    ref_patches, indexes = create_reference_patches(ref_img, WARPS, True, False)
+    deg_patches = np.array([deg_img[:, i:i + ref_patches.shape[2]] for i in indexes])
+    return lambda: calc_ref_deg_similarity(ref_patches, deg_patches, WARPS, NSIM_L, 'nsim')
+
+
+def setup_calculate_best_lag(ref, deg, sr):
+    from qualitymetrics.visqol.dsp import calculate_best_lag
+    return lambda: calculate_best_lag(ref, deg)
+
+
+def setup_goertzel(ref, deg, sr):
+    from qualitymetrics.visqol.analysiswindow import AnalysisWindow, calculate_window_size
+    from qualitymetrics.visqol.filterbank import GoertzelFilter
+    from qualitymetrics.visqol.spectrograms.goertzel import goertzel
+    size = calculate_window_size(sr)
+    window = AnalysisWindow(size=size, sample_rate=sr, data=np.hamming(size))
+    filterbank = GoertzelFilter()
+    # The same frame layout as build_spectrogram, which can't be imported without rastamat's dependencies.
+    step = len(window.data) - window.window_overlap
+    num_windows = (len(ref) - window.window_overlap) // step
+    time_spaces = [(step * i + len(window.data) / 2) / sr for i in range(num_windows - 1)]
+    return lambda: goertzel(ref, sr, filterbank, window, time_spaces, num_windows)
+
+
+def setup_gtgram(ref, deg, sr):
+    from qualitymetrics.visqol.spectrograms.gammatone import gtgram
+    return lambda: gtgram(ref, sr, 0.016, 0.016, NUM_BANDS, 50)
+
+
+def setup_melfcc(ref, deg, sr):
+    from qualitymetrics.visqol.spectrograms.rastamat import melfcc
+    return lambda: melfcc(ref * 3.3752, sr, min_freq=50, max_freq=min(16000, sr // 2), n_mfcc=13,
+                          n_bands=32, window_time=0.032, hop_time=0.016, preemph=0)
+
+
+def _node_result(ref, deg, sr):
+    return {'sr': sr, 'reference_signal': ref, 'degraded_signal': deg}
+
+
+def setup_mfcc_node(ref, deg, sr):
+    from nodes.warpq_nodes.mfccnode import MFCCNode
+    node = MFCCNode('mfcc', 'reference_signal', 'degraded_signal')
+    return lambda: node.execute(_node_result(ref, deg, sr))
+
+
+def setup_mel_node(ref, deg, sr):
+    from nodes.warpq_nodes.melnode import MelNode
+    node = MelNode('mel', 'reference_signal', 'degraded_signal')
+    return lambda: node.execute(_node_result(ref, deg, sr))
+
+
+def setup_warpq_sdtw(ref, deg, sr):
+    from nodes.warpq_nodes.mfccnode import MFCCNode
+    from nodes.warpq_nodes.warpqsdtwnode import WarpQSDTWNode
+    result = MFCCNode('mfcc', 'reference_signal', 'degraded_signal').execute(_node_result(ref, deg, sr))
+    node = WarpQSDTWNode('sdtw', 'warpq_score', 'mfcc_ref', 'mfcc_coded_patch')
+    return lambda: node.execute(dict(result))
+
+
+def setup_pypesq(ref, deg, sr):
+    from nodes.pesq_nodes.pypesqnode import PyPESQNode
+    node = PyPESQNode('pesq', ref_signal_key='reference_signal', deg_signal_key='degraded_signal',
+                      target_sample_rate=sr, pesq_mode='wb' if sr == 16000 else 'nb')
+    return lambda: node.execute(_node_result(ref, deg, sr))
+
+
+# name -> (setup function, supported sample rates or None for any)
+KERNELS = {
+    'nsim_map': (setup_nsim_map, None),
+    'create_reference_patches': (setup_create_reference_patches, None),
+    'align_degraded_patches_nsim': (setup_align_degraded_patches_nsim, None),
+    'calc_ref_deg_similarity': (setup_calc_ref_deg_similarity, None),
+    'calculate_best_lag': (setup_calculate_best_lag, None),
+    'goertzel': (setup_goertzel, None),
+    'gtgram': (setup_gtgram, None),
+    'melfcc': (setup_melfcc, None),
+    'MFCCNode': (setup_mfcc_node, None),
+    'MelNode': (setup_mel_node, None),
+    'WarpQSDTWNode': (setup_warpq_sdtw, None),
+    'PyPESQNode': (setup_pypesq, (8000, 16000)),
+}
+
+
+def time_kernel(run, repeat: int) -> dict:
+    """Time repeat calls of run, after a warm up call, returning the min, median and max in seconds."""
+    run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times), 'max': max(times), 'times': times}
+
+
+def run_benchmarks(kernels: list, sample_rates: list, durations: list, repeat: int) -> list:
+    """Run every kernel for every sample rate and duration, returning a result entry per run."""
+    results = []
+    for sr in sample_rates:
+        for duration in durations:
+            ref = speech_like_signal(sr, duration)
+            deg = degrade(ref, sr)
+            for name in kernels:
+                setup, supported_rates = KERNELS[name]
+                if supported_rates is not None and sr not in supported_rates:
+                    continue
+                entry = {'kernel': name, 'sample_rate': sr, 'duration': duration}
+                try:
+                    entry.update(status='ok', **time_kernel(setup(ref, deg, sr), repeat))
+                    print(f"{name:<28} {sr:>6} Hz {duration:>5g} s  median {entry['median'] * 1000:10.2f} ms")
+                except ImportError as err:
+                    entry.update(status='skipped', reason=str(err))
+                    print(f'{name:<28} {sr:>6} Hz {duration:>5g} s  skipped: {err}')
+                except Exception as err:
+                    entry.update(status='error', reason=f'{type(err).__name__}: {err}')
+                    print(f'{name:<28} {sr:>6} Hz {duration:>5g} s  error: {entry["reason"]}')
+                results.append(entry)
+    return results
+
+
+def find_regressions(results: list, baseline: list, thresholds: dict) -> list:
+    """Compare the median times of the results against a baseline.
+
+    Parameters
+    ----------
+    results : list
+        Result entries of the current run.
+    baseline : list
+        Result entries of the baseline run.
+    thresholds : dict
+        'default' is the allowed relative slowdown, e.g. 0.25 for 25%, and
+        'kernels' maps kernel names to their own allowed slowdown.
+
+    Returns
+    -------
+    regressions : list
+        A dict per kernel run which exceeded its threshold, or which raised
+        an error while it ran fine in the baseline.
+    """
+    base = {(e['kernel'], e['sample_rate'], e['duration']): e for e in baseline if e['status'] == 'ok'}
+    regressions = []
+    for entry in results:
+        key = (entry['kernel'], entry['sample_rate'], entry['duration'])
+        if key not in base:
+            continue
+        if entry['status'] == 'error':
+            regressions.append({'kernel': entry['kernel'], 'sample_rate': entry['sample_rate'],
+                                'duration': entry['duration'], 'error': entry['reason']})
+            continue
+        if entry['status'] != 'ok':
+            continue
+        allowed = thresholds.get('kernels', {}).get(entry['kernel'], thresholds.get('default', 0.25))
+        change = entry['median'] / base[key]['median'] - 1
+        if change > allowed:
+            regressions.append({'kernel': entry['kernel'], 'sample_rate': entry['sample_rate'],
+                                'duration': entry['duration'], 'baseline': base[key]['median'],
+                                'median': entry['median'], 'change': change, 'allowed': allowed})
+    return regressions
+
+
+def main():
+    args = init_argparser().parse_args()
+    unknown = set(args.only or []) - set(KERNELS)
+    if unknown:
+        print(f'Unknown kernels {sorted(unknown)}, expected any of {list(KERNELS)}')
+        sys.exit(1)
+    kernels = args.only or list(KERNELS)
+
+    results = run_benchmarks(kernels, args.sample_rates, args.durations, args.repeat)
+    output = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'repeat': args.repeat,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+        output['regressions'] = find_regressions(results, baseline, thresholds)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=4)
+    print(f'Wrote benchmark results to {args.output}')
+
+    for r in output.get('regressions', []):
+        if 'error' in r:
+            print(f"Regression: {r['kernel']} at {r['sample_rate']} Hz, {r['duration']:g} s ran in the baseline "
+                  f"but failed with {r['error']}")
+            continue
+        print(f"Regression: {r['kernel']} at {r['sample_rate']} Hz, {r['duration']:g} s took "
+              f"{r['median'] * 1000:.2f} ms, {r['change']:.0%} slower than the baseline "
+              f"(allowed {r['allowed']:.0%})")
+    if output.get('regressions'):
+        sys.exit(1)
+
+
+def init_argparser() -> argparse.ArgumentParser:
+    """Initialize an argument parser with all of the possible command line arguments that can be passed to this script.
+
+    Returns
+    -------
+    parser: argparse.ArgumentParser
+        Parser to be used to parse arguments
+    """
+    parser = argparse.ArgumentParser(usage="%(prog)s", description="run_benchmarks")
+    optional = parser.add_argument_group('Optional Arguments')
+    optional.add_argument('--output', default='results/benchmarks.json',
+                          help='Path the benchmark results are written to as JSON.')
+    optional.add_argument('--baseline',
+                          help='Results of a previous run to check the current run against for regressions.')
+    optional.add_argument('--thresholds', default=str(Path(__file__).resolve().parent / 'thresholds.json'),
+                          help='JSON file containing the allowed relative slowdown of each kernel.')
+    optional.add_argument('--sample_rates', type=int, nargs='+', default=[16000, 48000])
+    optional.add_argument('--durations', type=float, nargs='+', default=[2, 5, 10],
+                          help='Durations of the synthetic signals in seconds.')
+    optional.add_argument('--repeat', type=int, default=3,
+                          help='Number of timed runs of each kernel, after one warm up run.')
+    optional.add_argument('--only', nargs='+', metavar='KERNEL',
+                          help=f'Only run these kernels, any of: {", ".join(KERNELS)}')
+    return parser
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""Module containing the FeatureCache, a size bounded, content addressed on-disk cache of computed features.
+
+The spectrograms of the SpectrogramNode and the features of the MFCCNode and
+MelNode only depend on the signal and a handful of parameters, yet they are
+computed again for every row which reuses a reference and in every run. Once
+enabled with enable() (pipeline.py's --feature_cache), these nodes look the
+features up with cached() first.
+
+Entries are keyed on the sha1 of the signal's samples, shape and dtype,
+together with the name of the feature and every parameter affecting it, so
+a signal loaded from a different path, or a rerun of the same dataset, hits
+the cache while any change of settings misses it. Parameters can be plain
+values, arrays, functions or objects with a __dict__() method such as the
+Filterbank and AnalysisWindow. The version of the code computing a feature
+should be part of its parameters, so entries computed by an older version
+are not used.
+
+Each entry is a compressed .npz file at <root>/<xx>/<key>.npz. Reading an
+entry updates its modification time, and the least recently used entries
+are deleted once the files exceed the size limit. Several processes can
+share the directory, entries are written to a temporary file first and a
+missing entry is simply computed again.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import numpy as np
+
+from pathlib import Path
+from constants import LOGGER_NAME
+from typing import Callable
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class FeatureCache:
+    """Directory of computed features, evicting the least recently used ones once it exceeds max_bytes."""
+
+    def __init__(self, root: str, max_bytes: int=DEFAULT_MAX_BYTES):
+        """Initialize a FeatureCache, creating the directory if needed.
+
+        Parameters
+        ----------
+        root : str
+            Directory the features are stored in.
+        max_bytes : int, optional
+            Maximum size of the stored features in bytes. The default is
+            DEFAULT_MAX_BYTES (2 GiB).
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.nbytes = sum(entry.stat().st_size for entry in self.root.glob('*/*.npz'))
+
+
+    def get(self, name: str, signal: np.ndarray, params: dict, compute: Callable[[], tuple]) -> tuple:
+        """Get the stored arrays of a feature, calling compute and storing its result on a miss.
+
+        Parameters
+        ----------
+        name : str
+            Name of the feature.
+        signal : np.ndarray
+            The signal the feature is computed from.
+        params : dict
+            Every parameter affecting the feature.
+        compute : Callable[[], tuple]
+            Function computing the feature, returning a tuple of arrays.
+
+        Returns
+        -------
+        arrays : tuple
+            The arrays of the feature.
+        """
+        path = self.entry_path(feature_key(name, signal, params))
+        arrays = self._load(path)
+        with self._lock:
+            if arrays is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if arrays is not None:
+            return arrays
+        arrays = tuple(np.asarray(array) for array in compute())
+        self._save(path, arrays)
+        return arrays
+
+
+    def entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / f'{key}.npz'
+
+
+    def stats(self) -> dict:
+        """Get the hit/miss statistics of this process and the size of the stored features."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+    def drain_stats(self) -> tuple:
+        """Get the (hits, misses) counted since the last drain and reset them, used to send a worker's counts to its parent."""
+        with self._lock:
+            counts = (self.hits, self.misses)
+            self.hits = self.misses = 0
+            return counts
+
+
+    def merge_stats(self, counts: tuple):
+        """Add the (hits, misses) drained from another process."""
+        with self._lock:
+            self.hits += counts[0]
+            self.misses += counts[1]
+
+
+    def _load(self, path: Path) -> tuple:
+        try:
+            with np.load(path) as data:
+                arrays = tuple(data[f'arr_{n}'] for n in range(len(data.files)))
+            # Reading an entry makes it the most recently used.
+            os.utime(path)
+            return arrays
+        except (FileNotFoundError, ValueError, OSError):
+            # Missing, evicted by another process, or incomplete.
+            return None
+
+
+    def _save(self, path: Path, arrays: tuple):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npz')
+        np.savez_compressed(tmp, *arrays)
+        size = tmp.stat().st_size
+        os.replace(tmp, path)
+        with self._lock:
+            self.nbytes += size
+            if self.nbytes > self.max_bytes:
+                self._evict()
+
+
+    def _evict(self):
+        """Delete the least recently used entries until the stored features fit in max_bytes."""
+        entries = []
+        for entry in self.root.glob('*/*.npz'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+        entries.sort()
+        # Other processes sharing the directory add entries too, so start
+        # from the size actually on disk.
+        self.nbytes = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if self.nbytes <= self.max_bytes:
+                break
+            try:
+                entry.unlink()
+            except FileNotFoundError:
+                pass
+            self.nbytes -= size
+            self.evictions += 1
+
+
+def feature_key(name: str, signal: np.ndarray, params: dict) -> str:
+    """Get the key of a feature, the sha1 of its name, parameters and the contents of the signal."""
+    signal = np.ascontiguousarray(signal)
+    digest = hashlib.sha1(repr((name, signal.shape, signal.dtype.str, _canonical(params))).encode())
+    digest.update(signal.data)
+    return digest.hexdigest()
+
+
+def _canonical(value):
+    """Convert a parameter to a value whose repr only depends on its contents."""
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        return ('ndarray', value.shape, value.dtype.str, hashlib.sha1(value.data).hexdigest())
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _canonical(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical(v) for v in value)
+    if isinstance(value, (str, bool, int, float, type(None), np.generic)):
+        return value
+    if callable(getattr(value, '__dict__', None)):
+        # The Filterbank and AnalysisWindow describe their parameters with a
+        # __dict__() method.
+        return (type(value).__name__, _canonical(value.__dict__()))
+    if callable(value):
+        return f'{getattr(value, "__module__", "")}.{getattr(value, "__qualname__", repr(value))}'
+    return repr(value)
+
+
+_CACHE = None
+
+
+def enable(root: str, max_bytes: int=DEFAULT_MAX_BYTES) -> FeatureCache:
+    """Enable the process-wide FeatureCache, stored in root."""
+    global _CACHE
+    _CACHE = FeatureCache(root, max_bytes)
+    return _CACHE
+
+
+def get_cache() -> FeatureCache:
+    """Get the process-wide FeatureCache, None if it isn't enabled."""
+    return _CACHE
+
+
+def cached(name: str, signal: np.ndarray, params: dict, compute: Callable[[], tuple]) -> tuple:
+    """Get a feature through the process-wide FeatureCache, or compute it if the cache isn't enabled, see FeatureCache.get."""
+    if _CACHE is None:
+        return tuple(np.asarray(array) for array in compute())
+    return _CACHE.get(name, signal, params, compute)
+
+
+def log_stats():
+    """Log the hit rate of the process-wide FeatureCache, if it's enabled."""
+    if _CACHE is None:
+        return
+    stats = _CACHE.stats()
+    LOGGER.info('Feature cache: %d hits, %d misses (%.1f%% hit rate), %d evictions, %.1f MiB of %.1f MiB used',
+                stats['hits'], stats['misses'], stats['hit_rate'] * 100, stats['evictions'],
+                stats['bytes'] / 1024 ** 2, stats['max_bytes'] / 1024 ** 2)
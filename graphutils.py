@@ -2,10 +2,15 @@
 
 import importlib
 import logging
+import os
+import profiling
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from constants import LOGGER_NAME
 from nodes.node import NestedNode, Node
 from pathlib import Path
+from resultcontext import ResultContext
 from typing import Dict, List, Tuple
 
 LOGGER = logging.getLogger(LOGGER_NAME)
@@ -20,6 +25,131 @@ DESERIALIZED_NODES = []
 # Global counter to ensure each node deserialized gets a unique int id
 n_id = 0
 
+# Number of threads used to run sibling branches of the graph. With a single
+# worker the original depth-first scheduler is used.
+branch_workers = 1
+
+# Thread pool running the branches, shared by every run_node_concurrent call 
+# of this process, and the semaphore limiting the branches submitted to it, 
+# see _get_branch_pool.
+_branch_pool = None
+_branch_slots = None
+_branch_pool_pid = None
+_branch_pool_workers = 0
+_branch_pool_lock = threading.Lock()
+
+
+class Join:
+    """Gate for a node which must wait for several branches before it executes.
+
+    A new Join is created every time a graph is run, so the number of arrivals
+    starts from zero again for each iteration of a LoopNode.
+    """
+
+    def __init__(self, expected: int):
+        """Initialize a Join.
+
+        Parameters
+        ----------
+        expected : int
+            The number of arrivals required before the node can execute.
+        """
+        self.expected = expected
+        self.count = 0
+        self._lock = threading.Lock()
+
+
+    def arrive(self, count: int=1) -> bool:
+        """Record arrivals and return True when the expected number has been reached."""
+        with self._lock:
+            self.count += count
+            return self.count == self.expected
+
+
+def set_branch_workers(workers: int):
+    """Set the number of threads used to run sibling branches of the graph.
+
+    Parameters
+    ----------
+    workers : int
+        Number of threads. 1 uses the original depth-first scheduler.
+    """
+    global branch_workers
+    branch_workers = max(1, workers)
+    _shutdown_branch_pool()
+
+
+def _get_branch_pool(max_workers: int) -> Tuple[ThreadPoolExecutor, threading.Semaphore]:
+    """Get the thread pool and semaphore of the branches, creating them on the first call of this process.
+
+    A branch is only submitted to the pool once it holds one of the 
+    max_workers slots of the semaphore, otherwise it runs on the thread that 
+    forked it. As the pool has as many threads as slots, a submitted branch
+    always has a thread of its own, including the branches forked by a 
+    nested run_node_concurrent call, e.g. inside a LoopNode iteration, which
+    can't wait on branches queued behind their own parents.
+    """
+    global _branch_pool, _branch_slots, _branch_pool_pid, _branch_pool_workers
+    with _branch_pool_lock:
+        # Processes forked by a LoopNode don't inherit the threads of the pool.
+        if _branch_pool is None or _branch_pool_pid != os.getpid() or _branch_pool_workers != max_workers:
+            if _branch_pool is not None and _branch_pool_pid == os.getpid():
+                _branch_pool.shutdown(wait=False)
+            _branch_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='branch')
+            _branch_slots = threading.Semaphore(max_workers)
+            _branch_pool_pid = os.getpid()
+            _branch_pool_workers = max_workers
+        return _branch_pool, _branch_slots
+
+
+def _shutdown_branch_pool():
+    """Shut the thread pool of the branches down, waiting for the running branches."""
+    global _branch_pool, _branch_slots
+    with _branch_pool_lock:
+        if _branch_pool is not None and _branch_pool_pid == os.getpid():
+            _branch_pool.shutdown(wait=True)
+        _branch_pool = _branch_slots = None
+
+
+def _expected_arrivals(node: Node) -> int:
+    """Get the number of branches a node has to wait for, None if it doesn't wait.
+
+    Only nodes which declare num_expected_results (SinkNode) wait, any other
+    node with several parents is executed once per branch reaching it, by
+    every scheduler.
+    """
+    return getattr(node, 'num_expected_results', None)
+
+
+def _execute(node: Node, result: dict, **kwargs):
+    """Execute a node, through the active Profiler if profiling is enabled."""
+    if (profiler := profiling.get_profiler()) is not None:
+        return profiler.execute(node, result, **kwargs)
+    return node.execute(result, **kwargs)
+
+
+def _execute_batch(node: Node, results: List[dict], **kwargs) -> list:
+    """Execute a node on a batch, through the active Profiler if profiling is enabled."""
+    if (profiler := profiling.get_profiler()) is not None:
+        return profiler.execute_batch(node, results, **kwargs)
+    return node.execute_batch(results, **kwargs)
+
+
+def _count_in_edges(node: Node) -> Dict[int, int]:
+    """Count the number of edges going into each node reachable from the given node."""
+    in_degree = {}
+    visited = set()
+    stack = [node]
+    while len(stack) > 0:
+        current_node = stack.pop()
+        if current_node.n_id in visited:
+            continue
+        visited.add(current_node.n_id)
+        for child in current_node.children:
+            in_degree[child.n_id] = in_degree.get(child.n_id, 0) + 1
+            stack.append(child)
+    return in_degree
+
 def _deserialize(data: dict, node_id: str) -> Node:
     """Deserialize a dictionary, loaded from a json file to a Node
     
@@ -63,6 +193,11 @@ def run_node(node: Node, result: dict, **kwargs):
     recursive functions. This results in it containing all the necessary 
     information for use when needed.
     
+    Nodes which declare num_expected_results (SinkNode) are only executed once
+    that many branches have reached them during this call.
+    
+    If more than one branch worker has been set with set_branch_workers, the
+    graph is run by run_node_concurrent instead.
 
     Parameters
     ----------
@@ -77,12 +212,23 @@ def run_node(node: Node, result: dict, **kwargs):
     None.
 
     """
+    if branch_workers > 1:
+        run_node_concurrent(node, result, branch_workers, **kwargs)
+        return
+
+    joins = {}
     stack = []
     stack.append(node)
     while len(stack) > 0:
         current_node = stack.pop()
         children = current_node.children
-        if (r := current_node.execute(result, **kwargs)) is None:
+        if (expected := _expected_arrivals(current_node)) is not None:
+            join = joins.setdefault(current_node.n_id, Join(expected))
+            if not join.arrive():
+                LOGGER.debug("%s waiting on %d more branches.", current_node.id_, join.expected - join.count)
+                continue
+
+        if (r := _execute(current_node, result, **kwargs)) is None:
             LOGGER.debug("None result, not continuing with this branch.")
             continue
 
@@ -92,6 +238,290 @@ def run_node(node: Node, result: dict, **kwargs):
             stack.append(children[i])
 
 
+def run_node_batch(node: Node, results: List[dict], **kwargs):
+    """Run the graph starting at node on a batch of result dictionaries.
+    
+    Works like run_node, except each node is executed once for the whole 
+    batch using its execute_batch function, before moving on to its children.
+    If a node returns None for some of the result dictionaries, only the 
+    branch of those dictionaries is stopped. Joins are counted separately for
+    each result dictionary. Branches are always run depth-first, regardless
+    of set_branch_workers.
+
+    Parameters
+    ----------
+    node : Node
+        The first node to execute.
+    results : List[dict]
+        One result dictionary per entry in the batch.
+
+    Returns
+    -------
+    None.
+
+    """
+    joins = {}
+    stack = [(node, list(range(len(results))))]
+    while len(stack) > 0:
+        current_node, batch = stack.pop()
+        children = current_node.children
+        if (expected := _expected_arrivals(current_node)) is not None:
+            batch = [b for b in batch if joins.setdefault((current_node.n_id, b), Join(expected)).arrive()]
+            if len(batch) == 0:
+                LOGGER.debug("%s waiting on more branches.", current_node.id_)
+                continue
+
+        returned = _execute_batch(current_node, [results[b] for b in batch], **kwargs)
+        batch = [b for b, r in zip(batch, returned) if r is not None]
+        if len(batch) == 0:
+            LOGGER.debug("None result, not continuing with this branch.")
+            continue
+
+        for i in range(len(children)-1, -1, -1):
+            stack.append((children[i], batch))
+
+
+class ExecutionPlan:
+    """A graph flattened into the order run_node executes it, with the keys that can be released after each node.
+
+    Created by compile_plan.
+    """
+
+    def __init__(self, steps: List[Node], subtree_ends: List[int], releases: List[List[str]]):
+        """Initialize an ExecutionPlan.
+
+        Parameters
+        ----------
+        steps : List[Node]
+            The nodes in the order they are executed.
+        subtree_ends : List[int]
+            For each step, the index of the first step after its subtree. Used
+            to skip the subtree when the node returns None.
+        releases : List[List[str]]
+            For each step, the keys which are no longer needed once it has run.
+        """
+        self.steps = steps
+        self.subtree_ends = subtree_ends
+        self.releases = releases
+
+
+def compile_plan(root_node: Node, keep: list=None) -> ExecutionPlan:
+    """Compile the graph starting at root_node into an ExecutionPlan.
+
+    Each key written by a node is released from the result dictionary right
+    after the last node reading or writing it, unless it is in keep. A key is
+    only released if every node declares its keys through input_keys and 
+    output_keys, nodes which don't (e.g. a LoopNode reading its iterable) 
+    keep every key alive until they have run.
+
+    Parameters
+    ----------
+    root_node : Node
+        The first node of the graph.
+    keep : list, optional
+        Keys which must still be in the result dictionary after the graph has
+        run. The default is None.
+
+    Returns
+    -------
+    plan : ExecutionPlan
+        The compiled plan, None if the graph has nodes with more than one 
+        parent or which wait for several branches, as those don't execute in
+        a single fixed order.
+    """
+    in_degree = _count_in_edges(root_node)
+    steps, subtree_ends = [], []
+
+    def flatten(node: Node):
+        index = len(steps)
+        steps.append(node)
+        subtree_ends.append(None)
+        for child in node.children:
+            flatten(child)
+        subtree_ends[index] = len(steps)
+
+    flatten(root_node)
+    if any(in_degree.get(n.n_id, 0) > 1 or _expected_arrivals(n) is not None for n in steps):
+        LOGGER.debug("Graph starting at %s has joins, keys won't be released early.", root_node.id_)
+        return None
+
+    keep = set(keep) if keep else set()
+    last_use, produced = {}, set()
+    pinned = -1
+    for i, node in enumerate(steps):
+        if (reads := node.input_keys()) is None:
+            pinned = i
+        for key in (reads or []) + (node.output_keys() or []):
+            last_use[key] = i
+        produced.update(node.output_keys() or [])
+
+    releases = [[] for _ in steps]
+    for key in produced - keep:
+        releases[max(last_use[key], pinned)].append(key)
+    return ExecutionPlan(steps, subtree_ends, releases)
+
+
+def _release(result: dict, keys: List[str]):
+    """Drop keys which are no longer needed from the result dictionary."""
+    for key in keys:
+        if isinstance(result, ResultContext):
+            result.discard(key)
+        else:
+            result.pop(key, None)
+
+
+def run_plan(plan: ExecutionPlan, result: dict, **kwargs):
+    """Run a graph compiled with compile_plan.
+    
+    Executes the nodes in the same order as run_node, without walking the 
+    graph, and releases each key from the result dictionary as soon as it is
+    no longer needed. If a node returns None its subtree is skipped, and the
+    keys only used in that subtree are released. If more than one branch 
+    worker has been set with set_branch_workers, the graph is run by 
+    run_node_concurrent instead and nothing is released early.
+
+    Parameters
+    ----------
+    plan : ExecutionPlan
+        The compiled graph.
+    result : dict
+        Dictionary containing the results of executing each node in the graph.
+
+    Returns
+    -------
+    None.
+
+    """
+    if branch_workers > 1:
+        run_node_concurrent(plan.steps[0], result, branch_workers, **kwargs)
+        return
+
+    i = 0
+    while i < len(plan.steps):
+        if _execute(plan.steps[i], result, **kwargs) is None:
+            LOGGER.debug("None result, not continuing with this branch.")
+            end = plan.subtree_ends[i]
+        else:
+            end = i + 1
+        for j in range(i, end):
+            _release(result, plan.releases[j])
+        i = end
+
+
+class _BranchScheduler:
+    """Runs the branches of a graph on a thread pool, see run_node_concurrent."""
+
+    def __init__(self, pool: ThreadPoolExecutor, slots: threading.Semaphore, **kwargs):
+        self.pool = pool
+        self.slots = slots
+        self.kwargs = kwargs
+
+
+    def run_branch(self, node: Node, result: dict) -> Dict[int, Tuple[Node, Join]]:
+        """Run a node and everything below it that doesn't depend on other branches.
+
+        Returns the joins this branch reached without being able to execute
+        them, so the owner of the enclosing fork can merge their arrivals.
+        """
+        reached = {}
+        ready = [node]
+        while len(ready) > 0:
+            if len(ready) == 1:
+                current_node = ready[0]
+                if _execute(current_node, result, **self.kwargs) is None:
+                    LOGGER.debug("None result, not continuing with this branch.")
+                    ready = []
+                else:
+                    ready = self._arrive(current_node.children, reached)
+            else:
+                ready = self._fork(ready, result, reached)
+
+            if len(ready) == 0:
+                ready = [n for n, join in reached.values() if join.count == join.expected]
+                for n in ready:
+                    reached.pop(n.n_id)
+        return reached
+
+
+    def _arrive(self, children: List[Node], reached: dict) -> List[Node]:
+        """Record arrivals at joins, returning the children that can run straight away."""
+        ready = []
+        for child in children:
+            expected = _expected_arrivals(child)
+            if expected is None:
+                ready.append(child)
+            else:
+                reached.setdefault(child.n_id, (child, Join(expected)))[1].arrive()
+        return ready
+
+
+    def _fork(self, nodes: List[Node], result: dict, reached: dict) -> List[Node]:
+        """Run sibling branches concurrently, each in its own layer on top of the result.
+
+        Once every branch has finished, the layers are merged back into the
+        result in the order of the children, so later siblings win as they do
+        with the depth-first scheduler.
+        """
+        layers = [ResultContext(result) for _ in nodes]
+        futures, inline = [], [(nodes[0], layers[0])]
+        for n, layer in zip(nodes[1:], layers[1:]):
+            if self.slots.acquire(blocking=False):
+                futures.append(self.pool.submit(self._run_in_slot, n, layer))
+            else:
+                inline.append((n, layer))
+
+        branch_reached = [self.run_branch(n, layer) for n, layer in inline]
+        branch_reached += [f.result() for f in futures]
+        for layer in layers:
+            layer.commit()
+        for joins in branch_reached:
+            for n_id, (n, join) in joins.items():
+                reached.setdefault(n_id, (n, Join(join.expected)))[1].arrive(join.count)
+        return []
+
+
+    def _run_in_slot(self, node: Node, result: dict) -> dict:
+        try:
+            return self.run_branch(node, result)
+        finally:
+            self.slots.release()
+
+
+def run_node_concurrent(node: Node, result: dict, max_workers: int, **kwargs):
+    """Run the graph starting at node, executing independent branches on a thread pool.
+    
+    Whenever a node has more than one child, each child branch is run on a
+    thread of its own. A branch sees the result dictionary as it was when the
+    branches split and writes into a separate layer, the layers are merged
+    back into the result when all of the branches are done. Nodes which 
+    declare num_expected_results act as joins and are executed once, on the
+    merged result, after all of their incoming branches have arrived. Like 
+    with run_node, other nodes with more than one parent are executed once 
+    per branch reaching them.
+
+    The thread pool is created by the first call and reused by the following
+    ones, e.g. every iteration of a LoopNode, see _get_branch_pool.
+
+    Parameters
+    ----------
+    node : Node
+        The first node to execute.
+    result : dict
+        Dictionary containing the results of executing each node in the graph.
+    max_workers : int
+        Maximum number of branches executing at the same time.
+
+    Returns
+    -------
+    None.
+
+    """
+    pool, slots = _get_branch_pool(max_workers)
+    scheduler = _BranchScheduler(pool, slots, **kwargs)
+    for n, join in scheduler.run_branch(node, result).values():
+        LOGGER.debug("%s only reached by %d of %d branches, not executed.", n.id_, join.count, join.expected)
+
+
 def build_graph(graph_definition: dict) -> Dict[Node, str]:
     """
     Creates the graph using the provided graph definition. Does this by
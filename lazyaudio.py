@@ -0,0 +1,239 @@
+"""Module containing LazyAudio, a handle on an audio file which only decodes the frames it's sliced with.
+
+A LoadSignalNode with "lazy" set stores a LazyAudio in the result dict
+instead of the decoded signal. Only the header of the file is read when the
+handle is created, which gives the shape, sample rate and number of channels
+of the signal at the target sample rate. Slicing the handle decodes just the
+frames covering the slice, in blocks, e.g. `signal[:48000]` only decodes
+the first second of a 48 kHz recording.
+
+When the file has to be resampled, a margin of RESAMPLE_MARGIN_SECONDS is
+decoded on each side of the slice, so the filter of the resampler sees the
+same neighbouring samples it would when resampling the whole signal, and
+the slice matches the whole resampled signal to within floating point
+error.
+
+The whole signal is only decoded when a node asks for it by calling
+materialize(), or the module level materialize() which also accepts a
+decoded signal. The decoded signal is then kept by the handle, so it's
+decoded at most once. Using the handle as an array otherwise, e.g. through
+a numpy function, arithmetic or an ndarray attribute such as .T, raises a
+TypeError rather than decoding the whole signal behind the node's back.
+
+The bytes of an archive member are read once and kept by the handle, so
+slicing a handle on a member doesn't read the archive again.
+"""
+
+import io
+import logging
+import math
+import numpy as np
+import soundfile as sf
+import audioarchive
+import audioloader
+
+from constants import LOGGER_NAME
+from typing import Callable
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+# Number of frames decoded at a time when slicing.
+BLOCK_FRAMES = 65536
+
+# Seconds decoded on each side of a slice which has to be resampled.
+RESAMPLE_MARGIN_SECONDS = 0.1
+
+
+def materialize(signal) -> np.ndarray:
+    """Get the whole signal of a LazyAudio, or return the signal as is if it's already an array."""
+    return signal.materialize() if isinstance(signal, LazyAudio) else signal
+
+
+class LazyAudio:
+    """Handle on an audio file exposing its metadata, and decoding only the frames it's sliced with.
+
+    The shape is the one the decoded signal has, (frames,) for a mono signal
+    and (channels, frames) otherwise.
+    """
+
+    def __init__(self, path: str, target_sample_rate: int, mono: bool, resampler: str='high_quality',
+                 load: Callable[[], np.ndarray]=None):
+        """Initialize a LazyAudio, reading the header of the file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the audio file, which can be an archive member.
+        target_sample_rate : int
+            Sample rate the signal is resampled to.
+        mono : bool
+            Whether the signal is mixed down to mono.
+        resampler : str, optional
+            One of audioloader.RESAMPLERS. The default is 'high_quality'.
+        load : Callable[[], np.ndarray], optional
+            Function decoding the whole signal, called by materialize(). The
+            default is None, which uses audioloader.load_audio.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the file doesn't exist.
+        RuntimeError
+            If soundfile can't read the file.
+        """
+        self.path = path
+        self.sample_rate = target_sample_rate
+        self.mono = mono
+        self.resampler = resampler
+        self._load = load
+        self._audio = None
+        self._member_bytes = None
+        with self._open() as f:
+            self.native_sample_rate = f.samplerate
+            self.native_frames = f.frames
+            self.native_channels = f.channels
+        self.channels = 1 if mono else self.native_channels
+        if self.native_sample_rate == target_sample_rate:
+            self.frames = self.native_frames
+        else:
+            self.frames = math.ceil(self.native_frames * target_sample_rate / self.native_sample_rate)
+        self.dtype = np.dtype(np.float32)
+
+
+    @property
+    def shape(self) -> tuple:
+        if self._audio is not None:
+            return self._audio.shape
+        return (self.frames,) if self.channels == 1 else (self.channels, self.frames)
+
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+
+    @property
+    def duration(self) -> float:
+        """Length of the signal in seconds."""
+        return self.native_frames / self.native_sample_rate
+
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+
+    def __getitem__(self, key):
+        if self._audio is not None:
+            return self._audio[key]
+        if self.ndim == 2:
+            # Only the frames are sliced lazily, the channels are taken from
+            # the decoded frames.
+            channel_key, frame_key = (key + (slice(None),))[:2] if isinstance(key, tuple) else (key, slice(None))
+            return self._frames(frame_key)[channel_key]
+        if isinstance(key, tuple):
+            if len(key) != 1:
+                raise IndexError('too many indices for a 1D signal')
+            key = key[0]
+        return self._frames(key)
+
+
+    def materialize(self) -> np.ndarray:
+        """Decode the whole signal, once."""
+        if self._audio is None:
+            LOGGER.debug("Materializing %s", self.path)
+            if self._load is not None:
+                self._audio = self._load()
+            else:
+                self._audio = audioloader.load_audio(self.path, self.sample_rate, self.mono,
+                                                     resampler=self.resampler)[0]
+        return self._audio
+
+
+    def __array__(self, dtype=None):
+        raise TypeError(f"{self!r} has to be materialized before it's used as an array, see lazyaudio.materialize")
+
+
+    # Opt out of numpy's operators, so arithmetic with an array raises a
+    # TypeError instead of building an object array.
+    __array_ufunc__ = None
+
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        raise AttributeError(f"'LazyAudio' object has no attribute {name!r}, materialize() it to use it as an array")
+
+
+    def __getstate__(self):
+        # The load function can refer to a node, so the handle falls back to
+        # audioloader once it's pickled, e.g. sent back by a LoopNode worker.
+        state = dict(self.__dict__)
+        state['_load'] = None
+        state['_member_bytes'] = None
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+    def __repr__(self):
+        return f"LazyAudio({str(self.path)!r}, shape={self.shape}, sample_rate={self.sample_rate})"
+
+
+    def _open(self) -> sf.SoundFile:
+        if audioarchive.is_member_path(self.path):
+            if self._member_bytes is None:
+                self._member_bytes = audioarchive.read_member(self.path)
+            return sf.SoundFile(io.BytesIO(self._member_bytes))
+        return sf.SoundFile(str(self.path))
+
+
+    def _frames(self, key) -> np.ndarray:
+        """Decode the frames selected by an integer or a slice, returning them as the decoded signal would be indexed."""
+        if isinstance(key, (int, np.integer)):
+            index = key + self.frames if key < 0 else key
+            if not 0 <= index < self.frames:
+                raise IndexError(f'index {key} is out of bounds for a signal of {self.frames} frames')
+            return self._frames(slice(index, index + 1))[..., 0]
+        if not isinstance(key, slice):
+            # Fancy indexing, e.g. with a mask, needs the whole signal.
+            raise TypeError(f"{self!r} can only be indexed with integers and slices, materialize() it to index it with {type(key).__name__}")
+        start, stop, step = key.indices(self.frames)
+        if step < 0 and start > stop:
+            # Decode the covered frames in order and reverse them.
+            first = stop + 1 + (start - stop - 1) % -step
+            return self._frames(slice(first, start + 1))[..., ::step]
+        if step < 0 or start >= stop:
+            return np.zeros(self.shape[:-1] + (0,), dtype=np.float32)
+        return self._decode_range(start, stop)[..., ::step]
+
+
+    def _decode_range(self, start: int, stop: int) -> np.ndarray:
+        """Decode the frames [start, stop) of the signal at the target sample rate."""
+        if self.native_sample_rate == self.sample_rate:
+            return self._read_native(start, stop)
+        gcd = math.gcd(self.native_sample_rate, self.sample_rate)
+        up, down = self.sample_rate // gcd, self.native_sample_rate // gcd
+        # Start decoding at a native frame which falls exactly on a target
+        # frame, a whole number of filter periods before the slice.
+        margin = math.ceil(RESAMPLE_MARGIN_SECONDS * self.native_sample_rate / down)
+        period = max(0, start // up - margin)
+        native_start = period * down
+        native_stop = min(self.native_frames, math.ceil(stop * down / up) + margin * down)
+        audio = audioloader.resample(self._read_native(native_start, native_stop), self.native_sample_rate,
+                                     self.sample_rate, self.resampler)
+        offset = start - period * up
+        return audio[..., offset:offset + stop - start]
+
+
+    def _read_native(self, start: int, stop: int) -> np.ndarray:
+        """Decode the frames [start, stop) of the file at its native sample rate, BLOCK_FRAMES at a time."""
+        with self._open() as f:
+            f.seek(start)
+            blocks = list(f.blocks(blocksize=BLOCK_FRAMES, frames=stop - start, dtype='float32', always_2d=True))
+        audio = np.concatenate(blocks) if blocks else np.zeros((0, self.native_channels), dtype=np.float32)
+        if self.mono and self.native_channels > 1:
+            # The same mix down as librosa.to_mono.
+            return np.ascontiguousarray(np.mean(audio.T, axis=0))
+        return np.ascontiguousarray(audio.T[0] if self.native_channels == 1 else audio.T)
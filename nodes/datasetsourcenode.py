@@ -0,0 +1,121 @@
+"""Module containing the DatasetSourceNode. Used to stream the rows of a csv or parquet dataset."""
+
+import sys
+import logging
+import pandas as pd
+
+from .node import AQPNode
+from pathlib import Path
+from constants import LOGGER_NAME
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    # Only needed to read parquet datasets.
+    pq = None
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+FORMATS = ('csv', 'parquet')
+
+
+class DatasetStream:
+    """Iterable over the rows of a dataset, yielding a tuple of the projected column values per row.
+
+    The file is read chunk_size rows at a time, each time the stream is
+    iterated over, so only a single chunk is held in memory. The stream
+    only stores where to read from, so it's cheap to pickle and send to
+    the worker processes of a LoopNode.
+    """
+
+    def __init__(self, path: str, columns: list, chunk_size: int, file_format: str):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.chunk_size = chunk_size
+        self.file_format = file_format
+
+
+    def __iter__(self):
+        for chunk in self._chunks():
+            yield from zip(*chunk)
+
+
+    def _chunks(self):
+        """Yield the values of the projected columns of each chunk, as one list per column."""
+        if self.file_format == 'parquet':
+            parquet_file = pq.ParquetFile(self.path)
+            for batch in parquet_file.iter_batches(batch_size=self.chunk_size, columns=self.columns):
+                yield [batch.column(column).to_pylist() for column in self.columns]
+        else:
+            with pd.read_csv(self.path, usecols=self.columns, chunksize=self.chunk_size) as reader:
+                for chunk in reader:
+                    yield [chunk[column].tolist() for column in self.columns]
+
+
+    def __repr__(self):
+        return f"DatasetStream({str(self.path)!r}, columns={self.columns})"
+
+
+class DatasetSourceNode(AQPNode):
+    """Node which stores a DatasetStream over the rows of a csv or parquet file in the result dictionary upon execution."""
+
+    def __init__(self, id_: str, output_key: str, path: str, columns: list=None,
+                 chunk_size: int=10000, file_format: str=None, draw_options=None, **kwargs):
+        """Initialize a DatasetSourceNode.
+
+        Parameters
+        ----------
+        path : str
+            Path to the csv or parquet file to stream.
+        columns : list, optional
+            The columns to read, each row is yielded as a tuple of their values
+            in this order. The default is None, which reads the reference and
+            degraded file columns, ['Ref_Wave', 'Test_Wave'].
+        chunk_size : int, optional
+            Number of rows read from the file at a time. The default is 10000.
+        file_format : str, optional
+            One of FORMATS. The default is None, which uses the extension of
+            the file, '.parquet' or '.pq' for parquet and csv otherwise.
+
+        Raises
+        ------
+        ValueError
+            If the format isn't supported, or parquet is requested without
+            pyarrow installed.
+        """
+        super().__init__(id_, output_key=output_key, draw_options=draw_options)
+        self.path = Path(path)
+        self.columns = columns if columns else ['Ref_Wave', 'Test_Wave']
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+        self.chunk_size = chunk_size
+        if file_format is None:
+            file_format = 'parquet' if self.path.suffix.lower() in ('.parquet', '.pq') else 'csv'
+        if file_format not in FORMATS:
+            raise ValueError(f'file_format must be one of {FORMATS}')
+        if file_format == 'parquet' and pq is None:
+            raise ValueError("Reading parquet datasets requires the pyarrow package, pip install pyarrow")
+        self.file_format = file_format
+        self.type_ = 'DatasetSourceNode'
+
+
+    def execute(self, result: dict, **kwargs):
+        """Execute the DatasetSourceNode.
+
+        Assigns a DatasetStream over the file to the output key of the node.
+        Nothing is read until the stream is iterated over, e.g. by a LoopNode.
+        """
+        super().execute(result, **kwargs)
+        if not self.path.exists():
+            LOGGER.error("Dataset %s doesn't exist", self.path)
+            sys.exit(-1)
+        result[self.output_key] = DatasetStream(self.path, self.columns, self.chunk_size, self.file_format)
+        return result
+
+
+    def input_keys(self) -> list:
+        return []
+
+
+    def output_keys(self) -> list:
+        return [self.output_key]
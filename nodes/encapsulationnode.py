@@ -7,6 +7,7 @@ import graphutils
 
 from .node import NestedNode
 from pathlib import Path
+from resultcontext import ResultContext
 from constants import LOGGER_NAME
 
 LOGGER = logging.getLogger(LOGGER_NAME)
@@ -58,8 +59,29 @@ class EncapsulationNode(NestedNode):
         
         Runs each node contained in the stored execution node. Starting with 
         the execution_node and working it's way through the children of that 
-        node.
+        node. The encapsulated graph runs in a ResultContext on top of the 
+        result, its outputs are written back to the result once it finishes.
         """
         super().execute(result, **kwargs)
-        graphutils.run_node(self.execution_node, result, **kwargs)
+        context = ResultContext(result)
+        graphutils.run_node(self.execution_node, context, **kwargs)
+        context.commit()
         return result
+
+
+    def input_keys(self) -> list:
+        return self._collect_keys(lambda node: node.input_keys())
+
+
+    def output_keys(self) -> list:
+        return self._collect_keys(lambda node: node.output_keys())
+
+
+    def _collect_keys(self, get_keys) -> list:
+        """Combine the keys of every encapsulated node, None if any of them are unknown."""
+        keys = []
+        for node in self.nodes.values():
+            if (node_keys := get_keys(node)) is None:
+                return None
+            keys += [k for k in node_keys if k not in keys]
+        return keys
@@ -42,4 +42,12 @@ class GraphNode(AQPNode):
 
         plt.tight_layout()
         plt.show() 
-        return result
\ No newline at end of file
+        return result
+
+
+    def input_keys(self) -> list:
+        return [self.df_key]
+
+
+    def output_keys(self) -> list:
+        return []
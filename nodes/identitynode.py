@@ -19,4 +19,12 @@ class IdentityNode(AQPNode):
     def execute(self, result: dict, **kwargs):
         """Do Nothing."""
         super().execute(result)
-        return result
\ No newline at end of file
+        return result
+
+
+    def input_keys(self) -> list:
+        return []
+
+
+    def output_keys(self) -> list:
+        return []
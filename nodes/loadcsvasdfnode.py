@@ -38,3 +38,11 @@ class LoadCSVAsDFNode(AQPNode):
             LOGGER.error(err)
             sys.exit(-1)
         return result
+
+
+    def input_keys(self) -> list:
+        return []
+
+
+    def output_keys(self) -> list:
+        return [self.output_key]
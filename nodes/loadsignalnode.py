@@ -2,21 +2,29 @@
 
 import sys
 import logging
+import audiocache
+import audioloader
+import functools
+import profiling
 
 from .node import AQPNode
+from audiostore import AudioStore
+from lazyaudio import LazyAudio
 from pathlib import Path
-from librosa import load
 from constants import LOGGER_NAME
 
 LOGGER = logging.getLogger(LOGGER_NAME)
 
+
 class LoadSignalNode(AQPNode):
     """Node which loads a signal from either a file path contained within the result dict or from a path passed during initialization."""
     
     def __init__(self, id_: str, output_key: str, file_name_key: str,
                  signal_path: str=None, signal_key: str=None,
                  target_sample_rate: int=48000, mono: bool=False, 
-                 draw_options=None, **kwargs):
+                 use_cache: bool=True, audio_store: str=None,
+                 backend: str='soundfile', resampler: str='high_quality',
+                 lazy: bool=False, draw_options=None, **kwargs):
         """
         Initialize the LoadSignalNode. Only one of either signal_path or signal_key can be used.
 
@@ -25,22 +33,47 @@ class LoadSignalNode(AQPNode):
         file_name_key : str
             Key to store the file name at during execution.
         signal_path : str, optional
-            Path to the file to load. The default is None.
+            Path to the file to load, which can be a member of a zip or tar
+            archive, e.g. genspeech.zip!/ref/001.wav. The default is None.
         signal_key : str, optional
             Key to retrieve the file path from. The default is None.
         target_sample_rate : int, optional
             Target sample rate to use. If signal doesn't already use this 
-            sample rate, then it is resampled by librosa. The default is 48000.
+            sample rate, then it is resampled by the resampler. The default is 48000.
         mono : bool, optional
-            Bool indicating whether or not the signal is mono. If the signal 
-            loaded only has once channel and mono is set to false, it is reloaded
-            with mono set to true. The default is False.
+            Bool indicating whether or not the signal is mixed down to mono. 
+            A signal with only one channel is always loaded as a 1D array. 
+            The default is False.
+        use_cache : bool, optional
+            Bool indicating whether or not decoded signals are kept in the 
+            process-wide AudioCache, so a file used by several rows is only 
+            decoded once. Cached signals are read-only. The default is True.
+        audio_store : str, optional
+            Directory of an AudioStore created by scripts/materialize_audio.py.
+            Signals found in it are memory-mapped instead of decoded, others 
+            are decoded as usual. The default is None.
+        backend : str, optional
+            Backend used to decode files, 'soundfile' or 'librosa'. Files the 
+            soundfile backend can't decode are decoded by librosa. The default
+            is 'soundfile'.
+        resampler : str, optional
+            Resampler used when the file's sample rate isn't the target sample 
+            rate, 'high_quality' (librosa's default), 'soxr' or 'polyphase'. 
+            The default is 'high_quality'.
+        lazy : bool, optional
+            Bool indicating whether or not a LazyAudio handle is stored instead
+            of the decoded signal. Only the header of the file is read, slicing
+            the handle decodes just the frames of the slice and the whole 
+            signal is decoded when a node calls lazyaudio.materialize.
+            Files soundfile can't open are decoded as usual. The default is 
+            False.
             
         Raises
         ------
         ValueError
             Only one of either signal_path or signal_key can be used. A value error
-            is raised if both or neither are set.
+            is raised if both or neither are set, or if the backend or resampler
+            isn't supported.
 
         Returns
         -------
@@ -50,21 +83,30 @@ class LoadSignalNode(AQPNode):
         super().__init__(id_, output_key=output_key, draw_options=draw_options, **kwargs)
         if signal_path and signal_key or not signal_path and not signal_key:
             raise ValueError("Cannot set both signal_path and signal_key or None. One must be set")
+        audioloader.check_options(backend, resampler)
         self.file_name_key = file_name_key
         self.signal_path = signal_path
         self.signal_key = signal_key
         self.target_sample_rate = target_sample_rate
         self.mono = mono
+        self.use_cache = use_cache
+        self.audio_store = AudioStore(audio_store) if audio_store else None
+        self.backend = backend
+        self.resampler = resampler
+        self.lazy = lazy
         self.type_ = 'LoadSignalNode'
        
     
-    def execute(self, result: dict, **kwargs) -> dict:
+    def execute(self, result: dict, prefetched_audio: dict=None, **kwargs) -> dict:
         """Load the signal and assign it to the result dict alongside the file name.
         
         Parameters
         ----------
         result : dict
             The result dictionary used throughout the pipeline.
+        prefetched_audio : dict, optional
+            Signals already loaded by the prefetch stage of a LoopNode, keyed
+            on (node id, path). The default is None.
 
         Returns
         -------
@@ -72,17 +114,22 @@ class LoadSignalNode(AQPNode):
             The result dictionary used throughout the pipeline.
         """
         super().execute(result, **kwargs)
-        if self.signal_path:
-            audio = self._load_audio_from_path(self.signal_path)
-            result[self.file_name_key] = self.signal_path
-        elif self.signal_key:
-            audio = self._load_audio_from_path(result[self.signal_key])
-            result[self.file_name_key] = result[self.signal_key]
-        result[self.output_key] = audio
+        path = self.signal_path if self.signal_path else result[self.signal_key]
+        audio = prefetched_audio.get((self.id_, path)) if prefetched_audio else None
+        result[self.file_name_key] = path
+        result[self.output_key] = audio if audio is not None else self.load_audio_from_path(path)
         return result
-    
-    
-    def _load_audio_from_path(self, path: str):
+
+
+    def input_keys(self) -> list:
+        return [self.signal_key] if not self.signal_path else []
+
+
+    def output_keys(self) -> list:
+        return [self.file_name_key, self.output_key]
+
+
+    def load_audio_from_path(self, path: str):
         """Load the audio signal for the given path.
 
         Parameters
@@ -92,16 +139,45 @@ class LoadSignalNode(AQPNode):
 
         Returns
         -------
-        audio : np.ndarray
-            Numpy array of the audio signal.
+        audio : np.ndarray or LazyAudio
+            Numpy array of the audio signal, or a LazyAudio handle on it if
+            the node is lazy.
 
         """
         converted_path = Path(path)
         try:
-            audio = load(converted_path, sr=self.target_sample_rate, mono=self.mono)[0]
-            if not self.mono and audio.ndim == 1:
-                audio = load(converted_path, sr=self.target_sample_rate, mono=True)[0]
-            return audio
+            if self.audio_store is not None:
+                # Stored signals are memory-mapped, which is already lazy.
+                audio = self.audio_store.load(converted_path, self.target_sample_rate, self.mono, self.resampler)
+                if audio is not None:
+                    return audio
+            if self.lazy:
+                try:
+                    return LazyAudio(converted_path, self.target_sample_rate, self.mono, self.resampler,
+                                     functools.partial(self._load, converted_path))
+                except RuntimeError as err:
+                    LOGGER.debug("Can't open %s lazily, decoding it: %s", path, err)
+            return self._load(converted_path)
         except(FileNotFoundError) as err:
             LOGGER.error("%s", err)
-            sys.exit(1)
\ No newline at end of file
+            sys.exit(1)
+
+
+    def _load(self, path: Path):
+        """Decode the audio signal of the given path, through the AudioCache if it's used."""
+        if self.use_cache:
+            return audiocache.get_cache().get(path, self.target_sample_rate, self.mono,
+                                              lambda: self._decode(path), self.resampler)
+        return self._decode(path)
+
+
+    def _decode(self, path: Path):
+        """Decode and resample the audio signal of the given path, recording the decode and resample times when profiling."""
+        audio, decode_time, resample_time = audioloader.load_audio(path, self.target_sample_rate, self.mono,
+                                                                   self.backend, self.resampler)
+        profiler = profiling.get_profiler()
+        if profiler is not None:
+            # Decoding and resampling run in this thread, so their CPU time is close to their wall time.
+            profiler.record(f'{self.id_} decode', 'decode', decode_time, decode_time, 0)
+            profiler.record(f'{self.id_} resample', 'resample', resample_time, resample_time, 0)
+        return audio
@@ -1,26 +1,280 @@
 """Module containing the LoopNode, a node used to loop over a set of ndoes."""
 
+import copy
+import itertools
 import logging
+import os
+import pickle
+import sys
+import time
+import audiocache
+import featurecache
 import graphutils
+import profiling
+import resultwriter
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Sized
 from .node import NestedNode
+from .loadsignalnode import LoadSignalNode
+from .transformnode import TransformNode, apply_df_updates, join_columns
+from resultcontext import ResultContext
 from constants import LOGGER_NAME
 LOGGER = logging.getLogger(LOGGER_NAME)
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory can't be reported there.
+    resource = None
+
+EXECUTORS = ('serial', 'process')
+
+# Transforms without side effects, which the prefetch stage can run ahead of
+# the loop to find the paths of the files to load.
+PREFETCH_TRANSFORMS = ('tuple_to_top_level',)
+
+# Number of batches per worker read at a time from an iterable without a
+# length by the 'process' executor.
+PROCESS_WINDOW_BATCHES = 64
+
+# State of a LoopNode worker process. Filled in once by _init_worker so the
+# subgraph is only built a single time per worker, not once per iteration.
+_WORKER_STATE = {}
+
+
+def peak_memory_mb(children: bool=False) -> float:
+    """Get the peak resident memory of this process, or of its finished child processes, in MiB.
+
+    Returns None if the platform doesn't provide the information.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else.
+    return usage.ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def _keep_keys(result: dict, keys_to_keep: list) -> dict:
+    """Reduce the result of an iteration to the declared keys, or return it as is if none are declared."""
+    if keys_to_keep is None:
+        return result
+    return {k: result[k] for k in keys_to_keep if k in result}
+
+
+def _init_worker(node_data: dict, start_node: str, shared: dict, keys_to_keep: list, profile: bool,
+                 audio_cache_bytes: int, feature_cache: tuple):
+    """Build the subgraph and store the shared part of the result dict in a worker process."""
+    if profile:
+        profiling.enable()
+    audiocache.get_cache().resize(audio_cache_bytes)
+    if feature_cache is not None:
+        featurecache.enable(*feature_cache)
+    nodes = graphutils.build_graph(node_data)
+    _WORKER_STATE['execution_node'] = nodes[start_node]
+    _WORKER_STATE['plan'] = graphutils.compile_plan(nodes[start_node], keys_to_keep) if keys_to_keep is not None else None
+    _WORKER_STATE['shared'] = shared
+    _WORKER_STATE['keys_to_keep'] = keys_to_keep
+
+
+def _run_batch(execution_node, contexts: list, plan: graphutils.ExecutionPlan=None, **kwargs):
+    """Run the subgraph on the contexts of a batch, using the batched execution when there is more than one.
+
+    A single context is run with the compiled plan, if there is one, so keys
+    are released as soon as they are no longer needed.
+    """
+    if len(contexts) == 1 and plan is not None:
+        graphutils.run_plan(plan, contexts[0], **kwargs)
+    elif len(contexts) == 1:
+        graphutils.run_node(execution_node, contexts[0], **kwargs)
+    else:
+        graphutils.run_node_batch(execution_node, contexts, **kwargs)
+
+
+def _run_worker_batch(items: list) -> tuple:
+    """Run the subgraph on a batch of iterable entries inside a worker process.
+
+    Only the layer written during each iteration, or the keys to keep if they
+    were declared, is sent back to the parent process, together with any
+    dataframe updates recorded by the update_df transform. The updates of the
+    whole batch are returned with its first entry. The profiling samples of 
+    the batch, if profiling is enabled, and the feature cache hits and misses,
+    if it's enabled, are returned alongside.
+    """
+    contexts = []
+    for item in items:
+        context = ResultContext(_WORKER_STATE['shared'])
+        context['iterator_item'] = item
+        contexts.append(context)
+    df_updates = []
+    _run_batch(_WORKER_STATE['execution_node'], contexts, _WORKER_STATE['plan'], df_updates=df_updates)
+    keys_to_keep = _WORKER_STATE['keys_to_keep']
+    outputs = [(context.local if keys_to_keep is None else _keep_keys(context, keys_to_keep),
+                df_updates if n == 0 else []) for n, context in enumerate(contexts)]
+    profiler = profiling.get_profiler()
+    feature_cache = featurecache.get_cache()
+    return (outputs, profiler.drain() if profiler is not None else None,
+            feature_cache.drain_stats() if feature_cache is not None else None)
+
+
+def _windows(iterable: Iterable, size: int=None):
+    """Yield the entries of an iterable as lists of at most size entries, or as a single list if size is None."""
+    if size is None:
+        yield list(iterable)
+        return
+    iterator = iter(iterable)
+    while window := list(itertools.islice(iterator, size)):
+        yield window
+
+
+class CheckpointJournal:
+    """Append-only file recording the outputs of every finished LoopNode iteration.
+
+    Each record is a pickled (item, outputs, df_updates) tuple, written and
+    flushed as soon as the iteration finishes, so a crashed run loses at most
+    the iteration that was running.
+    """
+
+    def __init__(self, path: str):
+        """Open the journal at path, loading the records of a previous run if it exists."""
+        self.path = Path(path)
+        self.completed = self._load()
+        self._file = open(self.path, 'ab')
+
+
+    def _load(self) -> dict:
+        """Read the finished iterations, dropping a record left incomplete by a crash."""
+        completed = {}
+        if not self.path.exists():
+            return completed
+        with open(self.path, 'rb') as data:
+            end = 0
+            while True:
+                try:
+                    item, outputs, df_updates = pickle.load(data)
+                except (EOFError, pickle.UnpicklingError):
+                    break
+                completed[item] = (outputs, df_updates)
+                end = data.tell()
+        if end < self.path.stat().st_size:
+            LOGGER.warning("Dropping incomplete record at the end of checkpoint %s", self.path)
+            with open(self.path, 'r+b') as data:
+                data.truncate(end)
+        return completed
+
+
+    def append(self, item, outputs: dict, df_updates: list):
+        """Record a finished iteration."""
+        pickle.dump((item, outputs, df_updates), self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.flush()
+
+
+    def close(self):
+        self._file.close()
+
+
+class Prefetcher:
+    """Loads the audio of the upcoming iterable entries of a LoopNode on a pool of threads.
+
+    At most depth entries are loaded ahead of the one being run, so the
+    memory used by the loaded signals is bounded. The time the loop spends
+    waiting for an entry which hasn't finished loading is recorded as a stall.
+    """
+
+    def __init__(self, load: Callable, depth: int, workers: int):
+        """Initialize a Prefetcher.
+
+        Parameters
+        ----------
+        load : Callable
+            Function loading an iterable entry, returning the prefetched_audio
+            dict passed on to the LoadSignalNodes.
+        depth : int
+            Maximum number of entries loaded ahead of the one being run.
+        workers : int
+            Number of threads loading entries.
+        """
+        self.load = load
+        self.depth = depth
+        self.entries = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.ready_total = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+
+
+    def iterate(self, items: Iterable, skip=()):
+        """Yield (item, future) for each item, loading the items which aren't in skip ahead of time.
+
+        The future of a skipped item is None.
+        """
+        items = iter(items)
+        window = deque()
+        try:
+            while True:
+                while len(window) <= self.depth:
+                    item = next(items, _END)
+                    if item is _END:
+                        break
+                    window.append((item, None if item in skip else self._pool.submit(self.load, item)))
+                if not window:
+                    return
+                item, future = window.popleft()
+                if future is not None:
+                    self.entries += 1
+                    # Entries loaded and waiting in the queue, including this one.
+                    self.ready_total += future.done() + sum(f.done() for _, f in window if f is not None)
+                yield item, future
+        finally:
+            for _, future in window:
+                if future is not None:
+                    future.cancel()
+
+
+    def wait(self, future) -> dict:
+        """Get the audio loaded for an entry, waiting for it if it isn't loaded yet."""
+        if future.done():
+            return future.result()
+        start = time.perf_counter()
+        audio = future.result()
+        self.stalls += 1
+        self.stall_time += time.perf_counter() - start
+        return audio
+
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+    def log(self, node_id: str):
+        """Log the queue depth and stall time of the prefetch stage."""
+        if self.entries == 0:
+            return
+        LOGGER.info("%s prefetch: %d entries, mean queue depth %.1f of %d, %d stalls waiting %.2f s in total",
+                    node_id, self.entries, self.ready_total / self.entries, self.depth + 1,
+                    self.stalls, self.stall_time)
+
+
+_END = object()
+
 
 class LoopNode(NestedNode):
     """Node which loops over some iterable contained within the result dictionary and executes it's execution node using that iterable value."""
-    
+
     def __init__(self, id_: str, output_key: str, node_data: dict,
                  iterable_key: str, start_node: str, key_blacklist: list=None,
-                 keys_to_keep: list=None,
-                 draw_options: dict=None, **kwargs):
+                 keys_to_keep: list=None, report_memory: bool=False,
+                 executor: str='serial', workers: int=None,
+                 checkpoint_path: str=None, batch_size: int=1, prefetch: int=0,
+                 prefetch_workers: int=None, writer: dict=None, draw_options: dict=None, **kwargs):
         """Initialize a LoopNode, id_, output_key and draw_options are same as Node.
-    
+
         Parameters
         ----------
         node_data : dict
-            Dictionary containing the JSON definition of the nodes which this 
+            Dictionary containing the JSON definition of the nodes which this
             node is to loop over.
         iterable_key : str
             Key used to obtain the iterable from the result dictionary.
@@ -30,6 +284,57 @@ class LoopNode(NestedNode):
             List used to prevent the declared keys from being passed into the
             subgraph. This is used to prevent duplication of dictionary values.
             The default is None.
+        keys_to_keep : list, optional
+            If set, only these keys are kept from the result of each iteration,
+            everything else, e.g. the loaded signals and features, is released 
+            as soon as the last node of the iteration using it has run, see
+            graphutils.compile_plan. The default is None, which keeps the whole
+            result of every iteration.
+        report_memory : bool, optional
+            Log the peak memory usage of the process as the loop progresses,
+            to check that it doesn't grow with the size of the iterable. The
+            default is False.
+        executor : str, optional
+            How the iterations are run. 'serial' runs them one after another in
+            this process, 'process' sends them to a pool of worker processes.
+            The default is 'serial'.
+        workers : int, optional
+            Number of worker processes used by the 'process' executor. The
+            default is None, which uses the number of CPUs.
+        checkpoint_path : str, optional
+            Path of a journal the outputs and dataframe updates of every 
+            finished iteration are appended to. When the journal already exists,
+            e.g. after a crash, the iterations it contains are not run again, 
+            their recorded outputs are used instead. The default is None.
+        batch_size : int, optional
+            Number of iterable entries the subgraph is run on at once. With 
+            more than one, each node of the subgraph is executed on the whole
+            batch through its execute_batch function, which lets nodes such as
+            the ScaleSignalsNode or the PyPESQNode process the entries 
+            together. The default is 1.
+        prefetch : int, optional
+            Number of iterable entries whose audio is loaded ahead of time by
+            a pool of threads, while the current entry runs. The LoadSignalNodes
+            at the start of the subgraph, and the tuple_to_top_level transforms
+            before them, are run ahead on the upcoming entries and the loaded
+            signals are handed to the LoadSignalNodes when the entry runs. Only
+            used by the 'serial' executor. The default is 0, no prefetching.
+        prefetch_workers : int, optional
+            Number of threads used to prefetch entries. The default is None,
+            which uses prefetch threads.
+        writer : dict, optional
+            Appends a row per iterable entry to a csv, parquet or arrow file
+            while the loop runs, see resultwriter. "path" is the file to write
+            and "columns" the result keys written after the values of the
+            entry, e.g. the keys update_df would write. With "dataframe_key",
+            each row starts with the index and the columns of the row of that
+            dataframe, found using the row position df_columns_to_tuples adds
+            to each entry, the same columns to_csv writes. Otherwise each row 
+            starts with a running index and the values of the entry, named by 
+            "item_columns", by default the columns of a DatasetStream or 
+            ['Ref_Wave', 'Test_Wave']. "file_format", "flush_every" and 
+            "flush_interval" are passed on to resultwriter.open_writer. The
+            default is None, nothing is written.
 
         Returns
         -------
@@ -37,23 +342,61 @@ class LoopNode(NestedNode):
 
         """
         super().__init__(id_, output_key=output_key, draw_options=draw_options, **kwargs)
+        if executor not in EXECUTORS:
+            raise ValueError(f'executor must be one of {EXECUTORS}')
         self.iterable_key = iterable_key
+        # build_graph annotates the definition it is given, so keep an untouched
+        # copy around for the worker processes to build their own subgraph from.
+        self.node_data = copy.deepcopy(node_data)
+        self.start_node = start_node
         self.nodes = graphutils.build_graph(node_data)
         self.execution_node = self.nodes[start_node]
         self.key_blacklist = key_blacklist if key_blacklist else []
+        # The loop's own output is hidden from the iterations as well, so the
+        # contexts stored in it don't refer back to the results.
+        self.hidden_keys = [*self.key_blacklist, output_key]
         self.keys_to_keep = keys_to_keep
+        # Only the kept keys are needed after an iteration, so everything else
+        # can be released as soon as the last node using it has run.
+        self.plan = graphutils.compile_plan(self.execution_node, keys_to_keep) if keys_to_keep is not None else None
+        self.report_memory = report_memory
+        self.executor = executor
+        self.workers = workers if workers else os.cpu_count()
+        self.checkpoint_path = checkpoint_path
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        self.batch_size = batch_size
+        if prefetch < 0:
+            raise ValueError('prefetch must be at least 0')
+        self.prefetch = prefetch
+        self.prefetch_workers = prefetch_workers if prefetch_workers else prefetch
+        self.prefetch_nodes = self._find_prefetch_nodes() if prefetch else []
+        if prefetch and not self.prefetch_nodes:
+            LOGGER.warning("%s can't prefetch, its subgraph doesn't start by loading signals", id_)
+        if writer is not None:
+            if 'path' not in writer or 'columns' not in writer:
+                raise ValueError('writer requires a path and the columns to write')
+            resultwriter.check_format(writer.get('file_format') or resultwriter.file_format_of(writer['path']))
+        self.writer = writer
+        self._writer = None
         self.type_ = 'LoopNode'
-        
+
 
     def execute(self, result: dict, **kwargs):
         """Execute the LoopNode.
-        
+
         Loops over each entry found using the iterable_key and executes the
-        subgraph. The result dictionary passed to the subgraph contains a new
-        key, 'iterable_item'. This sub-dictionary is then added to the results.
-        
-        At the end of the loop, the results dictionary assigned to the result 
-        dictionary.
+        subgraph. Each iteration runs in a ResultContext on top of the result
+        dictionary, so the subgraph reads the result without copying it and
+        writes into a layer of its own, which also contains a new key, 
+        'iterable_item'. This context is then added to the results. Once the
+        loop has finished, the contexts are pointed at a single snapshot of 
+        the result, so what is written to the result afterwards doesn't show
+        up in them.
+
+        At the end of the loop, the results dictionary assigned to the result
+        dictionary and the values buffered by update_df are joined into their
+        dataframes.
 
         Parameters
         ----------
@@ -67,12 +410,292 @@ class LoopNode(NestedNode):
 
         """
         super().execute(result)
+        # Signals prefetched by an enclosing loop are only meant for its own iterations.
+        kwargs.pop('prefetched_audio', None)
+        self._iterations = 0
+        journal = None
+        if self.checkpoint_path and _WORKER_STATE:
+            LOGGER.warning("%s ignores checkpoint_path inside a worker process", self.id_)
+        elif self.checkpoint_path:
+            journal = CheckpointJournal(self.checkpoint_path)
+            if journal.completed:
+                LOGGER.info("Resuming %s with %d finished iterable entries from %s",
+                            self.id_, len(journal.completed), self.checkpoint_path)
+        if self.writer is not None and _WORKER_STATE:
+            LOGGER.warning("%s ignores writer inside a worker process", self.id_)
+        elif self.writer is not None:
+            self._open_writer(result)
+        try:
+            # Worker processes can't start pools of their own, so nested loops
+            # always run serially inside a worker.
+            if self.executor == 'process' and not _WORKER_STATE:
+                results = self._execute_in_processes(result, journal, **kwargs)
+            else:
+                results = self._execute_serially(result, journal, **kwargs)
+        finally:
+            if journal is not None:
+                journal.close()
+            if self._writer is not None:
+                self._writer.close()
+                LOGGER.info("%s wrote %d rows to %s", self.id_, self._writer.rows_written, self._writer.path)
+                self._writer = None
+        self._freeze_results(result, results)
+        result[self.output_key] = results
+        # Write the values update_df buffered during the loop to the dataframes.
+        join_columns(result)
+        if self.report_memory and (peak := peak_memory_mb()) is not None:
+            LOGGER.info("%s peak memory at the end of the loop: %.1f MiB", self.id_, peak)
+        return result
+
+
+    def _execute_serially(self, result: dict, journal: CheckpointJournal, **kwargs) -> dict:
+        """Run every iteration in this process, batch_size entries at a time."""
+        completed = journal.completed if journal is not None else {}
         results = {}
-        for i in result[self.iterable_key]:
+        batch = []
+        prefetcher = None
+        if self.prefetch_nodes:
+            prefetcher = Prefetcher(lambda i: self._prefetch_entry(result, i), self.prefetch, self.prefetch_workers)
+            entries = prefetcher.iterate(result[self.iterable_key], skip=completed)
+        else:
+            entries = ((i, None) for i in result[self.iterable_key])
+        try:
+            for i, future in entries:
+                if i in completed:
+                    # Run what is pending first so the results stay in the order of the iterable.
+                    self._execute_batch(result, results, batch, journal, prefetcher, **kwargs)
+                    self._store(result, results, i, *completed[i], **kwargs)
+                    continue
+                batch.append((i, future))
+                if len(batch) == self.batch_size:
+                    self._execute_batch(result, results, batch, journal, prefetcher, **kwargs)
+            self._execute_batch(result, results, batch, journal, prefetcher, **kwargs)
+        finally:
+            if prefetcher is not None:
+                entries.close()
+                prefetcher.close()
+                prefetcher.log(self.id_)
+        return results
+
+
+    def _execute_batch(self, result: dict, results: dict, batch: list, journal: CheckpointJournal,
+                       prefetcher: Prefetcher=None, **kwargs):
+        """Run the subgraph on a batch of (iterable entry, prefetch future) pairs, emptying the batch."""
+        if len(batch) == 0:
+            return
+        if prefetcher is not None:
+            prefetched_audio = {}
+            for _, future in batch:
+                prefetched_audio.update(prefetcher.wait(future))
+            kwargs['prefetched_audio'] = prefetched_audio
+        items = [i for i, _ in batch]
+        batch.clear()
+        contexts = []
+        for i in items:
             LOGGER.info("Running on iterable entry: %s", i)
-            result_copy = {k: result[k] for k in result if k not in self.key_blacklist}
-            result_copy['iterator_item'] = i
-            graphutils.run_node(self.execution_node, result_copy)
-            results[i] = result_copy
-        result[self.output_key] = results
-        return result
\ No newline at end of file
+            context = ResultContext(result, hidden=self.hidden_keys)
+            context['iterator_item'] = i
+            contexts.append(context)
+        if journal is None:
+            _run_batch(self.execution_node, contexts, self.plan, **kwargs)
+        else:
+            # Record the dataframe updates of this batch for the journal,
+            # update_df has already applied them to the dataframe.
+            df_updates = []
+            _run_batch(self.execution_node, contexts, self.plan, **{**kwargs, 'df_updates': df_updates})
+            if (collector := kwargs.get('df_updates')) is not None:
+                collector.extend(df_updates)
+        for n, (i, context) in enumerate(zip(items, contexts)):
+            results[i] = _keep_keys(context, self.keys_to_keep)
+            self._write_row(result, i, results[i])
+            if journal is not None:
+                outputs = context.local if self.keys_to_keep is None else results[i]
+                journal.append(i, outputs, df_updates if n == 0 else [])
+        self._iterations += len(items)
+        del contexts, context
+        self._log_memory(self._iterations)
+
+
+    def _store(self, result: dict, results: dict, item, outputs: dict, df_updates: list, **kwargs):
+        """Add the outputs of an iteration run elsewhere, i.e. in a worker or a previous run, to the results.
+
+        The dataframe updates recorded by the iteration are applied to the
+        result dictionary and passed on to an enclosing collector, if any.
+        """
+        if self.keys_to_keep is None:
+            outputs = ResultContext(result, hidden=self.hidden_keys, local=outputs)
+        results[item] = outputs
+        self._write_row(result, item, outputs)
+        apply_df_updates(result, df_updates)
+        if (collector := kwargs.get('df_updates')) is not None:
+            collector.extend(df_updates)
+
+
+    def _freeze_results(self, result: dict, results: dict):
+        """Point the stored iteration contexts at one snapshot of the result, taken once for the whole loop.
+
+        During the loop the contexts read through to the live result, the 
+        snapshot gives them the same contents a copy of the result made for
+        each iteration would have, without copying anything per iteration,
+        and without the results referring back to the result they're 
+        stored in.
+        """
+        if self.keys_to_keep is not None:
+            return
+        frozen = {k: result[k] for k in result if k not in self.hidden_keys}
+        for context in results.values():
+            if isinstance(context, ResultContext) and context.parent is result:
+                context.parent = frozen
+
+
+    def output_keys(self) -> list:
+        return [self.output_key]
+
+
+    def _open_writer(self, result: dict):
+        """Open the file the rows of the loop are written to, see the writer argument."""
+        dataframe_key = self.writer.get('dataframe_key')
+        columns = self.writer['columns']
+        if dataframe_key:
+            entry_columns = [c for c in result[dataframe_key].columns if c not in columns]
+        else:
+            entry_columns = self.writer.get('item_columns') or \
+                getattr(result[self.iterable_key], 'columns', ['Ref_Wave', 'Test_Wave'])
+        self._writer_entry_columns = list(entry_columns)
+        self._writer = resultwriter.open_writer(self.writer['path'], ['', *entry_columns, *columns],
+                                                self.writer.get('file_format'),
+                                                self.writer.get('flush_every', 100),
+                                                self.writer.get('flush_interval', 30.0))
+
+
+    def _write_row(self, result: dict, item, outputs):
+        """Write the row of a finished iterable entry, if there is a writer."""
+        if self._writer is None:
+            return
+        dataframe_key = self.writer.get('dataframe_key')
+        if dataframe_key:
+            if not isinstance(item, tuple) or len(item) < 3:
+                raise ValueError(f'{self.id_} writer needs the row position df_columns_to_tuples adds to each entry')
+            df = result[dataframe_key]
+            row = [df.index[item[2]], *(df[column].iat[item[2]] for column in self._writer_entry_columns)]
+        else:
+            values = item if isinstance(item, tuple) else (item,)
+            row = [self._writer.rows, *values[:len(self._writer_entry_columns)]]
+        row.extend(outputs.get(key) for key in self.writer['columns'])
+        self._writer.write(row)
+
+
+    def _find_prefetch_nodes(self) -> list:
+        """Find the nodes the prefetch stage runs: the chain of LoadSignalNodes and side effect free transforms the subgraph starts with, up to the last LoadSignalNode."""
+        chain = []
+        node = self.execution_node
+        while isinstance(node, LoadSignalNode) or \
+                isinstance(node, TransformNode) and node.transform_name in PREFETCH_TRANSFORMS:
+            chain.append(node)
+            if len(node.children) != 1:
+                break
+            node = node.children[0]
+        while chain and not isinstance(chain[-1], LoadSignalNode):
+            chain.pop()
+        return chain
+
+
+    def _prefetch_entry(self, result: dict, item) -> dict:
+        """Load the signals of an iterable entry, as the LoadSignalNodes at the start of the subgraph would.
+
+        Runs on a prefetch thread, in a context of its own so the result
+        dictionary isn't modified.
+        """
+        context = ResultContext(result, hidden=self.hidden_keys)
+        context['iterator_item'] = item
+        audio = {}
+        for node in self.prefetch_nodes:
+            if isinstance(node, LoadSignalNode):
+                path = node.signal_path if node.signal_path else context[node.signal_key]
+                audio[(node.id_, path)] = node.load_audio_from_path(path)
+            else:
+                node.execute(context)
+        return audio
+
+
+    @staticmethod
+    def _merge_samples(batch_output: tuple) -> list:
+        """Add the profiling samples and feature cache counts sent back by a worker to this process, returning the outputs of the batch."""
+        outputs, samples, feature_counts = batch_output
+        if samples:
+            profiling.get_profiler().merge(samples)
+        if feature_counts:
+            featurecache.get_cache().merge_stats(feature_counts)
+        return outputs
+
+
+    @staticmethod
+    def _feature_cache_config() -> tuple:
+        """Get the (root, max_bytes) the worker processes enable the FeatureCache with, None if it isn't enabled."""
+        feature_cache = featurecache.get_cache()
+        return (feature_cache.root, feature_cache.max_bytes) if feature_cache is not None else None
+
+
+    def _log_memory(self, iteration: int):
+        """Log the peak memory of the process after an iteration, if enabled."""
+        if not self.report_memory or resource is None:
+            return
+        peak = peak_memory_mb()
+        if iteration == 1:
+            self._first_peak = peak
+            LOGGER.info("%s peak memory after the first iteration: %.1f MiB", self.id_, peak)
+        else:
+            LOGGER.debug("%s peak memory after %d iterations: %.1f MiB (%+.1f MiB since the first)",
+                         self.id_, iteration, peak, peak - self._first_peak)
+
+
+    def _execute_in_processes(self, result: dict, journal: CheckpointJournal, **kwargs) -> dict:
+        """Run every iteration in a pool of worker processes.
+
+        The shared part of the result dictionary is handed to each worker once,
+        when the worker starts. Results are collected in the order of the
+        iterable, so the output is the same as running the loop serially.
+        An iterable without a length, e.g. a DatasetStream, is read and run 
+        a window of entries at a time, so it's never held in memory whole.
+        """
+        if self.prefetch:
+            LOGGER.warning("%s only prefetches with the 'serial' executor, the worker processes load their own signals", self.id_)
+        completed = journal.completed if journal is not None else {}
+        shared = {k: result[k] for k in result if k not in self.hidden_keys}
+        iterable = result[self.iterable_key]
+        window_size = None if isinstance(iterable, Sized) else self.workers * PROCESS_WINDOW_BATCHES * self.batch_size
+        results = {}
+        pool = None
+        n = 0
+        try:
+            for items in _windows(iterable, window_size):
+                pending = [i for i in items if i not in completed]
+                finished = {}
+                if pending:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                   initargs=(self.node_data, self.start_node, shared, self.keys_to_keep,
+                                                             profiling.get_profiler() is not None,
+                                                             audiocache.get_cache().max_bytes,
+                                                             self._feature_cache_config()))
+                    batches = [pending[b:b + self.batch_size] for b in range(0, len(pending), self.batch_size)]
+                    chunksize = max(1, len(batches) // (self.workers * 4))
+                    LOGGER.info("Running %d iterable entries on %d worker processes", len(pending), self.workers)
+                    mapped = itertools.chain.from_iterable(self._merge_samples(batch_output)
+                                                           for batch_output in pool.map(_run_worker_batch, batches, chunksize=chunksize))
+                    for i, (outputs, df_updates) in zip(pending, mapped):
+                        n += 1
+                        LOGGER.info("Finished iterable entry: %s", i)
+                        if journal is not None:
+                            journal.append(i, outputs, df_updates)
+                        finished[i] = (outputs, df_updates)
+                        self._log_memory(n)
+                for i in items:
+                    self._store(result, results, i, *(finished[i] if i in finished else completed[i]), **kwargs)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+        if self.report_memory and (peak := peak_memory_mb(children=True)) is not None:
+            LOGGER.info("%s peak memory of the worker processes: %.1f MiB", self.id_, peak)
+        return results
+
@@ -64,6 +64,54 @@ class Node(object):
         LOGGER.debug(f'Executing node {self.id_} | type={self.type_}')
 
 
+    def execute_batch(self, results: list, **kwargs) -> list:
+        """Execute the node on a batch of result dictionaries, one per iterable entry of a LoopNode.
+
+        Nodes which can process several inputs at once, e.g. by stacking 
+        signals into a single array, override this. The default executes each
+        result dictionary in turn.
+
+        Parameters
+        ----------
+        results : list
+            The result dictionaries of each entry in the batch.
+        **kwargs : dict
+            Used to provide any additonal keyword args to the execute function.
+
+        Returns
+        -------
+        list
+            The return value of execute for each result dictionary. None 
+            entries stop the branch for that result dictionary.
+
+        """
+        return [self.execute(result, **kwargs) for result in results]
+
+
+    def log_batch(self, results: list):
+        """Log the execution of the node on a batch, the counterpart of the log call in execute for overrides of execute_batch."""
+        LOGGER.debug(f'Executing node {self.id_} on a batch of {len(results)} | type={self.type_}')
+
+
+    def input_keys(self) -> list:
+        """Get the keys of the result dictionary this node reads.
+
+        Used by graphutils.compile_plan to work out when a key is no longer
+        needed. The default is None, meaning the node may read any key, so
+        nothing is released before it has run.
+        """
+        return None
+
+
+    def output_keys(self) -> list:
+        """Get the keys of the result dictionary this node writes.
+
+        Keys written by a node which returns None here are never released by
+        graphutils.compile_plan. The default is None.
+        """
+        return None
+
+
     def is_leaf(self):
         """Check whether or not this node is a leaf node, i.e. no children."""
         return len(self.children) == 0
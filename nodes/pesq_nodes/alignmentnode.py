@@ -1,7 +1,6 @@
 """Module containing the AlignemntNode, responsible for ViSQOL alignment of reference + degraded patches."""
 
 from ..node import PESQNode
-import numpy as np
 
 class AlignmentNode(PESQNode):
     """The AlignmentNode is used to perform patch alignment of the reference and degraded signal patches."""
@@ -28,18 +27,20 @@ class AlignmentNode(PESQNode):
     def execute(self, result: dict, **kwargs) -> dict:
         """Execute the alignment node.
         
-        Aligns the two signals based on the which signal is longer.
+        Aligns the two signals by truncating the longer signal to the length
+        of the shorter one. The signals are sliced, so only the aligned frames
+        of a LazyAudio signal are decoded.
         """
         super().execute(result)
-        ref_length = len(result[self.ref_sig_key])
-        deg_length = len(result[self.deg_sig_key])
-        if ref_length > deg_length:
-            aligned_reference_signal, aligned_degraded_signal=np.array(result[self.ref_sig_key].tolist()[:deg_length]), result[self.deg_sig_key]
-        elif deg_length > ref_length:
-            aligned_reference_signal, aligned_degraded_signal=result[self.ref_sig_key], np.array(result[self.deg_sig_key].tolist()[:ref_length])
-        else:
-            aligned_reference_signal, aligned_degraded_signal=result[self.ref_sig_key], result[self.deg_sig_key]
-        
-        result['aligned_ref_signal'] = aligned_reference_signal
-        result['aligned_deg_signal'] = aligned_degraded_signal
-        return result
\ No newline at end of file
+        aligned_length = min(len(result[self.ref_sig_key]), len(result[self.deg_sig_key]))
+        result['aligned_ref_signal'] = result[self.ref_sig_key][:aligned_length]
+        result['aligned_deg_signal'] = result[self.deg_sig_key][:aligned_length]
+        return result
+
+
+    def input_keys(self) -> list:
+        return [self.ref_sig_key, self.deg_sig_key]
+
+
+    def output_keys(self) -> list:
+        return ['aligned_ref_signal', 'aligned_deg_signal']
@@ -1,8 +1,17 @@
 """Module containing the PyPESQNode. Calculates the PESQ metric for the audio signals given."""
 
+import numpy as np
+import lazyaudio
+
 from ..node import PESQNode
 from pesq import pesq
 
+try:
+    from pesq import pesq_batch
+except ImportError:
+    # Older versions of pesq only score a single pair at a time.
+    pesq_batch = None
+
 class PyPESQNode(PESQNode):
     """Node containing the logic for running the PESQ quality metric on a reference and test signal."""
     
@@ -10,7 +19,7 @@ class PyPESQNode(PESQNode):
                  ref_signal_key: str='aligned_ref_signal', 
                  deg_signal_key: str='aligned_deg_signal',
                  target_sample_rate: int=16000, pesq_mode:str='wb', 
-                 draw_options: dict=None, **kwargs):
+                 n_processor: int=0, draw_options: dict=None, **kwargs):
         """Initialize a PyPESQNode.
 
         Parameters
@@ -21,6 +30,10 @@ class PyPESQNode(PESQNode):
             DESCRIPTION. The default is 48000.
         pesq_mode : str, optional
             DESCRIPTION. The default is 'wb'.
+        n_processor : int, optional
+            Number of processes pesq_batch uses when the node is run on a
+            batch of signals. The default is 0, which scores the batch in this
+            process, as required when running inside LoopNode worker processes.
 
         Returns
         -------
@@ -32,14 +45,37 @@ class PyPESQNode(PESQNode):
         self.ref_signal_key = ref_signal_key
         self.deg_signal_key = deg_signal_key
         self.pesq_mode = pesq_mode
+        self.n_processor = n_processor
         self.type_ = 'PypesqNode'
     
     
     def execute(self, result: dict, **kwargs):
         """Execute the node and calculate the PESQ score for input signals."""
         super().execute(result, **kwargs)
-        ref_sig = result[self.ref_signal_key]
-        deg_sig = result[self.deg_signal_key]
+        ref_sig = lazyaudio.materialize(result[self.ref_signal_key])
+        deg_sig = lazyaudio.materialize(result[self.deg_signal_key])
         sim_score = pesq(self.sample_rate, ref_sig, deg_sig, self.pesq_mode)
         result[self.output_key] = sim_score
-        return result
\ No newline at end of file
+        return result
+
+
+    def execute_batch(self, results: list, **kwargs) -> list:
+        """Calculate the PESQ scores of a batch with a single pesq_batch call when every signal has the same length."""
+        self.log_batch(results)
+        ref_sigs = [lazyaudio.materialize(result[self.ref_signal_key]) for result in results]
+        deg_sigs = [lazyaudio.materialize(result[self.deg_signal_key]) for result in results]
+        if pesq_batch is None or len({len(sig) for sig in ref_sigs + deg_sigs}) > 1:
+            return [self.execute(result, **kwargs) for result in results]
+        sim_scores = pesq_batch(self.sample_rate, np.stack(ref_sigs), np.stack(deg_sigs),
+                                self.pesq_mode, n_processor=self.n_processor)
+        for result, sim_score in zip(results, sim_scores):
+            result[self.output_key] = sim_score
+        return results
+
+
+    def input_keys(self) -> list:
+        return [self.ref_signal_key, self.deg_signal_key]
+
+
+    def output_keys(self) -> list:
+        return [self.output_key]
@@ -1,6 +1,7 @@
 """Module containing the ScaleSignalNode, which is used to scale two signal to have the same Sound Pressure Level."""
 import math
 import numpy as np
+import lazyaudio
 from .node import AQPNode
 
 class ScaleSignalsNode(AQPNode):
@@ -28,12 +29,43 @@ class ScaleSignalsNode(AQPNode):
     def execute(self, result: dict, **kwargs):
         """Execute the ScaleSignalNode and updates the degraded signal key with the scaled signal."""
         super().execute(result)
-        required_reference_spl = ScaleSignalsNode._calculate_SPL(result[self.ref_sig_key])
-        required_degraded_spl = ScaleSignalsNode._calculate_SPL(result[self.deg_sig_key])
-        result[self.deg_sig_key] *= (10 ** ((required_reference_spl - required_degraded_spl) / 20))
+        ref_sig = lazyaudio.materialize(result[self.ref_sig_key])
+        deg_sig = lazyaudio.materialize(result[self.deg_sig_key])
+        required_reference_spl = ScaleSignalsNode._calculate_SPL(ref_sig)
+        required_degraded_spl = ScaleSignalsNode._calculate_SPL(deg_sig)
+        result[self.deg_sig_key] = deg_sig * (10 ** ((required_reference_spl - required_degraded_spl) / 20))
         return result
-    
-    
+
+
+    def execute_batch(self, results: list, **kwargs) -> list:
+        """Execute the ScaleSignalNode on a batch, computing the SPL of all signals at once when they have the same shape."""
+        self.log_batch(results)
+        ref_sigs = [lazyaudio.materialize(result[self.ref_sig_key]) for result in results]
+        deg_sigs = [lazyaudio.materialize(result[self.deg_sig_key]) for result in results]
+        if len({sig.shape for sig in ref_sigs + deg_sigs}) > 1:
+            return [self.execute(result, **kwargs) for result in results]
+        required_reference_spl = ScaleSignalsNode._calculate_batch_SPL(np.stack(ref_sigs))
+        required_degraded_spl = ScaleSignalsNode._calculate_batch_SPL(np.stack(deg_sigs))
+        for result, deg_sig, ref_spl, deg_spl in zip(results, deg_sigs, required_reference_spl, required_degraded_spl):
+            result[self.deg_sig_key] = deg_sig * (10 ** ((ref_spl - deg_spl) / 20))
+        return results
+
+
+    def input_keys(self) -> list:
+        return [self.ref_sig_key, self.deg_sig_key]
+
+
+    def output_keys(self) -> list:
+        return [self.deg_sig_key]
+
+
     @classmethod
     def _calculate_SPL(cls, signal: np.ndarray) -> float:
-        return 20 * math.log10(math.sqrt(np.mean(np.square(signal))) / 20e-6)
\ No newline at end of file
+        return 20 * math.log10(math.sqrt(np.mean(np.square(signal))) / 20e-6)
+
+
+    @classmethod
+    def _calculate_batch_SPL(cls, signals: np.ndarray) -> np.ndarray:
+        """Calculate the SPL of each signal stacked along the first axis."""
+        mean_square = np.mean(np.square(signals).reshape(len(signals), -1), axis=1)
+        return np.array([20 * math.log10(math.sqrt(ms) / 20e-6) for ms in mean_square])
\ No newline at end of file
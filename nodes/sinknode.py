@@ -17,16 +17,24 @@ class SinkNode(AQPNode):
         """
         super().__init__(id_, draw_options=draw_options, **kwargs)
         self.num_expected_results = num_expected_results
-        self.counter = 0
         self.type_ = 'SinkNode'
        
 
     def execute(self, result: dict, **kwargs):
         """Execute the SinkNode.
         
-        Will return None until the number of expected results is equal to the 
-        number of results seen. Then returns the result dict.
+        The arrivals are counted by the scheduler running the graph, see 
+        graphutils.Join, which only executes this node once the number of 
+        expected results has been seen. The count starts again each time the
+        graph is run, e.g. for every iteration of a LoopNode.
         """
         super().execute(result, **kwargs)
-        self.counter += 1
-        return result if self.counter == self.num_expected_results else None
\ No newline at end of file
+        return result
+
+
+    def input_keys(self) -> list:
+        return []
+
+
+    def output_keys(self) -> list:
+        return []
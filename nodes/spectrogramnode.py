@@ -2,6 +2,8 @@
 
 import numpy as np
 import qualitymetrics.visqol.spectrograms.spectrogram as spectrogram
+import featurecache
+import lazyaudio
 import matplotlib.pyplot as plt
 import librosa.display
 import logging
@@ -12,6 +14,10 @@ from constants import LOGGER_NAME
 
 LOGGER = logging.getLogger(LOGGER_NAME)
 
+# Part of the key of the spectrograms in the FeatureCache, increment it when
+# build_spectrogram changes so spectrograms cached before aren't used.
+FEATURE_VERSION = 1
+
 class SpectrogramNode(AQPNode):
     """Node which is used to create spectrograms based off of audio signals.
     
@@ -48,11 +54,15 @@ class SpectrogramNode(AQPNode):
     def execute(self, result: dict, **kwargs):
         """Execute the SpectrogramNode and generate the spectrogram."""
         super().execute(result)
-        signal = result[self.signal_key]
+        signal = lazyaudio.materialize(result[self.signal_key])
         filterbank = result['visqol_args'].filterbank
         analysis_window= result['visqol_args'].analysis_window
         sample_rate  = analysis_window.sample_rate
-        result[self.output_key], result[self.output_key + '_spaces'] = spectrogram.build_spectrogram(signal, sample_rate, filterbank, analysis_window, True)
+        params = {'sample_rate': sample_rate, 'filterbank': filterbank, 'analysis_window': analysis_window,
+                  'window_data': analysis_window.data, 'version': FEATURE_VERSION}
+        spect, time_spaces = featurecache.cached('visqol_spectrogram', signal, params,
+                                                 lambda: spectrogram.build_spectrogram(signal, sample_rate, filterbank, analysis_window, True))
+        result[self.output_key], result[self.output_key + '_spaces'] = spect, time_spaces.tolist()
 
         if self.save_spectrogram:
             if not os.path.exists(self.output_dir):
@@ -63,7 +73,15 @@ class SpectrogramNode(AQPNode):
             _plot_spectrogram(result[self.output_key], self.save_spectrogram, output_path)
             
         return result
-    
+
+
+    def input_keys(self) -> list:
+        return [self.signal_key, 'visqol_args'] + ([self.file_name_key] if self.save_spectrogram else [])
+
+
+    def output_keys(self) -> list:
+        return [self.output_key, self.output_key + '_spaces']
+
 
 def _plot_spectrogram(spectrogram: np.ndarray, save_spectrogram: bool = False,
                      file_name:str = 'DEFAULT') -> None:
@@ -5,18 +5,84 @@ within this single TransformNode.
 """
 
 import sys
+import inspect
 import logging
+import numbers
 import pathlib
+import threading
+import numpy as np
 
 from .node import AQPNode
 from pipeline import LOGGER_NAME
 
 LOGGER = logging.getLogger(LOGGER_NAME)
 
+# Branches of the graph can run on several threads, see 
+# graphutils.run_node_concurrent, and pandas doesn't support concurrent writes.
+_DF_LOCK = threading.Lock()
+
+# Suffix of the key the ColumnBuffers of a dataframe are stored at, e.g.
+# 'dataframe_columns' for the dataframe at 'dataframe'.
+COLUMNS_SUFFIX = '_columns'
+
+
+class ColumnBuffers:
+    """Numpy buffers collecting the values update_df writes to each column of a dataframe, by row position.
+
+    Writing a single cell of a dataframe is slow, so the values are kept in a
+    buffer per column and joined into the dataframe in one go, see
+    join_columns.
+    """
+
+    def __init__(self, num_rows: int):
+        self.num_rows = num_rows
+        # column -> (values, mask of the rows written)
+        self.columns = {}
+
+
+    def set(self, column: str, row: int, value):
+        """Set the value of a column at a row position."""
+        if column not in self.columns:
+            self.columns[column] = (np.full(self.num_rows, np.nan), np.zeros(self.num_rows, dtype=bool))
+        values, written = self.columns[column]
+        is_number = isinstance(value, numbers.Real) and not isinstance(value, (bool, np.bool_))
+        if not is_number and values.dtype != object:
+            values = values.astype(object)
+            self.columns[column] = (values, written)
+        values[row] = value
+        written[row] = True
+
+
+    def join(self, df):
+        """Write the buffered values to the dataframe and empty the buffers."""
+        for column, (values, written) in self.columns.items():
+            if column not in df.columns or written.all():
+                df[column] = values
+            else:
+                df.iloc[np.flatnonzero(written), df.columns.get_loc(column)] = values[written]
+        self.columns = {}
+
+
+def join_columns(result: dict):
+    """Join the values buffered by update_df into the dataframes of the result dict."""
+    with _DF_LOCK:
+        for key in list(result.keys()):
+            if isinstance(key, str) and key.endswith(COLUMNS_SUFFIX) and isinstance(result[key], ColumnBuffers):
+                target_key = key[:-len(COLUMNS_SUFFIX)]
+                if target_key in result:
+                    result[key].join(result[target_key])
+
+
 def df_columns_to_tuples(result: dict, target_key: str, output_key: str,
-                         col_one: str, col_two: str, **kwargs):
+                         col_one: str, col_two: str, row_index: bool=True, **kwargs):
     """Take two columns from a Pandas dataframe stored in the result dict and create a single list of tuples of the two columns.
 
+    By default the position of the row is added to each tuple, which lets
+    update_df write to the row directly instead of searching the dataframe
+    for it. The values written are then buffered in a ColumnBuffers stored
+    at target_key + '_columns' until they are joined into the dataframe, 
+    see join_columns.
+
     Parameters
     ----------
     result : dict
@@ -29,6 +95,9 @@ def df_columns_to_tuples(result: dict, target_key: str, output_key: str,
         The name of the first column to use.
     col_two : str
         The name of the second column to use.
+    row_index : bool, optional
+        Add the position of the row as the third value of each tuple. The 
+        default is True.
 
     Returns
     -------
@@ -42,14 +111,20 @@ def df_columns_to_tuples(result: dict, target_key: str, output_key: str,
         LOGGER.error("Function requires target_key to operate")
         sys.exit(-2)
     df = result[target_key]
-    result[output_key] = list(zip(df[col_one], df[col_two]))
+    if not row_index:
+        result[output_key] = list(zip(df[col_one], df[col_two]))
+        return
+    result[output_key] = list(zip(df[col_one], df[col_two], range(len(df))))
+    if not isinstance(result.get(target_key + COLUMNS_SUFFIX), ColumnBuffers):
+        result[target_key + COLUMNS_SUFFIX] = ColumnBuffers(len(df))
 
 
 def tuple_to_top_level(result: dict, target_key: str, 
                        reference_file_key: str='reference',
-                       degraded_file_key: str='degraded', **kwargs):
+                       degraded_file_key: str='degraded', 
+                       row_index_key: str='row_index', **kwargs):
     """
-    Convert a two-item tuple to two top-level dict fields.
+    Convert a two-item tuple to two top-level dict fields, and the row position of a three-item tuple to a third.
 
     Parameters
     ----------
@@ -61,6 +136,9 @@ def tuple_to_top_level(result: dict, target_key: str,
         Key to assign the first tuple value to. The default is 'reference'.
     degraded_file_key : str, optional
         Key to assign the second tuple value to. The default is 'degraded'.
+    row_index_key : str, optional
+        Key to assign the third tuple value, the row position added by
+        df_columns_to_tuples, to. The default is 'row_index'.
 
     Returns
     -------
@@ -70,13 +148,20 @@ def tuple_to_top_level(result: dict, target_key: str,
     file_names = result[target_key]
     result[reference_file_key] = file_names[0]
     result[degraded_file_key] = file_names[1]
+    if len(file_names) > 2:
+        result[row_index_key] = file_names[2]
 
 
 def update_df(result: dict, target_key: str, 
                                  key: str, col_name: str='Ref_Wave', deg_col='Test_Wave',
-                                 file_name_key: str='reference_file', test_file_name_key='degraded_file', **kwargs):
+                                 file_name_key: str='reference_file', test_file_name_key='degraded_file',
+                                 row_index_key: str='row_index', df_updates: list=None, **kwargs):
     """Update the dataframe being used based on the col_name and ref_file_name_key arguments, with the value stored at the key.
 
+    If the result contains the row position at row_index_key, and the 
+    dataframe has ColumnBuffers, the value is written to the buffer of the
+    column at that position instead, without searching the dataframe.
+
     Parameters
     ----------
     result : dict
@@ -93,15 +178,55 @@ def update_df(result: dict, target_key: str,
     file_name_key : str, optional
         The key used to retrieve the file name that will be used to find the correct
         index in the dataframe. The default is 'reference_file'.
+    row_index_key : str, optional
+        Key of the row position set by tuple_to_top_level. The default is
+        'row_index'.
+    df_updates : list, optional
+        If set, the update is also appended to this list so it can be applied
+        to another copy of the dataframe, e.g. the one held by the parent
+        process of a LoopNode worker. The default is None.
 
     Returns
     -------
     None.
 
     """
-    df = result[target_key]
-    index = df.index[((df[col_name] == result[file_name_key]) & (df[deg_col] == result[test_file_name_key]))]
-    df.at[index, key] = result[key]
+    buffers = result.get(target_key + COLUMNS_SUFFIX)
+    index = result.get(row_index_key)
+    with _DF_LOCK:
+        if index is not None and isinstance(buffers, ColumnBuffers):
+            buffers.set(key, index, result[key])
+        else:
+            df = result[target_key]
+            index = df.index[((df[col_name] == result[file_name_key]) & (df[deg_col] == result[test_file_name_key]))]
+            df.at[index, key] = result[key]
+    if df_updates is not None:
+        df_updates.append((target_key, index, key, result[key]))
+
+
+def apply_df_updates(result: dict, df_updates: list):
+    """Apply the updates recorded by update_df to the dataframes in the result dict.
+
+    Parameters
+    ----------
+    result : dict
+        The results dictionary containing the dataframes to update.
+    df_updates : list
+        List of (target_key, index, key, value) tuples recorded by update_df.
+        An integer index is a row position, which is written to the 
+        dataframe's ColumnBuffers.
+
+    Returns
+    -------
+    None.
+
+    """
+    with _DF_LOCK:
+        for target_key, index, key, value in df_updates:
+            if isinstance(index, (int, np.integer)):
+                result[target_key + COLUMNS_SUFFIX].set(key, index, value)
+            else:
+                result[target_key].at[index, key] = value
 
 
 def to_csv(result: dict, target_key: str, output_file_name: str, **kwargs):
@@ -109,6 +234,7 @@ def to_csv(result: dict, target_key: str, output_file_name: str, **kwargs):
     if data is None:
         LOGGER.error("Can't find data to write to csv.")
         return
+    join_columns(result)
     path_to_output_file = output_file_name[:output_file_name.rindex('/') + 1]
     pathlib.Path(path_to_output_file).mkdir(parents=True, exist_ok=True)
     data.to_csv(output_file_name)
@@ -122,6 +248,15 @@ FUNCTIONS = {
     'to_csv':  to_csv
 }
 
+# The (read, written) keys of each transform, given the arguments it is called with.
+FUNCTION_KEYS = {
+    'df_columns_to_tuples': lambda args: ([args['target_key']], [args['output_key'], args['target_key'] + COLUMNS_SUFFIX]),
+    'tuple_to_top_level': lambda args: ([args['target_key']], [args['reference_file_key'], args['degraded_file_key'], args['row_index_key']]),
+    'update_df': lambda args: ([args['target_key'], args['key'], args['file_name_key'], args['test_file_name_key'],
+                                args['row_index_key'], args['target_key'] + COLUMNS_SUFFIX], []),
+    'to_csv': lambda args: ([args['target_key']], [])
+}
+
 
 class TransformNode(AQPNode):
     """Node which encapsulates some transform logic."""
@@ -131,6 +266,7 @@ class TransformNode(AQPNode):
                  draw_options: dict=None, **kwargs):
         super().__init__(id_, output_key=output_key, draw_options=draw_options)
         self.function = FUNCTIONS[transform_name]
+        self.transform_name = transform_name
         self.function_args = function_args
         self.target_key = target_key
         self.type_ = 'TransformNode'
@@ -142,6 +278,21 @@ class TransformNode(AQPNode):
         self.function(result, **args)
         return result
 
+
+    def input_keys(self) -> list:
+        return self._keys()[0]
+
+
+    def output_keys(self) -> list:
+        return self._keys()[1]
+
+
+    def _keys(self) -> tuple:
+        """Get the keys read and written by the transform, using the defaults of the function for missing arguments."""
+        defaults = {name: param.default for name, param in inspect.signature(self.function).parameters.items()
+                    if param.default is not inspect.Parameter.empty}
+        return FUNCTION_KEYS[self.transform_name]({**defaults, **self.__dict__(), **self.function_args})
+
     def __dict__(self):
         """Create a dict representation of the node.
 
@@ -2,6 +2,7 @@
 
 import pyvad
 import numpy as np
+import lazyaudio
 
 from .node import AQPNode
 from qualitymetrics.visqol.constants import PATCH_SIZE
@@ -21,7 +22,7 @@ class VADNode(AQPNode):
         """
         super().execute(result, **kwargs)
         if result['visqol_args'].arguments.speech:
-            reference_signal = result['reference_signal']
+            reference_signal = lazyaudio.materialize(result['reference_signal'])
             reference_patches = result['reference_patches']
             reference_patch_indexes = result['reference_patch_indexes']
             sample_rate = result['visqol_args'].analysis_window.sample_rate
@@ -30,4 +31,12 @@ class VADNode(AQPNode):
             keep_indexes = np.array([np.sum(voice_activity[reference_patch_indexes[i] : reference_patch_indexes[i] + PATCH_SIZE - 1]) < PATCH_SIZE * 0.8 for i in range(len(reference_patch_indexes))])
             result['reference_patches'] = reference_patches[keep_indexes]
             result['reference_patch_indexes'] = reference_patch_indexes[keep_indexes]
-        return result
\ No newline at end of file
+        return result
+
+
+    def input_keys(self) -> list:
+        return ['visqol_args', 'reference_signal', 'reference_patches', 'reference_patch_indexes']
+
+
+    def output_keys(self) -> list:
+        return ['reference_patches', 'reference_patch_indexes']
@@ -16,4 +16,12 @@ class VariableNode(AQPNode):
         """Execute the VariableNode and assign the stored value to the result dict."""
         super().execute(result)
         result[self.output_key] = self.variable_value
-        return result
\ No newline at end of file
+        return result
+
+
+    def input_keys(self) -> list:
+        return []
+
+
+    def output_keys(self) -> list:
+        return [self.output_key]
@@ -54,4 +54,11 @@ class GraphMOSNode(ViSQOLNode):
             plt.legend()
             plt.show()
         return result
-        
\ No newline at end of file
+
+
+    def input_keys(self) -> list:
+        return [self.df_key]
+
+
+    def output_keys(self) -> list:
+        return []
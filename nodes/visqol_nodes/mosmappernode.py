@@ -5,6 +5,7 @@ import logging
 
 from ..node import ViSQOLNode
 from constants import LOGGER_NAME
+from qualitymetrics.visqol.constants import CHANNELS
 from libsvm.svmutil import svm_load_model, svm_predict
 
 from functools import reduce  
@@ -48,14 +49,57 @@ class MOSMapperNode(ViSQOLNode):
         it to the SVM and retrieve a MOS.
         """
         super().execute(result, **kwargs)
+        vnsim, fvnsims = self._collect_similarities(result)
+        moslqo = -1
+        if result[self.visqol_args_key].arguments.perform_mos_mapping:
+            if vnsim < 0.15:
+                moslqo = 1
+            else:
+                [p_label, p_acc, p_val] = svm_predict(np.ndarray([0]), fvnsims, self.model, '-q')
+                moslqo = _clip_mos(p_val[0][0])
+        result[self.output_key] = moslqo
+        return result
+
+
+    def execute_batch(self, results: list, **kwargs) -> list:
+        """Map the similarity data of a batch to MOS, using a single SVM prediction for the whole batch."""
+        self.log_batch(results)
+        to_predict = []
+        for result in results:
+            vnsim, fvnsims = self._collect_similarities(result)
+            moslqo = -1
+            if result[self.visqol_args_key].arguments.perform_mos_mapping:
+                if vnsim < 0.15:
+                    moslqo = 1
+                else:
+                    to_predict.append((result, fvnsims))
+            result[self.output_key] = moslqo
+
+        if to_predict:
+            [p_label, p_acc, p_val] = svm_predict(np.ndarray([0]), np.vstack([f for _, f in to_predict]), self.model, '-q')
+            # Each result's prediction is the first row of its block of fvnsims.
+            row = 0
+            for result, fvnsims in to_predict:
+                result[self.output_key] = _clip_mos(p_val[row][0])
+                row += fvnsims.shape[0]
+        return results
+
+
+    def input_keys(self) -> list:
+        # The active channels are only known once the graph runs, so the
+        # keys of every channel are declared.
+        channel_keys = dict.fromkeys(self._channel_keys(channel)[0] for channel in CHANNELS)
+        return ['active_channels', self.visqol_args_key] + list(channel_keys)
+
+
+    def output_keys(self) -> list:
+        return [self.output_key]
+
+
+    def _collect_similarities(self, result: dict) -> tuple:
+        """Extract the similarity data for each active channel, returning the vnsim and the fvnsims to map."""
         active_channels = result['active_channels']
-        
-        dict_keys = []
-        split_keys = self.target_key.split('.')
-        for channel in active_channels:
-            split_keys_copy = split_keys.copy()
-            split_keys_copy.insert(-1, channel)
-            dict_keys.append(split_keys_copy)
+        dict_keys = [self._channel_keys(channel) for channel in active_channels]
             
         sim_data = []
         for d_key in dict_keys:
@@ -72,20 +116,24 @@ class MOSMapperNode(ViSQOLNode):
         fvnsims = np.array(fvnsim_data) if len(fvnsim_data) > 1 else fvnsim_func(np.array(fvnsim_data))
         
         fvnsims = np.reshape(fvnsims, (fvnsims.shape[0], 1))
-        moslqo = -1
-        if result[self.visqol_args_key].arguments.perform_mos_mapping:
-            if vnsim < 0.15:
-                moslqo = 1
-            else:
-                [p_label, p_acc, p_val] = svm_predict(np.ndarray([0]), fvnsims, self.model, '-q')
-                p_val = p_val[0][0]
-                if p_val < 1:
-                    p_val = 1
-                elif p_val > 5:
-                    p_val = 5
-                moslqo = p_val
-        result[self.output_key] = moslqo
-        return result
+        return vnsim, fvnsims
+
+
+    def _channel_keys(self, channel: str) -> list:
+        """Get the path of the similarity data of a channel in the result dict, the target key with the channel inserted before its last element."""
+        split_keys = self.target_key.split('.')
+        split_keys.insert(-1, channel)
+        return split_keys
+
+
+def _clip_mos(p_val: float) -> float:
+    """Clip a value predicted by the SVM to the MOS range of 1 to 5."""
+    if p_val < 1:
+        p_val = 1
+    elif p_val > 5:
+        p_val = 5
+    return p_val
+
     
 def get_from_dict(dataDict, mapList):
     """Given a list of keys retrieve data from a nested dictionary."""
@@ -1,6 +1,7 @@
 """Module containing the ViSQOLStructuresNode, which handles the configurable options of ViSQOL."""
 
 import logging
+import lazyaudio
 import qualitymetrics.visqol.constants as constants
 
 from ..node import ViSQOLNode
@@ -40,7 +41,9 @@ class VisqolStructuresNode(ViSQOLNode):
         super().execute(result)
         channel_info = self.options['channel_config'].channel_info
         if channel_info['left'] is None and channel_info['right'] is None and channel_info['mid'] is None and channel_info['side'] is None: 
-            self.options['channel_config'] = setup_channel_configuration(result['reference_signal'], result['degraded_signal'], self.options['channel_config'])
+            self.options['channel_config'] = setup_channel_configuration(lazyaudio.materialize(result['reference_signal']),
+                                                                          lazyaudio.materialize(result['degraded_signal']),
+                                                                          self.options['channel_config'])
             
         visqol_options = VisqolOptions(self.options['visqol_args'], self.options['analysis_window'], self.options['filterbank'], self.options['channel_config'])
         channel_info = self.options['channel_config'].channel_info
@@ -52,9 +55,17 @@ class VisqolStructuresNode(ViSQOLNode):
         
         result[self.output_key] = visqol_options
         
-        return result 
-    
-    
+        return result
+
+
+    def input_keys(self) -> list:
+        return ['reference_signal', 'degraded_signal']
+
+
+    def output_keys(self) -> list:
+        return ['active_channels', 'PATCH_SIZE', 'warps', 'L', self.output_key]
+
+
     def _construct_visqol_options(self):
         try:
             with open(self._config_file_path, 'rb') as config:
@@ -1,49 +1,34 @@
-from ..node import WarpQNode
+import featurecache
 import librosa
 import speechpy
-import numpy as np
-from skimage.util.shape import view_as_windows
 
-class MelNode(WarpQNode):
+from .warpqfeaturenode import WarpQFeatureNode
 
-    def __init__(self, id_, ref_sig_key, deg_sig_key,
-                 n_mfcc=12, fmax=5000, patch_size=0.4,
-                 **kwargs):
-        super().__init__(id_, **kwargs)
-        self.ref_sig_key = ref_sig_key
-        self.deg_sig_key = deg_sig_key
-        self.n_mfcc = n_mfcc
-        self.fmax = fmax
-        self.patch_size = patch_size
-        self.type_ = "MelNode"
-    
+# Part of the key of the features in the FeatureCache, increment it when the
+# features change so features cached before aren't used.
+FEATURE_VERSION = 1
+
+class MelNode(WarpQFeatureNode):
     
-    def execute(self, result, **kwargs):
-        super().execute(result, **kwargs)
-        sr = result['sr']
+    def __init__(self, id_, ref_sig_key, deg_sig_key, **kwargs):
+        super().__init__(id_, ref_sig_key, deg_sig_key, **kwargs)
+        self.type_ = "MelNode"
+
+
+    def _features(self, sig, sr):
         win_length = int(0.032 * sr)
         hop_length = int(0.004 * sr)
         n_fft = 2 * win_length
         lifter = 3
+        cmvn_win_size = 201
         
-        ref_sig = result[self.ref_sig_key]
-        deg_sig = result[self.deg_sig_key]
-        
-        mfcc_ref = librosa.feature.melspectrogram(ref_sig,sr=sr,fmax=self.fmax,
-                                    n_fft=n_fft,win_length=win_length,hop_length=hop_length)
-        mfcc_coded = librosa.feature.melspectrogram(deg_sig,sr=sr,fmax=self.fmax,
+        params = {'sr': sr, 'fmax': self.fmax, 'n_fft': n_fft, 'win_length': win_length,
+                  'hop_length': hop_length, 'cmvn_win_size': cmvn_win_size,
+                  'librosa': librosa.__version__, 'version': FEATURE_VERSION}
+        return featurecache.cached('warpq_mel', sig, params, lambda: (self._compute_features(sig, sr, n_fft, win_length, hop_length, cmvn_win_size),))[0]
+
+
+    def _compute_features(self, sig, sr, n_fft, win_length, hop_length, cmvn_win_size):
+        features = librosa.feature.melspectrogram(sig,sr=sr,fmax=self.fmax,
                                     n_fft=n_fft,win_length=win_length,hop_length=hop_length)
-        
-        mfcc_ref = speechpy.processing.cmvnw(mfcc_ref.T,win_size=201,variance_normalization=True).T
-        mfcc_coded = speechpy.processing.cmvnw(mfcc_coded.T,win_size=201,variance_normalization=True).T
-        
-        # Divid MFCC features of Coded speech into patches
-        cols = int(self.patch_size/(hop_length/sr))
-        window_shape = (np.size(mfcc_ref,0), cols)
-        step  = int(cols/2)
-        
-        mfcc_Coded_patch = view_as_windows(mfcc_coded, window_shape, step)
-        result['mfcc_coded_patch'] = mfcc_Coded_patch
-        result['mfcc_ref'] = mfcc_ref
-        result['mfcc_coded'] = mfcc_coded
-        return result
\ No newline at end of file
+        return speechpy.processing.cmvnw(features.T,win_size=cmvn_win_size,variance_normalization=True).T
@@ -0,0 +1,72 @@
+"""Module containing the WarpQFeatureNode, the base of the nodes computing the WARP-Q features of the reference and degraded signals."""
+
+import featurecache
+import lazyaudio
+import numpy as np
+
+from ..node import WarpQNode
+from skimage.util.shape import view_as_windows
+
+class WarpQFeatureNode(WarpQNode):
+    """Base of the MFCCNode and MelNode, which only differ in the features computed by _features."""
+
+    def __init__(self, id_, ref_sig_key, deg_sig_key,
+                 n_mfcc=12, fmax=5000, patch_size=0.4,
+                 **kwargs):
+        super().__init__(id_, **kwargs)
+        self.ref_sig_key = ref_sig_key
+        self.deg_sig_key = deg_sig_key
+        self.n_mfcc = n_mfcc
+        self.fmax = fmax
+        self.patch_size = patch_size
+
+
+    def execute(self, result, **kwargs):
+        super().execute(result, **kwargs)
+        sr = result['sr']
+        mfcc_ref = self._features(lazyaudio.materialize(result[self.ref_sig_key]), sr)
+        mfcc_coded = self._features(lazyaudio.materialize(result[self.deg_sig_key]), sr)
+        self._store_features(result, mfcc_ref, mfcc_coded, sr)
+        return result
+
+
+    def execute_batch(self, results, **kwargs):
+        """Compute the features of a batch, reusing the reference features for entries which share a reference signal."""
+        self.log_batch(results)
+        ref_features = {}
+        for result in results:
+            sr = result['sr']
+            ref_sig = lazyaudio.materialize(result[self.ref_sig_key])
+            key = featurecache.feature_key(self.type_, ref_sig, {'sr': sr})
+            if key not in ref_features:
+                ref_features[key] = self._features(ref_sig, sr)
+            mfcc_coded = self._features(lazyaudio.materialize(result[self.deg_sig_key]), sr)
+            self._store_features(result, ref_features[key], mfcc_coded, sr)
+        return results
+
+
+    def input_keys(self) -> list:
+        return [self.ref_sig_key, self.deg_sig_key, 'sr']
+
+
+    def output_keys(self) -> list:
+        return ['mfcc_coded_patch', 'mfcc_ref', 'mfcc_coded']
+
+
+    def _features(self, sig, sr):
+        """Compute the features of a signal, implemented by the subclasses."""
+        raise NotImplementedError
+
+
+    def _store_features(self, result, mfcc_ref, mfcc_coded, sr):
+        hop_length = int(0.004 * sr)
+
+        # Divid MFCC features of Coded speech into patches
+        cols = int(self.patch_size/(hop_length/sr))
+        window_shape = (np.size(mfcc_ref,0), cols)
+        step  = int(cols/2)
+
+        mfcc_Coded_patch = view_as_windows(mfcc_coded, window_shape, step)
+        result['mfcc_coded_patch'] = mfcc_Coded_patch
+        result['mfcc_ref'] = mfcc_ref
+        result['mfcc_coded'] = mfcc_coded
@@ -29,4 +29,12 @@ class WarpQSDTWNode(WarpQNode):
             acc.append(D[-1, b_ast]/D.shape[0])
         
         result[self.output_key] = np.median(acc)
-        return result
\ No newline at end of file
+        return result
+
+
+    def input_keys(self) -> list:
+        return [self.mfcc_ref_key, self.mfcc_coded_patch_key]
+
+
+    def output_keys(self) -> list:
+        return [self.output_key]
@@ -1,3 +1,5 @@
+import lazyaudio
+
 from ..node import WarpQNode
 from pyvad import vad
 
@@ -12,8 +14,8 @@ class WarpQVADNode(WarpQNode):
     
     def execute(self, result, **kwargs):
         super().execute(result, **kwargs)
-        ref_signal = result[self.ref_sig_key]
-        deg_signal = result[self.deg_sig_key]
+        ref_signal = lazyaudio.materialize(result[self.ref_sig_key])
+        deg_signal = lazyaudio.materialize(result[self.deg_sig_key])
         vad_hop_size = 30
         vad_sr = result['sr']
         aggresive = 0
@@ -27,4 +29,11 @@ class WarpQVADNode(WarpQNode):
         result[self.ref_sig_key] = ref_sig_vad
         result[self.deg_sig_key] = deg_sig_vad
         return result
-        
\ No newline at end of file
+
+
+    def input_keys(self) -> list:
+        return [self.ref_sig_key, self.deg_sig_key, 'sr']
+
+
+    def output_keys(self) -> list:
+        return [self.ref_sig_key, self.deg_sig_key]
@@ -17,6 +17,25 @@ Command Line Args:
         --graph_output_file: Path to directory to store the generated .dot 
         files in.
         
+        --branch_workers: Number of threads used to run sibling branches of
+        the graph concurrently.
+
+        --profile: Record the wall time, CPU time, number of calls and array
+        bytes allocated by every node, including nested nodes.
+
+        --profile_output: Path, without extension, the profile is written to
+        as a .json file and a .txt table.
+
+        --profile_sort: Column the profile table is sorted by.
+
+        --audio_cache_mb: Size in MiB of the cache of decoded signals shared
+        by the LoadSignalNodes, 0 disables it.
+
+        --feature_cache: Directory of the on-disk cache of the spectrograms
+        and WARP-Q features, disabled if not set.
+
+        --feature_cache_mb: Maximum size in MiB of the feature cache.
+
         --debug: Enables debug level logging.
         
         --version: displays the version info.
@@ -27,8 +46,12 @@ import argparse
 import json
 import logging
 import sys
+import audiocache
+import audioloader
+import featurecache
 import graphutils
 import graphvis
+import profiling
 import time
 import subprocess
 
@@ -47,6 +70,7 @@ def main() -> None:
     parser = init_argparser()
     args = parser.parse_args()
     LOGGER.setLevel(logging.DEBUG if args.debug else logging.INFO)
+    graphutils.set_branch_workers(args.branch_workers)
     if args.plot_graph and not args.graph_output_file:
         raise ValueError(
             'If plotting call graph then the output file must also be specified')
@@ -57,6 +81,9 @@ def main() -> None:
             root_node = nodes[args.root_node_id]
             LOGGER.info('Performing validation checks')
             valid, ordering = graphutils.validate_graph(root_node)
+            # Compiled once, so keys are released as soon as the last node 
+            # reading them has run. Graphs with joins run as before.
+            plan = graphutils.compile_plan(root_node)
             # Exit if not valid
             # if not valid:
             #     LOGGER.error('Failed validation')
@@ -88,13 +115,33 @@ def main() -> None:
         LOGGER.info('Just performing validation, exitting early')
         sys.exit(0)
 
+    profiler = profiling.enable() if args.profile else None
+    audio_cache = audiocache.get_cache()
+    audio_cache.resize(args.audio_cache_mb * 1024 ** 2)
+    if args.feature_cache:
+        featurecache.enable(args.feature_cache, args.feature_cache_mb * 1024 ** 2)
     result = {}
     start_time = time.time()
     LOGGER.info("Running pipeline...")
-    graphutils.run_node(root_node, result)
+    if plan is not None:
+        graphutils.run_plan(plan, result)
+    else:
+        graphutils.run_node(root_node, result)
     LOGGER.info("Finished running pipeline.")
     end_time = time.time()
     LOGGER.info(f'Elapsed time: {end_time - start_time}')
+    stats = audio_cache.stats()
+    LOGGER.info('Audio cache: %d hits, %d misses (%.1f%% hit rate), %d evictions, %d signals using %.1f MiB',
+                stats['hits'], stats['misses'], stats['hit_rate'] * 100, stats['evictions'],
+                stats['entries'], stats['bytes'] / 1024 ** 2)
+    timings = audioloader.timings()
+    LOGGER.info('Loaded %d audio files: %.2f s decoding, %.2f s resampling',
+                timings['files'], timings['decode'], timings['resample'])
+    featurecache.log_stats()
+    if profiler is not None:
+        LOGGER.info('Node profile:\n%s', profiler.format_table(args.profile_sort))
+        Path(args.profile_output).parent.mkdir(parents=True, exist_ok=True)
+        profiler.write(args.profile_output, args.profile_sort)
     
 
 def init_argparser() -> argparse.ArgumentParser:
@@ -112,6 +159,13 @@ def init_argparser() -> argparse.ArgumentParser:
     optional = parser.add_argument_group('Optional Arguments')
     optional.add_argument('--plot_graph',action='store_true', default=False)
     optional.add_argument('--graph_output_file', default='results/graph')
+    optional.add_argument('--branch_workers', type=int, default=1)
+    optional.add_argument('--profile', action='store_true', default=False)
+    optional.add_argument('--profile_output', default='results/profile')
+    optional.add_argument('--profile_sort', choices=profiling.SORT_KEYS, default='total_wall')
+    optional.add_argument('--audio_cache_mb', type=int, default=audiocache.DEFAULT_MAX_BYTES // 1024 ** 2)
+    optional.add_argument('--feature_cache', default=None)
+    optional.add_argument('--feature_cache_mb', type=int, default=featurecache.DEFAULT_MAX_BYTES // 1024 ** 2)
     optional.add_argument('--debug', action='store_true', default=False)
     optional.add_argument('--validate', action='store_true', default=False)
     optional.add_argument('-v', '--version', action='version',
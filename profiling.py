@@ -0,0 +1,159 @@
+"""Module containing the Profiler, used to record the cost of executing each node of the pipeline.
+
+Profiling is enabled with the --profile command line argument of pipeline.py.
+While enabled, graphutils executes every node through the active Profiler,
+which records the wall time, CPU time and the bytes of the arrays each
+execution added to the result dictionary. This includes the nodes nested
+inside LoopNodes and EncapsulationNodes, the times of which also include the
+time of the nodes nested inside them.
+"""
+
+import json
+import logging
+import threading
+import time
+import numpy as np
+
+from constants import LOGGER_NAME
+from typing import Dict, List
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+# Columns of the summary the table can be sorted by.
+SORT_KEYS = ('total_wall', 'median_wall', 'p95_wall', 'max_wall', 'total_cpu', 'calls', 'total_bytes')
+
+_ACTIVE = None
+
+
+def enable() -> 'Profiler':
+    """Start profiling every node executed by graphutils, returning the active Profiler."""
+    global _ACTIVE
+    _ACTIVE = Profiler()
+    return _ACTIVE
+
+
+def get_profiler() -> 'Profiler':
+    """Get the active Profiler, None if profiling isn't enabled."""
+    return _ACTIVE
+
+
+def _array_bytes(value, depth: int=2) -> int:
+    """Get the bytes held by the numpy arrays in a value, looking inside dicts, lists and tuples."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if depth == 0:
+        return 0
+    if isinstance(value, dict):
+        return sum(_array_bytes(v, depth - 1) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_array_bytes(v, depth - 1) for v in value)
+    return 0
+
+
+def _new_array_bytes(result: dict, before: dict) -> int:
+    """Get the bytes of the arrays assigned to the result dictionary since the snapshot before was taken."""
+    return sum(_array_bytes(v) for k, v in result.items() if before.get(k) != id(v))
+
+
+class Profiler:
+    """Collects the samples recorded for each node and summarizes them."""
+
+    def __init__(self):
+        # (id_, type_) -> list of (wall seconds, cpu seconds, bytes) samples
+        self.samples: Dict[tuple, List[tuple]] = {}
+        self._lock = threading.Lock()
+
+
+    def record(self, node_id: str, node_type: str, wall: float, cpu: float, nbytes: int):
+        """Record a single execution of a node."""
+        with self._lock:
+            self.samples.setdefault((node_id, node_type), []).append((wall, cpu, nbytes))
+
+
+    def execute(self, node, result: dict, **kwargs):
+        """Execute a node and record its profile."""
+        before = {k: id(v) for k, v in result.items()}
+        wall, cpu = time.perf_counter(), time.thread_time()
+        r = node.execute(result, **kwargs)
+        wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+        self.record(node.id_, node.type_, wall, cpu, _new_array_bytes(result, before))
+        return r
+
+
+    def execute_batch(self, node, results: list, **kwargs) -> list:
+        """Execute a node on a batch and record its profile, split evenly over the entries of the batch."""
+        before = [{k: id(v) for k, v in result.items()} for result in results]
+        wall, cpu = time.perf_counter(), time.thread_time()
+        r = node.execute_batch(results, **kwargs)
+        wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+        for result, snapshot in zip(results, before):
+            self.record(node.id_, node.type_, wall / len(results), cpu / len(results),
+                        _new_array_bytes(result, snapshot))
+        return r
+
+
+    def drain(self) -> dict:
+        """Remove and return the samples recorded so far, e.g. to send them from a worker process to the parent."""
+        with self._lock:
+            samples, self.samples = self.samples, {}
+        return samples
+
+
+    def merge(self, samples: dict):
+        """Add samples recorded by another Profiler."""
+        with self._lock:
+            for key, node_samples in samples.items():
+                self.samples.setdefault(key, []).extend(node_samples)
+
+
+    def summary(self, sort_by: str='total_wall') -> List[dict]:
+        """Aggregate the samples of each node, sorted in descending order of sort_by.
+
+        Times are in seconds and sizes in bytes.
+        """
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f'sort_by must be one of {SORT_KEYS}')
+        rows = []
+        with self._lock:
+            for (node_id, node_type), node_samples in self.samples.items():
+                wall, cpu, nbytes = (np.array(s, dtype=float) for s in zip(*node_samples))
+                rows.append({
+                    'id': node_id,
+                    'type': node_type,
+                    'calls': len(node_samples),
+                    'total_wall': wall.sum(),
+                    'min_wall': wall.min(),
+                    'median_wall': np.median(wall),
+                    'p95_wall': np.percentile(wall, 95),
+                    'max_wall': wall.max(),
+                    'total_cpu': cpu.sum(),
+                    'median_cpu': np.median(cpu),
+                    'total_bytes': int(nbytes.sum()),
+                    'median_bytes': int(np.median(nbytes)),
+                })
+        rows = [{k: float(v) if isinstance(v, np.floating) else v for k, v in row.items()} for row in rows]
+        return sorted(rows, key=lambda row: row[sort_by], reverse=True)
+
+
+    def format_table(self, sort_by: str='total_wall') -> str:
+        """Format the summary as a plain text table, times in milliseconds and sizes in MiB."""
+        header = ('Node', 'Type', 'Calls', 'Total (ms)', 'Min (ms)', 'Median (ms)', 'p95 (ms)',
+                  'Max (ms)', 'CPU (ms)', 'Arrays (MiB)')
+        lines = [header]
+        for row in self.summary(sort_by):
+            lines.append((row['id'], row['type'], str(row['calls']),
+                          *(f"{row[k] * 1000:.2f}" for k in ('total_wall', 'min_wall', 'median_wall',
+                                                             'p95_wall', 'max_wall', 'total_cpu')),
+                          f"{row['total_bytes'] / 1024 ** 2:.2f}"))
+        widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+        return '\n'.join('  '.join(cell.ljust(w) if i < 2 else cell.rjust(w)
+                                   for i, (cell, w) in enumerate(zip(line, widths))) for line in lines)
+
+
+    def write(self, output_path: str, sort_by: str='total_wall'):
+        """Write the summary to output_path + '.json' and the table to output_path + '.txt'."""
+        with open(output_path + '.json', 'w') as f:
+            json.dump(self.summary(sort_by), f, indent=4)
+        with open(output_path + '.txt', 'w') as f:
+            f.write(self.format_table(sort_by) + '\n')
+        LOGGER.info("Wrote profile to %s.json and %s.txt", output_path, output_path)
@@ -0,0 +1,127 @@
+"""Module containing the aggregation of the similarity maps of the patches into per patch and per band scores."""
+
+import numpy as np
+import logging
+from dataclasses import dataclass
+from qualitymetrics.visqol.constants import FREQ_BAND_SIM_FUNCTIONS
+from constants import LOGGER_NAME
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+# A signal is considered low pass filtered when the bands from the lowest up
+# are all more similar than LOW_PASS_SIMILARITY_THRESHOLD, and they make up
+# more than LOW_PASS_MIN_PERCENT_OF_BANDS of the bands.
+LOW_PASS_SIMILARITY_THRESHOLD = 0.995
+LOW_PASS_MIN_PERCENT_OF_BANDS = 50
+
+@dataclass(frozen=True)
+class SimilarityAggregate:
+    """Class which stores the aggregated similarities of the patches of a signal.
+
+    Attributes
+    ----------
+    best_warp_indexes: numpy.ndarray
+        Index of the most similar warp of each patch, of shape (patches,).
+    patch_similarities: numpy.ndarray
+        Mean similarity of the best warp of each patch, of shape (patches,).
+    patch_freq_band_similarities: numpy.ndarray
+        Similarity of each band of the best warp of each patch, of shape
+        (bands, patches) like calc_patch_freq_band_similarities.
+    freq_band_similarities: numpy.ndarray
+        Similarity of each band aggregated over the patches, of shape (bands,).
+    low_pass_filtered: bool
+        Whether the band similarities indicate a low pass filtered signal, see
+        is_low_pass_filtered.
+    """
+
+    best_warp_indexes: np.ndarray
+    patch_similarities: np.ndarray
+    patch_freq_band_similarities: np.ndarray
+    freq_band_similarities: np.ndarray
+    low_pass_filtered: bool
+
+def aggregate_similarities(neurograms: np.ndarray, freq_band_sim_per_patch: str = 'mean',
+                           freq_band_sim_aggregate: str = 'mean') -> SimilarityAggregate:
+    """Aggregate the similarity maps of every patch and warp with array reductions over the whole stack.
+
+    The maps are reduced along time once, giving the similarity of each band
+    of each patch and warp, from which the best warp of each patch, the band
+    similarities of that warp and their aggregate over the patches follow.
+
+    Parameters
+    ----------
+    neurograms: numpy.ndarray
+        Similarity maps of shape (patches, warps, bands, frames).
+    freq_band_sim_per_patch: str
+        Name of the FREQ_BAND_SIM_FUNCTIONS function reducing each band of a
+        patch along time, as VisqolArguments.freq_band_sim_per_patch. The
+        best warp is always the one with the highest mean similarity.
+    freq_band_sim_aggregate: str
+        Name of the FREQ_BAND_SIM_FUNCTIONS function aggregating each band
+        over the patches, as VisqolArguments.freq_band_sim_aggregate.
+
+    Returns
+    -------
+    aggregate: SimilarityAggregate
+        The aggregated similarities.
+    """
+    neurograms = np.asarray(neurograms)
+    if neurograms.ndim != 4:
+        raise ValueError('neurograms must be of shape (patches, warps, bands, frames)')
+    band_means = np.mean(neurograms, axis=3)
+    # The bands all have the same number of frames, so the mean of the band
+    # means is the mean of the whole map.
+    warp_means = np.mean(band_means, axis=2)
+    best_warp_indexes = np.argmax(warp_means, axis=1)
+    patch_indexes = np.arange(neurograms.shape[0])
+    patch_similarities = warp_means[patch_indexes, best_warp_indexes]
+
+    if freq_band_sim_per_patch == 'mean':
+        best_band_similarities = band_means[patch_indexes, best_warp_indexes]
+    else:
+        best_neurograms = neurograms[patch_indexes, best_warp_indexes]
+        best_band_similarities = FREQ_BAND_SIM_FUNCTIONS[freq_band_sim_per_patch](best_neurograms, axis=2)
+    freq_band_similarities = FREQ_BAND_SIM_FUNCTIONS[freq_band_sim_aggregate](best_band_similarities, axis=0)
+    LOGGER.debug('Best warp indexes = %s', best_warp_indexes)
+    return SimilarityAggregate(best_warp_indexes, patch_similarities, best_band_similarities.T,
+                               freq_band_similarities, is_low_pass_filtered(freq_band_similarities))
+
+def running_best_similarities(similarities: np.ndarray) -> np.ndarray:
+    """Get the highest similarity up to each index, ignoring NaNs."""
+    return np.fmax.accumulate(np.asarray(similarities, dtype=float))
+
+def count_contiguous_freq_above_threshold(freqs: np.ndarray, threshold: float) -> int:
+    """Get the index of the last band of the contiguous run of bands above the threshold starting at band 0 or 1, 0 if there's none.
+
+    Raises
+    ------
+    ValueError
+        If freqs isn't a 1-D array of bands.
+    """
+    freqs = np.asarray(freqs)
+    if freqs.ndim != 1:
+        raise ValueError('freqs must be a 1-D array of bands')
+    freqs_above_threshold = np.flatnonzero(freqs > threshold)
+    if len(freqs_above_threshold) == 0 or freqs_above_threshold[0] > 1:
+        return 0
+    gaps = np.flatnonzero(np.diff(freqs_above_threshold) != 1)
+    run_end = gaps[0] if len(gaps) else len(freqs_above_threshold) - 1
+    return int(freqs_above_threshold[run_end])
+
+def is_low_pass_filtered(freq_band_similarities: np.ndarray) -> bool:
+    """Check if the similarities of the bands indicate a low pass filtered signal.
+
+    Note that count_contiguous_freq_above_threshold returns the index of the
+    last band of the run rather than its length, as the original
+    implementation does, so this is never the case for a 1-D array of bands.
+
+    Raises
+    ------
+    ValueError
+        If freq_band_similarities isn't a 1-D array of bands.
+    """
+    num_bands = len(freq_band_similarities)
+    num_contiguous = count_contiguous_freq_above_threshold(freq_band_similarities, LOW_PASS_SIMILARITY_THRESHOLD)
+    enough_contiguous_passed = num_contiguous * 100 / num_bands > LOW_PASS_MIN_PERCENT_OF_BANDS
+    all_freqs_passed = num_contiguous == num_bands
+    return bool(enough_contiguous_passed and all_freqs_passed)
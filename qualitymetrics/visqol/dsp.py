@@ -1,11 +1,15 @@
 """Module containing functionality relating to any processing of a signal throughout ViSQOL"""
 
 import numpy as np
+import functools
 import logging
 import math
 from typing import Callable, Tuple
-from .nsim import nsim_map
-from scipy.interpolate import RectBivariateSpline
+from numpy.lib.stride_tricks import sliding_window_view
+from . import aggregation
+from .aggregation import running_best_similarities
+from .nsim import MEASURES, nsim_map, similarity_map_batch, sliding_nsim_means
+from scipy.interpolate import InterpolatedUnivariateSpline
 from scipy.signal import hilbert, correlate, correlation_lags
 from constants import LOGGER_NAME
 
@@ -13,6 +17,14 @@ PATCH_SIZE = 30
 
 LOGGER = logging.getLogger(LOGGER_NAME)
 
+# Narrowest decimated patch the coarse stage of the patch search scores,
+# deeper searches of narrower patches fall back to the exhaustive search.
+MIN_COARSE_PATCH_COLS = 3
+
+# Counts of the patch searches run by this process, see patch_search_stats.
+_SEARCH_STATS = {'patches': 0, 'coarse_patches': 0, 'offsets_scored': 0, 'offsets_in_range': 0,
+                 'validated': 0, 'disagreements': 0}
+
 def calculate_SPL(signal: np.ndarray) -> float:
     return 20 * math.log10(math.sqrt(np.mean(np.square(signal))) / 20e-6)
 
@@ -175,7 +187,7 @@ def global_align(reference_signal: np.ndarray,
 
 
 def create_reference_patches(sig_img: np.ndarray, warps: list, speech: bool,
-                             compare_whole_signal: bool) -> Tuple[np.ndarray, np.ndarray]:
+                             compare_whole_signal: bool, stack_warps: bool = False) -> Tuple[np.ndarray, np.ndarray]:
     """
         Create patches from reference signal image to test degraded signal 
         against. For each patch frequency get patches based on max intensity 
@@ -192,6 +204,10 @@ def create_reference_patches(sig_img: np.ndarray, warps: list, speech: bool,
             Speech flag
         compare_whole_signal: bool
             Compare whole signal flag
+        stack_warps: bool
+            Return the warped patches as one array of shape (patches, warps,
+            bands, PATCH_SIZE) rather than (patches * warps, bands, 
+            PATCH_SIZE), only used when speech or not compare_whole_signal
 
         Returns
         -------
@@ -205,26 +221,21 @@ def create_reference_patches(sig_img: np.ndarray, warps: list, speech: bool,
     
     if speech or not compare_whole_signal:
         patch_indexes = [i for i in range(int(PATCH_SIZE//2), sig_img.shape[1] - PATCH_SIZE, PATCH_SIZE)]
-        num_patches = len(patch_indexes)
-        
-        patches = []
-        for i in range(num_patches):
-            start_index = patch_indexes[i]
-            end_index = start_index + PATCH_SIZE
-            img_patch = sig_img[:, start_index:end_index]
-            rows, cols = img_patch.shape
-            src_img_patch = np.copy(img_patch)
-
-            # Does this work? Good question!
-            for j in range(num_warps):
-                w_cols = round(cols * warps[j])
-                x = np.array([int(i/(w_cols) * cols) for i in range(w_cols)])
-                interp_func = RectBivariateSpline([y for y in range(rows)], [y for y in range(cols)], src_img_patch)
-                for y in range(rows):
-                    for z in range(cols):
-                        img_patch[y][z] = interp_func.ev(y,z)
-                patches.append(img_patch)
-        return np.array(patches), np.array(patch_indexes)
+        rows = sig_img.shape[0]
+        src_patches = np.array([sig_img[:, i:i + PATCH_SIZE] for i in patch_indexes]).reshape(-1, rows, PATCH_SIZE)
+
+        # Does this work? Good question! The patch of every warp is the cubic 
+        # spline of the patch evaluated on the patch's own grid, the warp 
+        # factor isn't applied. The spline is linear in the patch, so it's 
+        # evaluated for all of the patches at once with the cached
+        # interpolation matrix of each axis.
+        row_matrix = _spline_interpolation_matrix(rows, tuple(range(rows)))
+        col_matrix = _spline_interpolation_matrix(PATCH_SIZE, tuple(range(PATCH_SIZE)))
+        interpolated = (row_matrix @ src_patches @ col_matrix.T).astype(sig_img.dtype, copy=False)
+        patches = np.repeat(interpolated[:, np.newaxis], num_warps, axis=1)
+        if not stack_warps:
+            patches = patches.reshape(-1, rows, PATCH_SIZE)
+        return patches, np.array(patch_indexes)
     else:
         patch_indexes = [i for i in range(0, sig_img.shape[1], PATCH_SIZE)]
         LOGGER.debug('Patch indexes: %s', patch_indexes)
@@ -237,9 +248,26 @@ def create_reference_patches(sig_img: np.ndarray, warps: list, speech: bool,
         return np.array(patches), np.array(patch_indexes)
 
 
+@functools.lru_cache(maxsize=64)
+def _spline_interpolation_matrix(num_points: int, eval_points: tuple) -> np.ndarray:
+    """
+        Gets the matrix evaluating the cubic interpolating spline of 
+        num_points samples, at 0, 1, ..., num_points - 1, at eval_points. 
+        RectBivariateSpline interpolates an image with this spline along each
+        axis. Cached per (size, points) and shared by every patch and file, 
+        the matrix is read-only.
+    """
+    basis = np.eye(num_points)
+    matrix = np.stack([InterpolatedUnivariateSpline(np.arange(num_points), basis[k], k=3)(eval_points)
+                       for k in range(num_points)], axis=1)
+    matrix.setflags(write=False)
+    return matrix
+
+
 def align_degraded_patches_nsim(deg_img: np.ndarray, ref_patches: np.ndarray, 
                                 warp: list, num_bands: int, ref_patch_indexes: list,
-                                L: int, speech: bool) -> Tuple[np.ndarray, list]:
+                                L: int, speech: bool, search_depth: int = 0,
+                                search_top_k: int = 4, search_validate: bool = False) -> Tuple[np.ndarray, list]:
     """
         Finds the indices of the best patch matches in the degraded signal image
 
@@ -259,11 +287,21 @@ def align_degraded_patches_nsim(deg_img: np.ndarray, ref_patches: np.ndarray,
             The mysterious L value
         speech: bool
             Bool indicating whether or not there is speech in the signals
+        search_depth: int
+            Number of times the spectrograms are decimated by 2 for the 
+            coarse stage of the search, see search_patch_offsets. 0, the 
+            default, scores every offset
+        search_top_k: int
+            Number of coarse offsets refined at full resolution
+        search_validate: bool
+            Also run the exhaustive search, counting the patches the coarse
+            to fine search places differently in patch_search_stats
         
         Returns
         -------
         patch_corr: numpy.ndarray
-            Numpy array containing the correlation scores for each patch
+            Numpy array containing the correlation scores for each patch, 
+            NaN at the offsets a coarse to fine search didn't score
         deg_indexes: list[int]
             List of x-offsets of the the degraded patch best match to the reference signal patches
     """
@@ -276,28 +314,21 @@ def align_degraded_patches_nsim(deg_img: np.ndarray, ref_patches: np.ndarray,
     max_slide_offset = deg_img.shape[1] - ref_patches[0].shape[1]
     LOGGER.debug('Sig img shape = %s patches shape = %s', deg_img.shape, ref_patches[0].shape)
     num_patches = len(ref_patches)
-    patch_corr = np.empty([max_slide_offset, num_patches])
-    patch_corr[:] = np.nan
-    deg_indexes = []
     
     LOGGER.debug('Num Frames = %d', num_frames)
     LOGGER.debug('Max Slide Offset = %d', max_slide_offset)
     LOGGER.debug('Num Patches = %d', num_patches)
-    LOGGER.debug('Patch Corr = %s', patch_corr.shape)
-
-    start_index = 0
-    for i in range(num_patches):
-        slide_offset = start_index
-
-        for j in range(start_index, max_slide_offset):
-            img_patch = ref_patches[i]
-            num_cols = img_patch.shape[1]
-            deg_patch = deg_img[ 0 : num_bands , slide_offset : slide_offset + num_cols]
-            neurogram_map = nsim_map(img_patch, deg_patch, L)
-            patch_corr[j,i] = np.mean(neurogram_map)
-            slide_offset += 1
 
-        deg_indexes.append(np.argmax(patch_corr[:,i]))
+    if search_depth != 0:
+        offset_ranges = [(0, max_slide_offset)] * num_patches
+        patch_corr, deg_indexes = search_patch_offsets(deg_img[0:num_bands], ref_patches, offset_ranges, L,
+                                                       search_depth, search_top_k, search_validate)
+    else:
+        # The mean NSIM of every patch at every offset, computed together 
+        # rather than with one nsim_map call per (patch, offset) pair.
+        patch_corr = sliding_nsim_means(ref_patches, deg_img[0:num_bands], L, max_slide_offset)
+        deg_indexes = [np.argmax(patch_corr[:,i]) for i in range(num_patches)]
+    LOGGER.debug('Patch Corr = %s', patch_corr.shape)
     LOGGER.debug('patch_corr : %s', patch_corr[0,:])
     LOGGER.debug('deg indexes : %s', deg_indexes)
     return patch_corr, deg_indexes
@@ -305,7 +336,8 @@ def align_degraded_patches_nsim(deg_img: np.ndarray, ref_patches: np.ndarray,
 
 def align_degraded_patches_audio(sig_img, ref_patches,
                                  ref_patches_indexes, warp, num_bands,
-                                 L, speech) -> Tuple[np.ndarray, list]:
+                                 L, speech, search_depth: int = 0, search_top_k: int = 4,
+                                 search_validate: bool = False) -> Tuple[np.ndarray, list]:
     """
         Finds the indices of the best patch matches in the degraded signal image
 
@@ -326,11 +358,21 @@ def align_degraded_patches_audio(sig_img, ref_patches,
             The mysterious L value
         speech: bool
             Bool indicating whether or not there is speech in the signals
+        search_depth: int
+            Number of times the spectrograms are decimated by 2 for the 
+            coarse stage of the search, see search_patch_offsets. 0, the 
+            default, scores every offset
+        search_top_k: int
+            Number of coarse offsets refined at full resolution
+        search_validate: bool
+            Also run the exhaustive search, counting the patches the coarse
+            to fine search places differently in patch_search_stats
         
         Returns
         -------
         patch_corr: numpy.ndarray
-            Numpy array containing the correlation scores for each patch
+            Numpy array containing the correlation scores for each patch, 
+            NaN at the offsets a coarse to fine search didn't score
         deg_indexes: list[int]
             List of x-offsets of the the degraded patch best match to the 
             reference signal patches
@@ -352,6 +394,16 @@ def align_degraded_patches_audio(sig_img, ref_patches,
     LOGGER.debug('Num Patches = %d', num_patches)
     LOGGER.debug('Patch Corr = %s', patch_corr.shape)
 
+    if search_depth != 0:
+        half_patch = int(math.floor(ref_patches[0].shape[1] / 2))
+        offset_ranges = [(ref_patches_indexes[i-1] + half_patch if i > 0 else 0,
+                          ref_patches_indexes[i+1] - half_patch if i < num_patches - 1 else max_slide_offset)
+                         for i in range(num_patches)]
+        patch_corr, deg_indexes = search_patch_offsets(sig_img[0:num_bands], ref_patches, offset_ranges, L,
+                                                       search_depth, search_top_k, search_validate)
+        LOGGER.debug('deg indexes : %s', deg_indexes)
+        return patch_corr, deg_indexes
+
     for i in range(num_patches):
         LOGGER.debug('%s', ref_patches[0].shape)
         start_index = ref_patches_indexes[i-1] + int(math.floor(ref_patches[0].shape[1] / 2))   if i > 0 else 0       
@@ -372,128 +424,284 @@ def align_degraded_patches_audio(sig_img, ref_patches,
     return patch_corr, deg_indexes
 
 
+def search_patch_offsets(deg_img: np.ndarray, ref_patches: np.ndarray, offset_ranges: list, L: int,
+                         search_depth: int, search_top_k: int = 4,
+                         search_validate: bool = False) -> Tuple[np.ndarray, list]:
+    """
+        Finds the best offset of each reference patch in the degraded image 
+        with a coarse to fine search, rather than scoring every offset.
+
+        The coarse stage scores every offset of the patch on copies of the 
+        images decimated by 2 ** search_depth along time, averaging adjacent
+        frames. The search_top_k best coarse offsets are then refined at full
+        resolution, scoring every offset within one decimation factor of 
+        each. Patches too narrow to be decimated search_depth times, and 
+        ranges too short for the search to score fewer offsets, are searched
+        exhaustively.
+
+        The best coarse offsets can miss the offset the exhaustive search 
+        finds, e.g. when a patch matches several similar frames. With 
+        search_validate set the exhaustive search is also run, and the 
+        patches placed differently are counted in patch_search_stats.
+
+        Parameters
+        ----------
+        deg_img: numpy.ndarray
+            Spectrogram of the degraded signal, with as many bands as the 
+            patches
+        ref_patches: list[numpy.ndarray]
+            List containing all of the reference patches
+        offset_ranges: list[tuple[int, int]]
+            The [start, end) range of offsets searched for each patch
+        L: int
+            The mysterious L value
+        search_depth: int
+            Number of times the images are decimated by 2 for the coarse stage
+        search_top_k: int
+            Number of coarse offsets refined at full resolution
+        search_validate: bool
+            Also run the exhaustive search and count the disagreements
+
+        Returns
+        -------
+        patch_corr: numpy.ndarray
+            Mean NSIM of each patch at each offset it was scored at, NaN 
+            elsewhere
+        deg_indexes: list[int]
+            The best offset of each patch
+
+        Raises
+        ------
+        ValueError
+            If search_depth is negative or search_top_k is less than 1
+    """
+    if search_depth < 0:
+        raise ValueError('search_depth must be at least 0')
+    if search_top_k < 1:
+        raise ValueError('search_top_k must be at least 1')
+    factor = 2 ** search_depth
+    max_slide_offset = max(0, deg_img.shape[1] - ref_patches[0].shape[1])
+    patch_corr = np.full([max_slide_offset, len(ref_patches)], np.nan)
+
+    # Patches sharing a range and width are scored on the same decimated 
+    # image at once, which is the case for all of them in NSIM mode.
+    groups = {}
+    for i, (ref_patch, (start, end)) in enumerate(zip(ref_patches, offset_ranges)):
+        _SEARCH_STATS['patches'] += 1
+        _SEARCH_STATS['offsets_in_range'] += max(0, end - start)
+        groups.setdefault((start, end, ref_patch.shape[1]), []).append(i)
+
+    for (start, end, num_cols), indexes in groups.items():
+        coarse_patches = [_decimate_columns(ref_patches[i], factor) for i in indexes]
+        coarse_deg = _decimate_columns(deg_img[:, start:end + num_cols - 1], factor)
+        num_coarse = min(coarse_deg.shape[1] - coarse_patches[0].shape[1] + 1, -(-(end - start) // factor))
+        # The refined offsets alone can outnumber those in a short range.
+        max_scored = num_coarse + search_top_k * (2 * factor + 1)
+        if coarse_patches[0].shape[1] < MIN_COARSE_PATCH_COLS or num_coarse <= 0 or max_scored >= end - start:
+            for i in indexes:
+                patch_corr[start:end, i] = _score_offsets(deg_img, ref_patches[i], start, end, L)
+                _SEARCH_STATS['offsets_scored'] += max(0, end - start)
+            continue
+
+        coarse_corr = sliding_nsim_means(coarse_patches, coarse_deg, L, num_coarse)
+        if search_validate:
+            exhaustive_corr = sliding_nsim_means([ref_patches[i] for i in indexes],
+                                                 deg_img[:, start:end + num_cols - 1], L, end - start)
+        _SEARCH_STATS['coarse_patches'] += len(indexes)
+        _SEARCH_STATS['offsets_scored'] += num_coarse * len(indexes)
+        for n, (i, patch_coarse_corr) in enumerate(zip(indexes, coarse_corr.T)):
+            for coarse_index in np.argsort(-patch_coarse_corr, kind='stable')[:search_top_k]:
+                centre = start + coarse_index * factor
+                fine_start, fine_end = max(start, centre - factor), min(end, centre + factor + 1)
+                unscored = np.isnan(patch_corr[fine_start:fine_end, i])
+                if unscored.any():
+                    patch_corr[fine_start:fine_end, i] = _score_offsets(deg_img, ref_patches[i], fine_start,
+                                                                        fine_end, L)
+                    _SEARCH_STATS['offsets_scored'] += int(np.count_nonzero(unscored))
+
+            if search_validate:
+                exhaustive_index = start + np.argmax(exhaustive_corr[:, n])
+                _SEARCH_STATS['validated'] += 1
+                if exhaustive_index != np.nanargmax(patch_corr[:, i]):
+                    _SEARCH_STATS['disagreements'] += 1
+                    LOGGER.debug('Patch %d: coarse to fine offset %d, exhaustive offset %d', i,
+                                 np.nanargmax(patch_corr[:, i]), exhaustive_index)
+
+    deg_indexes = [np.nanargmax(patch_corr[:, i]) for i in range(len(ref_patches))]
+    return patch_corr, deg_indexes
+
+
+def patch_search_stats() -> dict:
+    """
+        Gets the counts of the coarse to fine patch searches run by this 
+        process: the patches searched, the offsets scored out of those in 
+        range, and of the validated patches, how many the coarse stage placed
+        differently from the exhaustive search.
+    """
+    stats = dict(_SEARCH_STATS)
+    in_range = stats['offsets_in_range']
+    stats['scored_fraction'] = stats['offsets_scored'] / in_range if in_range else 0.0
+    validated = stats['validated']
+    stats['disagreement_rate'] = stats['disagreements'] / validated if validated else 0.0
+    return stats
+
+
+def reset_patch_search_stats():
+    """Resets the counts returned by patch_search_stats."""
+    for key in _SEARCH_STATS:
+        _SEARCH_STATS[key] = 0
+
+
+def _score_offsets(deg_img: np.ndarray, ref_patch: np.ndarray, start: int, end: int, L: int) -> np.ndarray:
+    """Gets the mean NSIM of a patch at the offsets [start, end) of the degraded image."""
+    if end <= start:
+        return np.empty(0)
+    num_cols = ref_patch.shape[1]
+    return sliding_nsim_means([ref_patch], deg_img[:, start:end + num_cols - 1], L, end - start)[:, 0]
+
+
+def _decimate_columns(img: np.ndarray, factor: int) -> np.ndarray:
+    """Decimates an image along time by averaging each run of factor columns, dropping the incomplete last run."""
+    num_cols = img.shape[1] // factor
+    return img[:, :num_cols * factor].reshape(img.shape[0], num_cols, factor).mean(axis=2)
+
+
 def create_degraded_patches(degraded_patch_indexes: list, deg_spect: np.ndarray,
                             ref_patches: np.ndarray, PATCH_SIZE: int,
                             warp: list) -> np.ndarray:
     """
+        Extracts the degraded patch matching each reference patch from the 
+        degraded spectrogram.
+
+        Each patch starts max_warp_offset frames after its degraded patch 
+        index, the last slide offset the search around the index considers,
+        with max_warp_offset the frames the largest warp removes from a 
+        patch. The patches are gathered at once from a strided view of the 
+        spectrogram, so the only copy made is the returned array. Patches 
+        which would run past the end of the spectrogram end at its last 
+        frame instead.
 
     Parameters
     ----------
     degraded_patch_indexes : list
-        DESCRIPTION.
+        The best matching offset of each patch in the degraded spectrogram.
     deg_spect : np.ndarray
-        DESCRIPTION.
+        Spectrogram of the degraded signal.
     ref_patches : np.ndarray
-        DESCRIPTION.
+        The reference patches, each degraded patch has the same shape as a
+        reference patch.
     PATCH_SIZE : int
-        DESCRIPTION.
+        Number of frames of a patch.
     warp : list
-        DESCRIPTION.
+        The warp factors.
+
+    Raises
+    ------
+    ValueError
+        If the degraded spectrogram has fewer frames than a patch.
 
     Returns
     -------
-    deg_patches : TYPE
-        DESCRIPTION.
+    deg_patches : np.ndarray
+        The degraded patch of each index, an empty array of patches if there
+        are no indexes.
 
     """
-    NUM_PATCHES = len(degraded_patch_indexes)
-    deg_patches = np.empty(ref_patches.shape)
-    
-    for patch_index in range(NUM_PATCHES):
-        for warp_index in warp:
-            smallest_warped_patch_size = np.int32(PATCH_SIZE/max(warp))
-            max_warp_offset = PATCH_SIZE - smallest_warped_patch_size # want to test NSIM patches around the size of the max warp offset
-            earliest_frame_to_consider = degraded_patch_indexes[patch_index] - max_warp_offset
-            latest_frame_to_consider = degraded_patch_indexes[patch_index] + max_warp_offset
-            
-            for slide_offset in range(max(0,earliest_frame_to_consider), latest_frame_to_consider+1):
-                ref_patch = ref_patches[patch_index]
-                ref_patch_num_cols = ref_patch.shape[1]
-                
-                current_patch_end_col = slide_offset + ref_patch_num_cols - 1
-                deg_patch_end_col = len(deg_spect[0])
-         
-                if current_patch_end_col <= deg_patch_end_col:
-                    deg_patch_last_col = min(current_patch_end_col, deg_patch_end_col)
-                    # Numbers are bit weird in here
-                    deg_patch = deg_spect[:,slide_offset:deg_patch_last_col+1]
-                    deg_patches[patch_index] = deg_patch
-                    
+    # One patch per index, with the shape of the reference patches.
+    deg_patches = np.zeros((len(degraded_patch_indexes),) + ref_patches.shape[1:])
+    if len(degraded_patch_indexes) == 0:
+        return deg_patches
+    smallest_warped_patch_size = np.int32(PATCH_SIZE/max(warp))
+    max_warp_offset = PATCH_SIZE - smallest_warped_patch_size # want to test NSIM patches around the size of the max warp offset
+    ref_patch_num_cols = ref_patches.shape[2]
+    if deg_spect.shape[1] < ref_patch_num_cols:
+        raise ValueError('The degraded spectrogram has fewer frames than a patch')
+
+    # windows[:, i] is a view of the frames [i, i + ref_patch_num_cols).
+    windows = sliding_window_view(deg_spect, ref_patch_num_cols, axis=1)
+    offsets = np.asarray(degraded_patch_indexes) + max_warp_offset
+    offsets = np.clip(offsets, 0, windows.shape[1] - 1)
+    deg_patches[:] = np.moveaxis(windows[:, offsets], 1, 0)
     return deg_patches
-  
-  
+
+
 def calc_ref_deg_similarity(ref_patches: np.ndarray, deg_patches: np.ndarray, 
                             warp: list, L: int, 
                             similarity_measure: str) -> np.ndarray:
+    if similarity_measure not in MEASURES:
+        raise ValueError('invalid similarity measure')
     NUM_PATCHES = ref_patches.shape[0]
-    neurogram_patches, mean_warp_patch_nsims = [], []    
-
-    for patch_index in range(NUM_PATCHES): 
-        #number of patches
-        for warp_index in warp:
-            ref_patch = ref_patches[patch_index]
-            deg_patch = deg_patches[patch_index]
-            if similarity_measure == 'nsim':
-                neurogram_map = nsim_map(ref_patch, deg_patch, L)
-            elif similarity_measure == 'ssim':
-                a, neurogram_map = ssim(deg_patch, ref_patch, 'Radius', 0.33)# Need to be implmented
-            else:
-                raise Exception ('invalid similarity measure') 
-
-            mean_of_freq_band_sim_means = np.mean(neurogram_map)
-            mean_warp_patch_nsims.append(mean_of_freq_band_sim_means)
-            neurogram_patches.append(neurogram_map)
+    if NUM_PATCHES == 0 or len(warp) == 0:
+        return np.array([]), np.array([])
+
+    # The map of a patch doesn't depend on the warp, so the maps of all of 
+    # the patches are computed once, in one batch, and repeated per warp.
+    if ref_patches.ndim == 3 and np.shape(deg_patches) == ref_patches.shape:
+        maps = similarity_map_batch(ref_patches, deg_patches, L, similarity_measure)
+    else:
+        maps = [similarity_map_batch(ref_patches[i][np.newaxis], deg_patches[i][np.newaxis], L,
+                                     similarity_measure)[0] for i in range(NUM_PATCHES)]
+    neurogram_patches = [neurogram_map for neurogram_map in maps for _ in warp]
+    mean_warp_patch_nsims = [np.mean(neurogram_map) for neurogram_map in neurogram_patches]
     return np.array(mean_warp_patch_nsims), np.array(neurogram_patches)
 
 
 def extract_best_nsim_per_patch(mean_warp_patch_nsims: np.ndarray,
                                 num_patches: int) -> list:
-    patch_nsims = []
-    for patch_index in range(num_patches):
-        optimal_slide_index = mean_warp_patch_nsims.tolist()\
-            .index(max(mean_warp_patch_nsims[:patch_index+1]))
-        optimal_warp_index = mean_warp_patch_nsims.tolist()\
-            .index(max(mean_warp_patch_nsims[optimal_slide_index:patch_index+1]))
-        patch_nsims.append(mean_warp_patch_nsims[optimal_warp_index])
-    return patch_nsims
+    # The best NSIM found up to each patch, see aggregate_patch_similarities
+    # for the best warp of each patch.
+    return list(running_best_similarities(mean_warp_patch_nsims[:num_patches]))
 
 
-def calc_patch_freq_band_similarities(neurogram_patches: list, 
-                                      fn: Callable) -> np.ndarray:
-    num_patches = len(neurogram_patches)
-    num_bands = neurogram_patches[0].shape[0]
-    patch_freq_band_mean_similarities = np.empty((num_patches, num_bands))
-    patch_freq_band_mean_similarities[:] = np.nan   
+def aggregate_patch_similarities(neurogram_patches: np.ndarray, warp: list,
+                                 freq_band_sim_per_patch: str = 'mean',
+                                 freq_band_sim_aggregate: str = 'mean') -> aggregation.SimilarityAggregate:
+    """
+        Aggregates the similarity maps returned by calc_ref_deg_similarity 
+        in a single pass, see aggregation.aggregate_similarities.
 
-    for patch_index in range(num_patches):
-        nsim_patch = neurogram_patches[patch_index]
-        for band_index in range(num_bands):
-            band_nsims = nsim_patch[band_index,:]
-            patch_freq_band_mean_similarities[patch_index, band_index] = np.mean(band_nsims)   
+        Parameters
+        ----------
+        neurogram_patches: numpy.ndarray
+            Similarity maps of every patch and warp, of shape 
+            (patches * warps, bands, frames) with the warps of a patch 
+            next to each other
+        warp: list
+            The warps the maps were computed for
+        freq_band_sim_per_patch: str
+            Reduction of each band of a patch along time, as 
+            VisqolArguments.freq_band_sim_per_patch
+        freq_band_sim_aggregate: str
+            Reduction of each band over the patches, as 
+            VisqolArguments.freq_band_sim_aggregate
 
-    return patch_freq_band_mean_similarities.transpose()
+        Returns
+        -------
+        aggregate: SimilarityAggregate
+            The best warp of each patch, the band similarities and whether 
+            the degraded signal is low pass filtered
+    """
+    neurogram_patches = np.asarray(neurogram_patches)
+    neurograms = neurogram_patches.reshape((-1, len(warp)) + neurogram_patches.shape[1:])
+    return aggregation.aggregate_similarities(neurograms, freq_band_sim_per_patch, freq_band_sim_aggregate)
+
+
+def calc_patch_freq_band_similarities(neurogram_patches: list, 
+                                      fn: Callable) -> np.ndarray:
+    if isinstance(neurogram_patches, np.ndarray) and neurogram_patches.ndim == 3:
+        # A stack of patches is a single warp of each patch.
+        return aggregation.aggregate_similarities(neurogram_patches[:, np.newaxis]).patch_freq_band_similarities
+    # Patches with different numbers of frames, e.g. a partial last patch.
+    return np.array([np.mean(nsim_patch, axis=1) for nsim_patch in neurogram_patches]).transpose()
 
 
 def is_low_pass_filtered(patch_freq_band_mean_similarities: np.ndarray) -> bool:
-    percent_freqs_before_consideration = 50
-    similarity_threshold = 0.995
-    num_contiguous_freqs_above_threshold = count_contiguous_freq_above_threshold(patch_freq_band_mean_similarities, similarity_threshold)
-    percent_above_threshold = (num_contiguous_freqs_above_threshold * 100) / len(patch_freq_band_mean_similarities)
-    enough_contiguous_passed = percent_above_threshold > percent_freqs_before_consideration
-    all_freqs_passed = num_contiguous_freqs_above_threshold == len(patch_freq_band_mean_similarities)
-    return enough_contiguous_passed and all_freqs_passed
+    return aggregation.is_low_pass_filtered(patch_freq_band_mean_similarities)
 
 def count_contiguous_freq_above_threshold(freqs: np.ndarray, 
                                           threshold: float) -> int:
     # Pretty sure we expect freqs to always be a 1D array
-    freqs_above_threshold = np.where(freqs > threshold)[0]
-    num_contiguous_freqs_above_threshold = 0
-    for freq_index in range(len(freqs_above_threshold)):
-        if freqs_above_threshold[freq_index] > num_contiguous_freqs_above_threshold + 1:
-            break
-        else:
-            num_contiguous_freqs_above_threshold = freqs_above_threshold[freq_index]
-    return num_contiguous_freqs_above_threshold
+    return aggregation.count_contiguous_freq_above_threshold(freqs, threshold)
 
 def stich_patches_together(patches: np.ndarray) -> np.ndarray:
     raise NotImplementedError('TODO')
\ No newline at end of file
@@ -1,11 +1,27 @@
 import numpy as np
 import scipy.signal as signal
 
-def nsim_map(deg_specgram: np.ndarray, ref_specgram: np.ndarray, 
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import ndimage
+
+# Number of slide offsets whose NSIM is computed at once by
+# sliding_nsim_means, bounding the size of the intermediate arrays.
+OFFSET_BLOCK_SIZE = 256
+
+# Similarity measures computed by similarity_map_batch.
+MEASURES = ('nsim', 'ssim')
+
+# Standard deviation of the Gaussian window of the SSIM, the 'Radius' the
+# MATLAB implementation of ViSQOL passes to ssim. Up to 0.5 its window is
+# 3x3, like the NSIM window.
+SSIM_RADIUS = 0.33
+
+
+def nsim_map(deg_specgram: np.ndarray, ref_specgram: np.ndarray,
              L: int) -> np.ndarray:
     window = np.array([[0.0113, 0.0838, 0.0113], [0.0838, 0.6193, 0.0838], [0.0113, 0.0838, 0.0113]])
     #window = [w/sum(window) for w in window]
-        
+
     # C1 and C2 constant
     K = [0.01, 0.03]
     C1 = pow(K[0] * L, 2)
@@ -14,7 +30,7 @@ def nsim_map(deg_specgram: np.ndarray, ref_specgram: np.ndarray,
     mode = 'same'
     mu_d = signal.convolve2d(deg_specgram, np.rot90(window, 2), mode=mode)
     mu_r = signal.convolve2d(ref_specgram, np.rot90(window, 2), mode=mode)
-        
+
     mu_d_sq = mu_d * mu_d
     mu_r_sq = mu_r * mu_r
     mu_r_mu_d = mu_r * mu_d
@@ -31,3 +47,214 @@ def nsim_map(deg_specgram: np.ndarray, ref_specgram: np.ndarray,
 
     return np.sign(L_r_d) * np.abs(L_r_d) * np.sign(S_r_d) * np.abs(S_r_d)
 
+
+def sliding_nsim_means(ref_patches: list, deg_img: np.ndarray, L: int, num_offsets: int) -> np.ndarray:
+    """
+        Computes the mean of the NSIM map of every reference patch against the
+        window of the degraded image at each slide offset, i.e.
+        np.mean(nsim_map(ref_patches[i], deg_img[:, o:o + width], L)), without
+        running nsim_map once per (patch, offset) pair.
+
+        The blurred degraded image and its blurred square are computed once
+        over the whole image. The windows at each offset are views of them,
+        with the contribution of the column just outside the window removed
+        from their first and last columns, which gives the zero padded blur
+        nsim_map computes. The terms which only depend on the degraded
+        windows are shared by all of the patches, and those which only depend
+        on a patch by all of the offsets. Only the blurred product of a patch
+        and the degraded windows is computed per (patch, offset), with a
+        single correlation per block of OFFSET_BLOCK_SIZE offsets.
+
+        Parameters
+        ----------
+        ref_patches: list[numpy.ndarray]
+            Reference patches, all of the same shape, with as many rows as
+            the degraded image
+        deg_img: numpy.ndarray
+            Degraded image the patches are slid across
+        L: int
+            Intensity range of the images
+        num_offsets: int
+            Number of slide offsets, starting from 0, to compute
+
+        Returns
+        -------
+        nsim_means: numpy.ndarray
+            Array of shape (num_offsets, num_patches) with the mean NSIM of
+            each patch at each offset
+    """
+    nsim_means = np.empty([max(num_offsets, 0), len(ref_patches)])
+    if num_offsets <= 0 or len(ref_patches) == 0:
+        return nsim_means
+    window = np.array([[0.0113, 0.0838, 0.0113], [0.0838, 0.6193, 0.0838], [0.0113, 0.0838, 0.0113]])
+    K = [0.01, 0.03]
+    C1 = pow(K[0] * L, 2)
+    C2 = pow(K[1] * L, 2)
+
+    deg_img = np.asarray(deg_img, dtype=float)
+    width = ref_patches[0].shape[1]
+    deg_windows = sliding_window_view(deg_img, width, axis=1).transpose(1, 0, 2)
+    mu_d_blurs = _blur_with_edges(deg_img, window)
+    d_sq_blurs = _blur_with_edges(deg_img * deg_img, window)
+
+    patch_terms = []
+    for ref_patch in ref_patches:
+        mu_r = signal.convolve2d(ref_patch, np.rot90(window, 2), mode='same')
+        mu_r_sq = mu_r * mu_r
+        sigma_r_sq = signal.convolve2d(ref_patch * ref_patch, np.rot90(window, 2), mode='same') - mu_r_sq
+        sigma_r = np.sign(sigma_r_sq) * np.sqrt(np.abs(sigma_r_sq))
+        patch_terms.append((ref_patch, mu_r, mu_r_sq, sigma_r))
+
+    for start in range(0, num_offsets, OFFSET_BLOCK_SIZE):
+        offsets = np.arange(start, min(start + OFFSET_BLOCK_SIZE, num_offsets))
+        mu_d = _window_blurs(mu_d_blurs, width, offsets)
+        mu_d_sq = mu_d * mu_d
+        sigma_d_sq = _window_blurs(d_sq_blurs, width, offsets) - mu_d_sq
+        sigma_d = np.sign(sigma_d_sq) * np.sqrt(np.abs(sigma_d_sq))
+        for i, (ref_patch, mu_r, mu_r_sq, sigma_r) in enumerate(patch_terms):
+            sigma_r_d = ndimage.correlate(deg_windows[offsets] * ref_patch, window[np.newaxis], mode='constant')
+            sigma_r_d -= mu_r * mu_d
+            L_r_d = (2 * mu_r * mu_d + C1) / (mu_r_sq + mu_d_sq + C1)
+            S_r_d = (sigma_r_d + C2) / (sigma_r * sigma_d + C2)
+            # sign(x) * abs(x), as nsim_map computes it, is x itself.
+            nsim_means[offsets, i] = np.mean(L_r_d * S_r_d, axis=(1, 2))
+    return nsim_means
+
+
+def similarity_map_batch(ref_patches: np.ndarray, deg_patches: np.ndarray, L: int,
+                         measure: str = 'nsim') -> np.ndarray:
+    """
+        Computes the NSIM or SSIM map of each pair in stacks of reference and
+        degraded patches.
+
+        The five local moments of every pair (the means of the reference and
+        degraded patches, of their squares and of their product) are blurred 
+        together in a single pass over one (5, N, bands, frames) buffer. The
+        symmetric 3x3 window is applied with shifted additions along one axis
+        at a time, see _blur_stack, rather than with a 2-D convolution per
+        moment and pair.
+
+        The 'nsim' map is the one nsim_map computes, with the same window and
+        zero padding, equal to it to within floating point rounding. The 
+        'ssim' map is the standard SSIM with a 3x3 Gaussian window of 
+        standard deviation SSIM_RADIUS and replicated edges, like MATLAB's 
+        ssim(deg, ref, 'Radius', 0.33).
+
+        Parameters
+        ----------
+        ref_patches: numpy.ndarray
+            Reference patches, of shape (N, bands, frames)
+        deg_patches: numpy.ndarray
+            Degraded patches, of the same shape
+        L: int
+            Intensity range of the patches
+        measure: str
+            One of MEASURES
+
+        Returns
+        -------
+        maps: numpy.ndarray
+            The similarity map of each pair, of shape (N, bands, frames)
+    """
+    if measure not in MEASURES:
+        raise ValueError(f'measure must be one of {MEASURES}')
+    ref_patches = np.asarray(ref_patches, dtype=float)
+    deg_patches = np.asarray(deg_patches, dtype=float)
+    if ref_patches.shape != deg_patches.shape or ref_patches.ndim != 3:
+        raise ValueError('ref_patches and deg_patches must be stacks of patches of the same shape')
+    K = [0.01, 0.03]
+    C1 = pow(K[0] * L, 2)
+    C2 = pow(K[1] * L, 2)
+
+    moments = np.empty((5,) + ref_patches.shape)
+    moments[0] = ref_patches
+    moments[1] = deg_patches
+    np.multiply(ref_patches, ref_patches, out=moments[2])
+    np.multiply(deg_patches, deg_patches, out=moments[3])
+    np.multiply(ref_patches, deg_patches, out=moments[4])
+    if measure == 'nsim':
+        window = np.array([[0.0113, 0.0838, 0.0113], [0.0838, 0.6193, 0.0838], [0.0113, 0.0838, 0.0113]])
+        mu_r, mu_d, blur_r_sq, blur_d_sq, blur_r_d = _blur_stack(moments, window, replicate=False)
+    else:
+        gaussian = np.exp(-np.arange(-1, 2) ** 2 / (2 * SSIM_RADIUS ** 2))
+        gaussian /= gaussian.sum()
+        mu_r, mu_d, blur_r_sq, blur_d_sq, blur_r_d = _blur_stack(moments, np.outer(gaussian, gaussian),
+                                                                 replicate=True)
+
+    mu_r_sq = mu_r * mu_r
+    mu_d_sq = mu_d * mu_d
+    mu_r_mu_d = mu_r * mu_d
+    # The blurred squares and product become the (co)variances in place.
+    sigma_r_sq = np.subtract(blur_r_sq, mu_r_sq, out=blur_r_sq)
+    sigma_d_sq = np.subtract(blur_d_sq, mu_d_sq, out=blur_d_sq)
+    sigma_r_d = np.subtract(blur_r_d, mu_r_mu_d, out=blur_r_d)
+    if measure == 'nsim':
+        sigma_r = np.sign(sigma_r_sq) * np.sqrt(np.abs(sigma_r_sq))
+        sigma_d = np.sign(sigma_d_sq) * np.sqrt(np.abs(sigma_d_sq))
+        L_r_d = (2 * mu_r * mu_d + C1) / (mu_r_sq + mu_d_sq + C1)
+        S_r_d = (sigma_r_d + C2) / (sigma_r * sigma_d + C2)
+        return L_r_d * S_r_d
+    return ((2 * mu_r_mu_d + C1) * (2 * sigma_r_d + C2)) / ((mu_r_sq + mu_d_sq + C1) * (sigma_r_sq + sigma_d_sq + C2))
+
+
+def _blur_stack(images: np.ndarray, window: np.ndarray, replicate: bool) -> np.ndarray:
+    """
+        Blurs images, stacked along the leading axes, with a symmetric 3x3 
+        window, i.e. the correlation of each image with the window padded
+        with zeros, or with its edges replicated.
+
+        The window has a centre, edge and corner weight, so the blur is the 
+        weighted sum of each pixel, of its horizontal and vertical neighbours
+        and of the vertical neighbours of its horizontal neighbours, which 
+        only take shifted additions along one axis at a time, into three 
+        buffers the size of images.
+    """
+    centre, edge, corner = window[1, 1], window[0, 1], window[0, 0]
+    horizontal = _neighbour_sum(images, -1, replicate, np.empty_like(images))
+    blurred = _neighbour_sum(images, -2, replicate, np.empty_like(images))
+    blurred += horizontal
+    blurred *= edge
+    scratch = _neighbour_sum(horizontal, -2, replicate, np.empty_like(images))
+    scratch *= corner
+    blurred += scratch
+    blurred += np.multiply(images, centre, out=scratch)
+    return blurred
+
+
+def _neighbour_sum(images: np.ndarray, axis: int, replicate: bool, out: np.ndarray) -> np.ndarray:
+    """Sums the two neighbours of each pixel along an axis into out, which mustn't be images."""
+    def along(index):
+        # Index images along the axis, keeping the memory layout of the other axes.
+        return (Ellipsis, index) + (slice(None),) * (-axis - 1)
+    out[along(slice(1, None))] = images[along(slice(None, -1))]
+    out[along(0)] = images[along(0)] if replicate else 0
+    out[along(slice(None, -1))] += images[along(slice(1, None))]
+    if replicate:
+        out[along(-1)] += images[along(-1)]
+    return out
+
+
+def _blur_with_edges(img: np.ndarray, window: np.ndarray) -> tuple:
+    """
+        Blurs img with the window, also returning the contribution of each
+        column to the blur of its right and left neighbours.
+    """
+    blurred = signal.convolve2d(img, np.rot90(window, 2), mode='same')
+    to_right = signal.convolve2d(img, np.rot90(window[:, :1], 2), mode='same')
+    to_left = signal.convolve2d(img, np.rot90(window[:, 2:], 2), mode='same')
+    return blurred, to_right, to_left
+
+
+def _window_blurs(blurs: tuple, width: int, offsets: np.ndarray) -> np.ndarray:
+    """
+        Gets the zero padded blur of the windows of width columns starting at
+        the offsets, from the blur of the whole image returned by
+        _blur_with_edges, as an array of shape (offsets, rows, width).
+    """
+    blurred, to_right, to_left = blurs
+    windows = sliding_window_view(blurred, width, axis=1).transpose(1, 0, 2)[offsets]
+    has_left = offsets > 0
+    windows[has_left, :, 0] -= to_right[:, offsets[has_left] - 1].T
+    has_right = offsets + width < blurred.shape[1]
+    windows[has_right, :, -1] -= to_left[:, offsets[has_right] + width].T
+    return windows
@@ -18,9 +18,22 @@ class VisqolArguments():
     compare_whole_signal: bool = False
     save_spectrograms: bool = False
     debug: bool = False
+    search_depth: int = 0
+    search_top_k: int = 4
+    search_validate: bool = False
     
     def __post_init__(self):
         if self.freq_band_sim_per_patch not in FREQ_BAND_SIM_FUNCTIONS:
             self.freq_band_sim_per_patch = 'mean'
         if self.freq_band_sim_aggregate not in FREQ_BAND_SIM_FUNCTIONS:
-            self.freq_band_sim_aggregate = 'mean'
\ No newline at end of file
+            self.freq_band_sim_aggregate = 'mean'
+        if self.search_depth < 0:
+            raise ValueError('search_depth must be at least 0')
+        if self.search_top_k < 1:
+            raise ValueError('search_top_k must be at least 1')
+
+    @property
+    def patch_search_options(self) -> dict:
+        """Keyword arguments of the patch search for dsp.align_degraded_patches_nsim and align_degraded_patches_audio."""
+        return {'search_depth': self.search_depth, 'search_top_k': self.search_top_k,
+                'search_validate': self.search_validate}
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""Module containing the ResultContext, a layered copy-on-write view of the result dictionary."""
+
+from collections.abc import Mapping, MutableMapping
+from typing import Iterable
+
+
+class _Deleted:
+    """Marker stored in a layer for keys that were deleted from it."""
+
+    def __reduce__(self):
+        # Keep the marker a singleton when a layer is pickled, e.g. when it is
+        # sent back from a LoopNode worker process.
+        return '_DELETED'
+
+    def __repr__(self):
+        return '<deleted>'
+
+
+_DELETED = _Deleted()
+
+
+class ResultContext(MutableMapping):
+    """Layered view of a result dictionary with write isolation.
+
+    Reads fall through to the parent mapping, so nothing is copied when the
+    context is created. Writes and deletes only go into the context's own
+    layer and never modify the parent. This lets the subgraph of a LoopNode
+    iteration, or a branch of the graph, see everything in the parent result
+    while keeping what it produces to itself.
+
+    Note that values are not copied, so modifying a value read from the
+    parent in place, e.g. `result['signal'] *= 2`, still modifies the parent's
+    value. Assign a new value instead.
+    """
+
+    def __init__(self, parent: Mapping=None, hidden: Iterable=None, local: dict=None):
+        """Initialize a ResultContext.
+
+        Parameters
+        ----------
+        parent : Mapping, optional
+            The mapping reads fall through to. The default is None, which
+            creates an empty parent.
+        hidden : Iterable, optional
+            Keys of the parent which are not visible from this context, e.g.
+            the key_blacklist of a LoopNode. The default is None.
+        local : dict, optional
+            Initial contents of the context's own layer. The default is None.
+        """
+        self.parent = parent if parent is not None else {}
+        self.hidden = frozenset(hidden) if hidden else frozenset()
+        self.local = local if local is not None else {}
+
+
+    def child(self, hidden: Iterable=None) -> 'ResultContext':
+        """Create a new context layered on top of this one."""
+        return ResultContext(self, hidden=hidden)
+
+
+    def changes(self) -> dict:
+        """Get the keys set in this context's own layer, excluding deleted keys."""
+        return {k: v for k, v in self.local.items() if v is not _DELETED}
+
+
+    def commit(self):
+        """Write the changes made in this context's own layer to the parent and clear the layer."""
+        for k, v in self.local.items():
+            if v is _DELETED:
+                self.parent.pop(k, None)
+            else:
+                self.parent[k] = v
+        self.local = {}
+
+
+    def discard(self, key: str):
+        """Release a value held by this context's own layer, leaving the parent untouched.
+
+        Unlike deleting the key, the parent's value (if any) becomes visible
+        again.
+        """
+        self.local.pop(key, None)
+
+
+    def _in_parent(self, key) -> bool:
+        return key not in self.hidden and key in self.parent
+
+
+    def __getitem__(self, key):
+        if key in self.local:
+            value = self.local[key]
+            if value is _DELETED:
+                raise KeyError(key)
+            return value
+        if key in self.hidden:
+            raise KeyError(key)
+        return self.parent[key]
+
+
+    def __setitem__(self, key, value):
+        self.local[key] = value
+
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if self._in_parent(key):
+            self.local[key] = _DELETED
+        else:
+            del self.local[key]
+
+
+    def __contains__(self, key) -> bool:
+        if key in self.local:
+            return self.local[key] is not _DELETED
+        return self._in_parent(key)
+
+
+    def __iter__(self):
+        # Parent keys first, in the parent's order, followed by the keys only
+        # set in this layer. The same order as a copy of the parent dict which
+        # was then updated.
+        for k in self.parent:
+            if k in self.hidden and k not in self.local:
+                continue
+            if self.local.get(k) is _DELETED:
+                continue
+            yield k
+        for k, v in self.local.items():
+            if v is not _DELETED and k not in self.parent:
+                yield k
+
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+    def __repr__(self):
+        return f'ResultContext({dict(self.items())})'
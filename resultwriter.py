@@ -0,0 +1,274 @@
+"""Module containing the ResultWriters, which append the results of a LoopNode to a file as the loop runs.
+
+Rows are buffered and written every flush_every rows, or once flush_interval
+seconds have passed since the last write, so a long run leaves a usable
+file behind as it goes and the results don't have to be held in memory
+until the end. Three formats are supported:
+
+- csv: rows are appended with DataFrame.to_csv, so values are formatted the
+  same way as by the to_csv transform.
+- parquet: each write is a row group, requires pyarrow.
+- arrow: each write is a record batch of an Arrow IPC stream, requires
+  pyarrow.
+
+The schema of the parquet and arrow files is fixed by the first rows
+written: columns holding numbers, booleans or no values at all, e.g. a
+metric which failed on the first rows, are written as float64 and every
+other column as string. Later rows are converted to that schema, so e.g. a
+metric returning an int first and a float later, or None and then a score,
+doesn't stop the run.
+"""
+
+import logging
+import numbers
+import time
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from constants import LOGGER_NAME
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Only needed by the parquet and arrow writers.
+    pa = pq = None
+
+LOGGER = logging.getLogger(LOGGER_NAME)
+
+FORMATS = ('csv', 'parquet', 'arrow')
+
+
+class ResultWriter:
+    """Base class of the writers, buffering rows and writing them to the file in blocks."""
+
+    def __init__(self, path: str, columns: list, flush_every: int=100, flush_interval: float=30.0):
+        """Initialize a ResultWriter, creating or truncating the file at path.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file to write.
+        columns : list
+            Names of the columns, every row has one value per column.
+        flush_every : int, optional
+            Number of buffered rows written at once. The default is 100.
+        flush_interval : float, optional
+            Maximum number of seconds rows are buffered for. The default is 30.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.columns = list(columns)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._open()
+
+
+    @property
+    def rows(self) -> int:
+        """Number of rows added to the writer, written or still buffered."""
+        return self.rows_written + len(self._rows)
+
+
+    def write(self, row: list):
+        """Add a row, writing the buffered rows if there are flush_every of them or flush_interval has passed."""
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+
+    def flush(self):
+        """Write the buffered rows to the file."""
+        if self._rows:
+            self._write(pd.DataFrame(self._rows, columns=self.columns))
+            self.rows_written += len(self._rows)
+            self._rows = []
+        self._last_flush = time.monotonic()
+
+
+    def close(self):
+        """Write the buffered rows and close the file."""
+        self.flush()
+        self._close()
+
+
+    def _open(self):
+        raise NotImplementedError
+
+
+    def _write(self, df: pd.DataFrame):
+        raise NotImplementedError
+
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class _ArrowSchemaWriter(ResultWriter):
+    """Base class of the writers whose files have a fixed schema, converting every block of rows to it."""
+
+    def _open(self):
+        # The schema is only known once the first rows are written.
+        self._kinds = None
+
+
+    def _schema(self, df: pd.DataFrame) -> 'pa.Schema':
+        """Get the schema of the file, deciding it from the first rows."""
+        if self._kinds is None:
+            self._kinds = {column: 'float64' if _is_numeric(df[column]) else 'string' for column in df.columns}
+        return pa.schema([(column, pa.float64() if kind == 'float64' else pa.string())
+                          for column, kind in self._kinds.items()])
+
+
+    def _normalise(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convert the columns of a block of rows to the types of the schema."""
+        df = df.copy()
+        for column, kind in self._kinds.items():
+            values = df[column]
+            if kind == 'float64':
+                converted = pd.to_numeric(values.map(_bool_to_int), errors='coerce').astype('float64')
+                if (lost := int((converted.isna() & values.notna()).sum())) > 0:
+                    LOGGER.warning("%d values of the column %s written to %s aren't numbers, they're written as missing",
+                                   lost, column, self.path)
+            else:
+                converted = values.map(lambda v: None if _is_missing(v) else str(v)).astype(object)
+            df[column] = converted
+        return df
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _bool_to_int(value):
+    return int(value) if isinstance(value, (bool, np.bool_)) else value
+
+
+def _is_numeric(values: pd.Series) -> bool:
+    """Check if a column only holds numbers and booleans, which is also the case if it holds no values at all."""
+    return all(isinstance(v, (numbers.Number, np.bool_)) and not isinstance(v, complex)
+               for v in values if not _is_missing(v))
+
+
+class CSVWriter(ResultWriter):
+    """Writes the rows to a csv file."""
+
+    def _open(self):
+        self._file = open(self.path, 'w', newline='')
+        pd.DataFrame(columns=self.columns).to_csv(self._file, index=False)
+
+
+    def _write(self, df: pd.DataFrame):
+        df.to_csv(self._file, header=False, index=False)
+        self._file.flush()
+
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetWriter(_ArrowSchemaWriter):
+    """Writes the rows to a parquet file, one row group per write."""
+
+    def _open(self):
+        super()._open()
+        self._writer = None
+
+
+    def _write(self, df: pd.DataFrame):
+        schema = self._schema(df)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(str(self.path), schema)
+        self._writer.write_table(pa.Table.from_pandas(self._normalise(df), schema=schema, preserve_index=False))
+
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ArrowWriter(_ArrowSchemaWriter):
+    """Writes the rows to an Arrow IPC stream, one record batch per write."""
+
+    def _open(self):
+        super()._open()
+        self._sink = pa.OSFile(str(self.path), 'wb')
+        self._writer = None
+
+
+    def _write(self, df: pd.DataFrame):
+        schema = self._schema(df)
+        if self._writer is None:
+            self._writer = pa.ipc.new_stream(self._sink, schema)
+        self._writer.write_batch(pa.RecordBatch.from_pandas(self._normalise(df), schema=schema, preserve_index=False))
+        self._sink.flush()
+
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._sink.close()
+
+
+WRITERS = {
+    'csv': CSVWriter,
+    'parquet': ParquetWriter,
+    'arrow': ArrowWriter
+}
+
+
+def file_format_of(path: str) -> str:
+    """Get the format of a result file from its extension, csv unless it's .parquet, .pq, .arrow or .arrows."""
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.parquet', '.pq'):
+        return 'parquet'
+    if suffix in ('.arrow', '.arrows'):
+        return 'arrow'
+    return 'csv'
+
+
+def check_format(file_format: str):
+    """Check a result file format is supported, raising a ValueError if it isn't."""
+    if file_format not in FORMATS:
+        raise ValueError(f'file_format must be one of {FORMATS}')
+    if file_format != 'csv' and pa is None:
+        raise ValueError(f"Writing {file_format} results requires the pyarrow package, pip install pyarrow")
+
+
+def open_writer(path: str, columns: list, file_format: str=None, flush_every: int=100,
+                flush_interval: float=30.0) -> ResultWriter:
+    """Open a ResultWriter for a file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file to write.
+    columns : list
+        Names of the columns.
+    file_format : str, optional
+        One of FORMATS. The default is None, which uses the extension of the
+        file, see file_format_of.
+    flush_every : int, optional
+        Number of buffered rows written at once. The default is 100.
+    flush_interval : float, optional
+        Maximum number of seconds rows are buffered for. The default is 30.
+
+    Raises
+    ------
+    ValueError
+        If the format isn't supported, or requires pyarrow and it isn't
+        installed.
+
+    Returns
+    -------
+    writer : ResultWriter
+        The writer.
+    """
+    file_format = file_format if file_format else file_format_of(path)
+    check_format(file_format)
+    return WRITERS[file_format](path, columns, flush_every, flush_interval)
+
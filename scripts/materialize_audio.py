@@ -0,0 +1,82 @@
+"""
+    Script which decodes every audio file listed in the columns of a csv dataset and stores it in an AudioStore,
+    once per target sample rate passed to the --sample_rates arg.
+
+    A LoadSignalNode whose "audio_store" is set to the --store directory then memory-maps the stored signals
+    instead of decoding and resampling the files every time the dataset is run. The --mono flag must match the
+    "mono" setting of the LoadSignalNodes that will use the store, and --resampler their "resampler" setting.
+
+    Files which are already stored, and haven't been modified since, are skipped unless --overwrite is passed.
+    Relative paths in the dataset are resolved against the current directory, so run the script from the same
+    directory as the pipeline.
+"""
+
+# /usr/bin/env python3.8
+
+import argparse
+import sys
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import audioloader
+
+from audiostore import AudioStore
+
+
+def materialize(job: tuple) -> str:
+    store_dir, path, sample_rate, mono, backend, resampler = job
+    audio = audioloader.load_audio(path, sample_rate, mono, backend, resampler)[0]
+    AudioStore(store_dir).save(path, sample_rate, mono, audio, resampler)
+    return path
+
+
+def main():
+    try:
+        args = init_argparser().parse_args()
+        audioloader.check_options(args.backend, args.resampler)
+        df = pd.read_csv(args.dataset)
+        paths = list(dict.fromkeys(p for col in args.columns for p in df[col].dropna()))
+        store = AudioStore(args.store)
+        jobs = [(args.store, path, sample_rate, args.mono, args.backend, args.resampler)
+                for sample_rate in args.sample_rates for path in paths
+                if args.overwrite or not store.is_current(path, sample_rate, args.mono, args.resampler)]
+        print(f'Materializing {len(jobs)} signals, {len(paths) * len(args.sample_rates) - len(jobs)} already stored')
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for n, _ in enumerate(pool.map(materialize, jobs, chunksize=8), 1):
+                if n % 100 == 0 or n == len(jobs):
+                    print(f'{n}/{len(jobs)}')
+        print(f'Stored signals in {args.store}')
+    except Exception as err:
+        print(err)
+        sys.exit(1)
+
+
+def init_argparser() -> argparse.ArgumentParser:
+    """Initialize an argument parser with all of the possible command line arguments that can be passed to this script.
+
+    Returns
+    -------
+    parser: argparse.ArgumentParser
+        Parser to be used to parse arguments
+    """
+    parser = argparse.ArgumentParser(usage="%(prog)s", description="materialize_audio")
+    required = parser.add_argument_group('Required Arguments')
+    required.add_argument('--dataset', required=True)
+    required.add_argument('--store', required=True)
+    optional = parser.add_argument_group('Optional Arguments')
+    optional.add_argument('--columns', nargs='+', default=['Ref_Wave', 'Test_Wave'])
+    optional.add_argument('--sample_rates', type=int, nargs='+', default=[16000, 48000])
+    optional.add_argument('--mono', action='store_true', default=False)
+    optional.add_argument('--backend', choices=audioloader.BACKENDS, default='soundfile')
+    optional.add_argument('--resampler', choices=audioloader.RESAMPLERS, default='high_quality')
+    optional.add_argument('--workers', type=int, default=1)
+    optional.add_argument('--overwrite', action='store_true', default=False)
+    return parser
+
+
+if __name__ == '__main__':
+    main()